@@ -1,26 +1,246 @@
+import asyncio
 import json
+import time
+from typing import Dict, List
 from state import AgentState
-from config.settings import MOAT_PROMPT, get_llm
+from config.settings import (
+    MOAT_PROMPT, MOAT_BATCH_PROMPT, LLM_TEMPERATURE, LLM_COMPLETION_TOKENS, MOAT_SCORE_MAX
+)
+from config.llm_provider import get_provider
+from utils.moat_cache import MoatCache, get_moat_cache
+from utils.rate_limiter import estimate_tokens, get_rate_limiter
+from utils.tracing import record
 
-def moat_analysis_agent(state: AgentState):
-    """The Moat Specialist Agent 'thinks' about defensibility."""
-    llm = get_llm()
-    chain = MOAT_PROMPT | llm
-    response = chain.invoke({
-        "company_name": state["company_name"],
-        "sector": state["sector"]
-    })
+FAILED_JSON_SUMMARY = "LLM failed to return valid JSON."
 
+def _load_json(content: str):
+    """Decodes an LLM reply, stripping markdown fences if needed; None if invalid."""
     try:
-        result = json.loads(response.content)
+        return json.loads(content)
     except json.JSONDecodeError:
-        cleaned_content = response.content.strip().replace('```json', '').replace('```', '')
+        cleaned_content = content.strip().replace('```json', '').replace('```', '')
         try:
-            result = json.loads(cleaned_content)
+            return json.loads(cleaned_content)
         except json.JSONDecodeError:
-            return {"moat_score": 0, "report_summary": "LLM failed to return valid JSON."}
+            return None
+
+def _clamp_moat(score):
+    """Keep a moat score on the 0-MOAT_SCORE_MAX scale (top-K pruning relies on the cap)."""
+    return min(max(score, 0), MOAT_SCORE_MAX)
+
+def _parse_moat_response(content: str):
+    """Parses the LLM's JSON reply into moat state fields."""
+    start = time.perf_counter()
+    result = _load_json(content)
+    record(parse_seconds=time.perf_counter() - start)
+    # Same checks as a batch item: a reply missing a field or with a non-numeric score
+    # degrades to the failure summary instead of aborting the batch it belongs to
+    try:
+        return {
+            "moat_score": _clamp_moat(int(result["moat_score"])),
+            "report_summary": str(result["narrative"])
+        }
+    except (KeyError, TypeError, ValueError):
+        return {"moat_score": 0, "report_summary": FAILED_JSON_SUMMARY}
+
+def _moat_inputs(state: AgentState):
+    """Prompt variables, rendered prompt and cache key for a company."""
+    inputs = {
+        "company_name": state["company_name"],
+        "sector": state["sector"]
+    }
+    prompt_text = MOAT_PROMPT.format(**inputs)
+    return inputs, prompt_text, MoatCache.make_key(prompt_text, get_provider().model_id, LLM_TEMPERATURE)
+
+def _budget(prompt_text: str, companies: int = 1) -> int:
+    """Token estimate charged to the rate limiter before a request is sent."""
+    return estimate_tokens(prompt_text) + LLM_COMPLETION_TOKENS * companies
+
+def _settle(response, budget: int):
+    usage = getattr(response, "usage_metadata", None) or {}
+    get_rate_limiter().record_usage(budget, usage.get("total_tokens", 0))
+    record(prompt_tokens=usage.get("input_tokens", 0),
+           completion_tokens=usage.get("output_tokens", 0))
+    return response
+
+def _invoke(chain, inputs: Dict, budget: int):
+    """Runs a chain through the shared rate limiter."""
+    def attempt():
+        start = time.perf_counter()
+        try:
+            return chain.invoke(inputs)
+        finally:
+            record(llm_requests=1, llm_seconds=time.perf_counter() - start)
+
+    response = get_rate_limiter().call(attempt, budget)
+    return _settle(response, budget)
+
+async def _ainvoke(chain, inputs: Dict, budget: int):
+    async def attempt():
+        start = time.perf_counter()
+        try:
+            return await chain.ainvoke(inputs)
+        finally:
+            record(llm_requests=1, llm_seconds=time.perf_counter() - start)
+
+    response = await get_rate_limiter().acall(attempt, budget)
+    return _settle(response, budget)
+
+def _store(key: str, result):
+    # Parse failures are not cached so the next run gets another attempt
+    if result["report_summary"] != FAILED_JSON_SUMMARY:
+        get_moat_cache().set(key, result)
+    return result
+
+def _precomputed(state: AgentState):
+    """Moat fields already supplied by the caller (batched or incremental runs)."""
+    if state.get("moat_score") is not None and state.get("report_summary") is not None:
+        return {"moat_score": state["moat_score"], "report_summary": state["report_summary"]}
+    return None
+
+def moat_analysis_agent(state: AgentState):
+    """The Moat Specialist Agent 'thinks' about defensibility."""
+    precomputed = _precomputed(state)
+    if precomputed is not None:
+        return precomputed
+
+    inputs, prompt_text, key = _moat_inputs(state)
+    cached = get_moat_cache().get(key)
+    record(cache_hits=cached is not None, cache_misses=cached is None)
+    if cached is not None:
+        return cached
+
+    chain = get_provider().get_chain(MOAT_PROMPT)
+    response = _invoke(chain, inputs, _budget(prompt_text))
+    return _store(key, _parse_moat_response(response.content))
+
+async def amoat_analysis_agent(state: AgentState):
+    """Async variant of the moat agent used by the concurrent batch path."""
+    precomputed = _precomputed(state)
+    if precomputed is not None:
+        return precomputed
+
+    inputs, prompt_text, key = _moat_inputs(state)
+    cached = get_moat_cache().get(key)
+    record(cache_hits=cached is not None, cache_misses=cached is None)
+    if cached is not None:
+        return cached
+
+    chain = get_provider().get_chain(MOAT_PROMPT)
+    response = await _ainvoke(chain, inputs, _budget(prompt_text))
+    return _store(key, _parse_moat_response(response.content))
+
+def _batch_payload(companies: List[Dict]) -> str:
+    return json.dumps([{"company_name": c["company_name"], "sector": c["sector"]}
+                       for c in companies])
+
+def _batch_key(company: Dict) -> str:
+    # Content-addressed like the single prompt: the batch prompt rendered for this company alone
+    prompt_text = MOAT_BATCH_PROMPT.format(companies=_batch_payload([company]))
+    return MoatCache.make_key(prompt_text, get_provider().model_id, LLM_TEMPERATURE)
+
+def _parse_batch_response(content: str, companies: List[Dict]) -> Dict[str, Dict]:
+    """Valid per-company results from a batch reply, keyed by company_name."""
+    start = time.perf_counter()
+    result = _load_json(content)
+    record(parse_seconds=time.perf_counter() - start)
+    if isinstance(result, dict):
+        result = [result]
+    if not isinstance(result, list):
+        return {}
+    wanted = {c["company_name"] for c in companies}
+    scored = {}
+    for item in result:
+        try:
+            name = item["company_name"]
+            if name in wanted:
+                scored[name] = {
+                    "moat_score": _clamp_moat(int(item["moat_score"])),
+                    "report_summary": str(item["narrative"])
+                }
+        except (KeyError, TypeError, ValueError):
+            continue
+    return scored
+
+def _split(companies: List[Dict]):
+    mid = len(companies) // 2
+    return companies[:mid], companies[mid:]
+
+def _batch_request(companies: List[Dict]):
+    """Chain, prompt inputs and token budget for one multi-company request."""
+    inputs = {"companies": _batch_payload(companies)}
+    budget = _budget(MOAT_BATCH_PROMPT.format(**inputs), len(companies))
+    return get_provider().get_chain(MOAT_BATCH_PROMPT), inputs, budget
+
+def _absorb_batch_reply(content: str, companies: List[Dict]):
+    """Scores in a batch reply (cached as they arrive) and the sub-batches left to retry."""
+    scored = _parse_batch_response(content, companies)
+    for company in companies:
+        if company["company_name"] in scored:
+            get_moat_cache().set(_batch_key(company), scored[company["company_name"]])
+
+    # Malformed or partial output: split whatever is missing in half and retry
+    missing = [c for c in companies if c["company_name"] not in scored]
+    if not missing:
+        return scored, []
+    if len(missing) == len(companies):
+        return scored, list(_split(missing))
+    return scored, [missing]
+
+def _score_batch(companies: List[Dict]) -> Dict[str, Dict]:
+    if len(companies) == 1:
+        result = moat_analysis_agent(companies[0])
+        return {companies[0]["company_name"]: _store(_batch_key(companies[0]), result)}
+
+    chain, inputs, budget = _batch_request(companies)
+    response = _invoke(chain, inputs, budget)
+    scored, retries = _absorb_batch_reply(response.content, companies)
+    for batch in retries:
+        scored.update(_score_batch(batch))
+    return scored
+
+async def _ascore_batch(companies: List[Dict]) -> Dict[str, Dict]:
+    if len(companies) == 1:
+        result = await amoat_analysis_agent(companies[0])
+        return {companies[0]["company_name"]: _store(_batch_key(companies[0]), result)}
+
+    chain, inputs, budget = _batch_request(companies)
+    response = await _ainvoke(chain, inputs, budget)
+    scored, retries = _absorb_batch_reply(response.content, companies)
+    for batch in retries:
+        scored.update(await _ascore_batch(batch))
+    return scored
+
+def _cached_batch_results(companies: List[Dict]):
+    cache = get_moat_cache()
+    scored, pending = {}, []
+    for company in companies:
+        cached = cache.get(_batch_key(company))
+        if cached is not None:
+            scored[company["company_name"]] = cached
+        else:
+            pending.append(company)
+    record(cache_hits=len(scored), cache_misses=len(pending))
+    return scored, pending
+
+def batch_moat_analysis(companies: List[Dict], batch_size: int) -> Dict[str, Dict]:
+    """Scores many companies with one LLM request per batch_size companies."""
+    scored, pending = _cached_batch_results(companies)
+    for start in range(0, len(pending), batch_size):
+        scored.update(_score_batch(pending[start:start + batch_size]))
+    return scored
+
+async def abatch_moat_analysis(companies: List[Dict], batch_size: int,
+                               concurrency: int = 1) -> Dict[str, Dict]:
+    """Async variant of batch_moat_analysis with up to `concurrency` batches in flight."""
+    scored, pending = _cached_batch_results(companies)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(batch: List[Dict]) -> Dict[str, Dict]:
+        async with semaphore:
+            return await _ascore_batch(batch)
 
-    return {
-        "moat_score": result["moat_score"],
-        "report_summary": result["narrative"]
-    }
\ No newline at end of file
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    for result in await asyncio.gather(*(run(batch) for batch in batches)):
+        scored.update(result)
+    return scored
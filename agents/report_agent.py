@@ -1,6 +1,10 @@
 from state import AgentState
 
+def format_report(company_name: str, final_score: float, report_summary: str) -> str:
+    """Investor-facing profile text for one company."""
+    return f"Ranked Profile for {company_name}: Score {final_score}. Moat Summary: {report_summary}"
+
 def report_agent(state: AgentState):
     """Produces investor-ready output."""
-    summary = f"Ranked Profile for {state['company_name']}: Score {state['final_score']}. Moat Summary: {state['report_summary']}"
-    return {"report": summary}
\ No newline at end of file
+    summary = format_report(state['company_name'], state['final_score'], state['report_summary'])
+    return {"report": summary}
@@ -0,0 +1,317 @@
+"""Throughput, latency and memory benchmarks for the ranking pipeline.
+
+Every (case, universe size) pair runs in its own interpreter so peak RSS
+is attributable to that case. Universes are synthetic companies with the
+same fields as data/companies.json, and the moat LLM is the offline fake
+backend with zero latency, so numbers measure our code rather than Gemini.
+LLM-path cases (workflow invoke, analyze_batch) run on a sample of at
+most --llm-sample companies; the ranking, loading and export cases run on
+the whole universe. Loading cases time reloads from the company store's
+Parquet cache (a fresh in-process cache each repeat): load_json returns
+full records, load_columns a projected columnar table.
+
+Every run also measures a fixed reference workload (JSON round trips
+and sorts of a 10k-company universe) in its own interpreter, and each
+case is compared relative to it: throughput as a multiple of the
+reference throughput, p95 latency in reference operations, peak RSS as
+a multiple of the reference interpreter's. benchmarks/baseline.json
+stores only those ratios, so it carries over between machines; the
+absolute numbers of a run go to --json. Lower relative throughput,
+higher relative p95 or higher relative RSS beyond the tolerance exits
+non-zero.
+
+    python benchmarks/pipeline.py [--sizes 100 10000 1000000] [--cases ...]
+                                  [--tolerance 0.25] [--update-baseline]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+SIZES = [100, 10_000, 1_000_000]
+CASES = ['workflow_invoke', 'analyze_batch', 'top_rankings', 'sector_analysis',
+         'load_json', 'load_columns', 'export_results']
+
+# Machine-speed yardstick measured in every run; cases are compared relative to it
+REFERENCE_CASE = 'reference'
+REFERENCE_SIZE = 10_000
+REFERENCE_REPEATS = 20
+# What baseline.json keeps per case: ratios to the reference, no machine-specific numbers
+BASELINE_FIELDS = ('case', 'size', 'rel_throughput', 'rel_p95', 'rel_rss')
+
+# Projection used by the load_columns case: just what scoring needs
+SCORING_COLUMNS = ['company_name', 'sector', 'operating_margin', 'growth_forecast']
+
+# Offline, unthrottled, uncached: every run does the same work
+BENCH_ENV = {
+    'LLM_BACKEND': 'fake',
+    'FAKE_LLM_LATENCY': 'fixed',
+    'FAKE_LLM_LATENCY_MS': '0',
+    'LLM_RPM': '0',
+    'LLM_TPM': '0',
+    'MOAT_CACHE_ENABLED': '0',
+    'MOAT_BATCH_SIZE': '1',
+}
+
+REGIONS = ['North America', 'Asia', 'Europe', 'Other']
+
+def synthetic_universe(size: int, seed: int = 0):
+    """`size` companies shaped like data/companies.json, spread over the weighted sectors."""
+    with open(os.path.join(ROOT, 'data', 'sector_weights.json')) as f:
+        sectors = sorted(json.load(f)['sector_weights'])
+    rng = random.Random(seed)
+    return [{
+        'company_name': f'Synthetic {i:07d}',
+        'sector': rng.choice(sectors),
+        'operating_margin': round(rng.uniform(-0.05, 0.65), 3),
+        'growth_forecast': round(rng.uniform(0.9, 2.0), 2),
+        'market_cap': rng.randint(500, 3_000_000),
+        'employees': rng.randint(50, 300_000),
+        'region': rng.choice(REGIONS),
+    } for i in range(size)]
+
+def synthetic_results(companies):
+    """Workflow-shaped results without running the workflow (for ranking/export cases)."""
+    from config.fake_llm import fake_moat
+    from utils.scoring import ScoringEngine
+    import pandas as pd
+    frame = pd.DataFrame(companies)
+    moats = [fake_moat(c['company_name'], c['sector']) for c in companies]
+    frame['moat_score'] = [m['moat_score'] for m in moats]
+    frame['report_summary'] = [m['narrative'] for m in moats]
+    scored = ScoringEngine().score(frame)
+    return scored[list(frame.columns) + ['margin_score', 'final_score']].to_dict('records')
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def peak_rss_mb() -> float:
+    import resource
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+def run_case(case: str, size: int, llm_sample: int, repeats: int):
+    """Run one case in this process; returns items processed and per-operation latencies."""
+    companies = synthetic_universe(size)
+    devnull = open(os.devnull, 'w')
+    latencies = []
+
+    if case == REFERENCE_CASE:
+        # Plain interpreter work of the kind every case does: serialize, parse, sort
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rows = json.loads(json.dumps(companies))
+            rows.sort(key=lambda c: (c['sector'], -c['growth_forecast'], c['company_name']))
+            latencies.append(time.perf_counter() - start)
+        return size * repeats, latencies, sum(latencies)
+
+    if case in ('workflow_invoke', 'analyze_batch'):
+        sample = companies[:llm_sample]
+        from utils.analysis_engine import AnalysisEngine
+        engine = AnalysisEngine()
+        engine.analyze_single_company(sample[0])  # build the workflow outside the timings
+        if case == 'workflow_invoke':
+            workflow = engine.workflow
+            for company in sample:
+                start = time.perf_counter()
+                workflow.invoke(company)
+                latencies.append(time.perf_counter() - start)
+            return len(sample), latencies, sum(latencies)
+        chunk = 10
+        wall = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            for i in range(0, len(sample), chunk):
+                start = time.perf_counter()
+                engine.analyze_batch(sample[i:i + chunk])
+                latencies.append(time.perf_counter() - start)
+        return len(sample), latencies, time.perf_counter() - wall
+
+    if case in ('load_json', 'load_columns'):
+        from utils.data_loader import DataLoader
+        loader = DataLoader()
+        with tempfile.TemporaryDirectory() as tmp:
+            loader.companies_json_path = os.path.join(tmp, 'companies.json')
+            loader.store.cache_dir = tmp
+            with open(loader.companies_json_path, 'w') as f:
+                json.dump(companies, f)
+            del companies
+            # Validation + Parquet conversion happens once per source version; time the reloads
+            loader.load_companies_table()
+            for _ in range(repeats):
+                loader.store.invalidate()
+                start = time.perf_counter()
+                if case == 'load_json':
+                    loader.load_companies_json()
+                else:
+                    loader.load_companies_table(columns=SCORING_COLUMNS)
+                latencies.append(time.perf_counter() - start)
+        return size * repeats, latencies, sum(latencies)
+
+    results = synthetic_results(companies)
+    if case == 'export_results':
+        from utils.data_loader import DataLoader
+        loader = DataLoader()
+        filename = f'_benchmark_{os.getpid()}.csv'
+        os.makedirs(os.path.join(ROOT, 'data', 'output'), exist_ok=True)
+        path = None
+        try:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                path = loader.export_results(results, filename)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            if path:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+        return size * repeats, latencies, sum(latencies)
+
+    from utils.analysis_engine import AnalysisEngine
+    engine = AnalysisEngine()
+    operation = {'top_rankings': lambda: engine.get_top_rankings(results, 20),
+                 'sector_analysis': lambda: engine.generate_sector_analysis(results)}[case]
+    for _ in range(repeats):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    return size * repeats, latencies, sum(latencies)
+
+def measure(case: str, size: int, llm_sample: int, repeats: int):
+    """Run a case in a fresh interpreter and summarize it."""
+    env = {**os.environ, **BENCH_ENV}
+    env.pop('GOOGLE_API_KEY', None)
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', case, str(size),
+                          '--llm-sample', str(llm_sample), '--repeats', str(repeats)],
+                         cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f'{case} @ {size} failed:\n{out.stderr}')
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def child(case: str, size: int, llm_sample: int, repeats: int):
+    sys.path.insert(0, ROOT)
+    items, latencies, seconds = run_case(case, size, llm_sample, repeats)
+    latencies.sort()
+    print(json.dumps({
+        'case': case,
+        'size': size,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'throughput': round(items / seconds, 2) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }))
+
+# Cases faster than this are too short to compare throughput / p95 reliably
+MIN_SECONDS = 0.05
+MIN_P95_DELTA_MS = 1.0
+
+def relative(row, reference):
+    """`row`'s throughput, p95 and peak RSS as ratios to the reference case of the same run."""
+    return {
+        'rel_throughput': round(row['throughput'] / reference['throughput'], 6),
+        'rel_p95': round(row['p95_ms'] / reference['p50_ms'], 6),
+        'rel_rss': round(row['peak_rss_mb'] / reference['peak_rss_mb'], 4),
+    }
+
+def compare(report, baseline, reference, tolerance: float):
+    """Regressions of `report` against `baseline` beyond `tolerance` (a fraction), in reference units."""
+    previous = {(r['case'], r['size']): r for r in baseline}
+    regressions = []
+    for row in report:
+        base = previous.get((row['case'], row['size']))
+        if base is None:
+            continue
+        if (row['seconds'] >= MIN_SECONDS
+                and row['rel_throughput'] < base['rel_throughput'] * (1 - tolerance)):
+            regressions.append(f"{row['case']}@{row['size']}: throughput "
+                               f"{row['rel_throughput']:.4g}x reference < baseline "
+                               f"{base['rel_throughput']:.4g}x")
+        if (row['rel_p95'] > base['rel_p95'] * (1 + tolerance)
+                and (row['rel_p95'] - base['rel_p95']) * reference['p50_ms'] > MIN_P95_DELTA_MS):
+            regressions.append(f"{row['case']}@{row['size']}: p95 {row['rel_p95']:.4g} "
+                               f"reference ops > baseline {base['rel_p95']:.4g}")
+        if row['rel_rss'] > base['rel_rss'] * (1 + tolerance):
+            regressions.append(f"{row['case']}@{row['size']}: peak RSS {row['rel_rss']:.3g}x "
+                               f"reference > baseline {base['rel_rss']:.3g}x")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Ranking pipeline benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--llm-sample', type=int, default=500,
+                        help='Companies run through the workflow in the LLM-path cases')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='Repetitions of the whole-universe cases')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown / growth vs the baseline (0.25 = 25%%)')
+    parser.add_argument('--json', default=os.path.join(ROOT, 'benchmarks', 'last_run.json'),
+                        help='Write measurements to this file')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Store this run as the new baseline instead of comparing')
+    parser.add_argument('--child', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], int(args.child[1]), args.llm_sample, args.repeats)
+        return 0
+
+    header = (f"{'case':16s} {'size':>9s} {'items/s':>12s} {'p50 ms':>10s} {'p95 ms':>10s} "
+              f"{'p99 ms':>10s} {'peak MB':>8s} {'x ref':>8s}")
+    reference = measure(REFERENCE_CASE, REFERENCE_SIZE, args.llm_sample, REFERENCE_REPEATS)
+    print(header)
+    print(f"{REFERENCE_CASE:16s} {REFERENCE_SIZE:9d} {reference['throughput']:12.1f} "
+          f"{reference['p50_ms']:10.3f} {reference['p95_ms']:10.3f} {reference['p99_ms']:10.3f} "
+          f"{reference['peak_rss_mb']:8.1f} {1:8.3g}")
+    report = []
+    for size in args.sizes:
+        for case in args.cases:
+            # The 1M universe only needs a couple of passes to be stable
+            repeats = args.repeats if size < 1_000_000 else min(args.repeats, 2)
+            row = measure(case, size, args.llm_sample, repeats)
+            row.update(relative(row, reference))
+            report.append(row)
+            print(f"{case:16s} {size:9d} {row['throughput']:12.1f} {row['p50_ms']:10.3f} "
+                  f"{row['p95_ms']:10.3f} {row['p99_ms']:10.3f} {row['peak_rss_mb']:8.1f} "
+                  f"{row['rel_throughput']:8.3g}")
+
+    with open(args.json, 'w') as f:
+        json.dump({'reference': reference, 'cases': report}, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump([{field: row[field] for field in BASELINE_FIELDS} for row in report], f,
+                      indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if any('rel_throughput' not in row for row in baseline):
+        print(f"❌ {args.baseline} holds absolute numbers; re-create it with --update-baseline")
+        return 1
+    regressions = compare(report, baseline, reference, args.tolerance)
+    if regressions:
+        print('\n'.join(f'❌ {r}' for r in regressions))
+        print(f'{len(regressions)} benchmark regression(s)')
+        return 1
+    print('✅ No regressions against the baseline')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Per-company memory of the in-memory result representations.
+
+Synthetic workflow results (the fields and report template of a real
+run, with LLM-length moat narratives) are serialized to JSON lines and
+read back into each container, as the run store and JSON exports do, so
+strings are not shared between rows unless the container shares them:
+
+    dict     a list of plain result dicts (the former representation)
+    record   a list of ResultRecords (what AnalysisEngine returns)
+    table    one ResultTable (what main.py keeps for --simulate / --sweep)
+
+Memory is what tracemalloc still holds once the container is built, so
+the JSON source lines are excluded; timings come from a separate,
+untraced build. Read time covers one pass over every row's final_score,
+sector and report_summary (records decode compressed narratives on
+access).
+
+    python benchmarks/result_memory.py [--sizes 10000 100000 1000000]
+                                       [--narrative-words 60] [--json PATH]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = [10_000, 100_000]
+CONTAINERS = ['dict', 'record', 'table']
+
+# Vocabulary for narratives that compress like prose rather than like a repeated sentence
+WORDS = ('moat', 'pricing', 'power', 'switching', 'costs', 'network', 'effects', 'scale',
+         'advantages', 'customers', 'ecosystem', 'software', 'accelerators', 'supply', 'chain',
+         'hyperscalers', 'data', 'centers', 'margins', 'capacity', 'competitors', 'demand',
+         'patents', 'design', 'wins', 'contracts', 'recurring', 'revenue', 'the', 'and', 'of',
+         'with', 'its', 'in', 'a', 'strong', 'durable', 'limited', 'growing', 'share')
+
+def synthetic_lines(size: int, narrative_words: int, seed: int = 0):
+    """`size` workflow-shaped results as JSON lines."""
+    from agents.report_agent import format_report
+    with open(os.path.join(ROOT, 'data', 'sector_weights.json')) as f:
+        sectors = sorted(json.load(f)['sector_weights'])
+    rng = random.Random(seed)
+    lines = []
+    for i in range(size):
+        name = f'Synthetic {i:07d}'
+        moat = rng.randint(0, 5)
+        margin = rng.randint(0, 10)
+        growth = round(rng.uniform(0.9, 2.0), 2)
+        final = round((moat + margin) * growth, 2)
+        summary = f"{name}: " + ' '.join(rng.choice(WORDS) for _ in range(narrative_words)) + '.'
+        lines.append(json.dumps({
+            'company_name': name,
+            'sector': rng.choice(sectors),
+            'operating_margin': round(rng.uniform(-0.05, 0.65), 3),
+            'moat_score': moat,
+            'growth_forecast': growth,
+            'final_score': final,
+            'report': format_report(name, final, summary),
+            'margin_score': margin,
+            'report_summary': summary,
+            'timestamp': time.time(),
+        }))
+    return lines
+
+def build(container: str, lines):
+    from utils.results import ResultRecord, ResultTable
+    rows = (json.loads(line) for line in lines)
+    if container == 'dict':
+        return list(rows)
+    if container == 'record':
+        return [ResultRecord(row) for row in rows]
+    return ResultTable(rows)
+
+def measure(container: str, lines):
+    # Timed untraced (tracemalloc slows allocation down), then rebuilt to count memory
+    start = time.perf_counter()
+    results = build(container, lines)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for result in results:
+        result['final_score'], result.get('sector'), result.get('report_summary')
+    read_seconds = time.perf_counter() - start
+    del results
+    gc.collect()
+    tracemalloc.start()
+    results = build(container, lines)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return {
+        'container': container,
+        'size': len(lines),
+        'bytes_per_company': round(retained / len(lines), 1),
+        'retained_mb': round(retained / 2 ** 20, 1),
+        'peak_mb': round(peak / 2 ** 20, 1),
+        'build_seconds': round(build_seconds, 3),
+        'read_seconds': round(read_seconds, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Result representation memory benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--containers', nargs='+', choices=CONTAINERS, default=CONTAINERS)
+    parser.add_argument('--narrative-words', type=int, default=60,
+                        help='Words per moat narrative (LLM narratives run ~40-80)')
+    parser.add_argument('--json', help='Also write the rows to this JSON file')
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'container':10s} {'size':>9s} {'B/company':>10s} {'vs dict':>8s} {'retained MB':>12s} "
+          f"{'build s':>8s} {'read s':>7s}")
+    for size in args.sizes:
+        lines = synthetic_lines(size, args.narrative_words)
+        baseline = None
+        for container in args.containers:
+            row = measure(container, lines)
+            if container == 'dict':
+                baseline = row['bytes_per_company']
+            row['vs_dict'] = round(row['bytes_per_company'] / baseline, 3) if baseline else None
+            rows.append(row)
+            ratio = f"{row['vs_dict']:7.0%}" if row['vs_dict'] is not None else '      -'
+            print(f"{container:10s} {size:9d} {row['bytes_per_company']:10.0f} {ratio:>8s} "
+                  f"{row['retained_mb']:12.1f} {row['build_seconds']:8.2f} {row['read_seconds']:7.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
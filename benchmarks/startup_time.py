@@ -0,0 +1,84 @@
+"""Cold-start timing for the CLI and dashboard entry points.
+
+Each target is imported in a fresh interpreter several times; the best
+wall time is compared with a budget, and the set of modules loaded at
+import time is checked so the LLM stack, pandas and plotly stay lazy.
+Exits non-zero on a regression.
+
+    python benchmarks/startup_time.py [--runs 5] [--budget-scale 1.0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (label, python statement, budget in seconds, modules that must not be loaded)
+TARGETS = [
+    ('settings', 'import config.settings', 0.15,
+     ['langchain_core', 'langchain_google_genai', 'pandas']),
+    ('cli', 'import main', 0.4,
+     ['langchain_core', 'langgraph', 'langchain_google_genai', 'pandas', 'numpy', 'plotly', 'pyarrow']),
+    ('cli --help', 'import sys, main; sys.argv = ["main.py", "--help"]; main.main()', 0.5,
+     []),
+    ('engine', 'from utils.analysis_engine import AnalysisEngine; AnalysisEngine()', 0.4,
+     ['langchain_core', 'langgraph', 'langchain_google_genai', 'pandas', 'pyarrow']),
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    exec({statement!r})
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+def measure(statement: str, runs: int):
+    """Best-of-N import time in a clean interpreter, plus the modules it loaded."""
+    env = dict(os.environ)
+    env.pop('GOOGLE_API_KEY', None)  # startup must not depend on the key
+    best, modules = None, []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement)],
+                             cwd=ROOT, env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f'{statement!r} failed:\n{out.stderr}')
+        probe = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or probe['seconds'] < best:
+            best, modules = probe['seconds'], probe['modules']
+    return best, set(modules)
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup-time regression check')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiply every budget (slow CI machines)')
+    parser.add_argument('--json', help='Write measurements to this file')
+    args = parser.parse_args()
+
+    failures, report = [], []
+    for label, statement, budget, forbidden in TARGETS:
+        seconds, modules = measure(statement, args.runs)
+        budget *= args.budget_scale
+        leaked = [m for m in forbidden if m in modules]
+        ok = seconds <= budget and not leaked
+        report.append({'target': label, 'seconds': round(seconds, 4),
+                       'budget': budget, 'leaked_modules': leaked, 'ok': ok})
+        print(f"{'✅' if ok else '❌'} {label:12s} {seconds * 1000:7.1f} ms "
+              f"(budget {budget * 1000:.0f} ms)" + (f"  eager imports: {', '.join(leaked)}" if leaked else ''))
+        if not ok:
+            failures.append(label)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if failures:
+        sys.exit(f"Startup regression in: {', '.join(failures)}")
+
+if __name__ == '__main__':
+    main()
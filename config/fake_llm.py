@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+from config.settings import (
+    FAKE_LLM_SEED, FAKE_LLM_LATENCY, FAKE_LLM_LATENCY_MS, FAKE_LLM_LATENCY_SIGMA,
+    FAKE_LLM_TAIL_ALPHA, FAKE_LLM_MALFORMED_RATE, FAKE_LLM_RATE_LIMIT_RATE,
+    FAKE_LLM_TIMEOUT_RATE, FAKE_LLM_TIMEOUT_SECONDS
+)
+
+LATENCY_PROFILES = ('fixed', 'lognormal', 'heavy_tail')
+
+class FakeRateLimitError(Exception):
+    """Mimics the Gemini client's HTTP 429 error."""
+    status_code = 429
+
+_SINGLE_COMPANY = re.compile(r'Company: (?P<name>.*)\nSector: (?P<sector>.*)\n')
+_BATCH_COMPANIES = re.compile(r'\(JSON list of company_name / sector\):\n(?P<payload>\[.*?\])\n', re.S)
+
+def _company_rng(seed: int, company_name: str, sector: str) -> random.Random:
+    # sha256 rather than hash() so scores don't change with PYTHONHASHSEED
+    digest = hashlib.sha256(f'{seed}|{company_name}|{sector}'.encode()).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+def fake_moat(company_name: str, sector: str, seed: int = 0) -> Dict:
+    """The deterministic moat result the fake backend returns for a company."""
+    rng = _company_rng(seed, company_name, sector)
+    score = rng.choices(range(6), weights=(1, 2, 3, 4, 3, 2))[0]
+    strength = ['no', 'a negligible', 'a narrow', 'a moderate', 'a wide', 'a dominant'][score]
+    return {
+        'company_name': company_name,
+        'moat_score': score,
+        'narrative': f'{company_name} holds {strength} moat in {sector} '
+                     f'(synthetic score, seed {seed}).'
+    }
+
+class FakeMoatLLM(BaseChatModel):
+    """Offline stand-in for Gemini that answers MOAT_PROMPT / MOAT_BATCH_PROMPT.
+
+    Scores are seeded per company, so runs are reproducible. Latency follows
+    a fixed, lognormal or heavy-tailed (Pareto) profile, and malformed JSON,
+    rate-limit errors and timeouts are injected at configurable rates.
+    Responses carry usage_metadata and the model keeps running token totals.
+    """
+
+    seed: int = FAKE_LLM_SEED
+    latency: str = FAKE_LLM_LATENCY
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    latency_sigma: float = FAKE_LLM_LATENCY_SIGMA
+    tail_alpha: float = FAKE_LLM_TAIL_ALPHA
+    malformed_rate: float = FAKE_LLM_MALFORMED_RATE
+    rate_limit_rate: float = FAKE_LLM_RATE_LIMIT_RATE
+    timeout_rate: float = FAKE_LLM_TIMEOUT_RATE
+    timeout_seconds: float = FAKE_LLM_TIMEOUT_SECONDS
+
+    _rng: random.Random = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _counters: Dict[str, int] = PrivateAttr()
+
+    def model_post_init(self, __context: Any):
+        if self.latency not in LATENCY_PROFILES:
+            raise ValueError(f"Unknown latency profile '{self.latency}'. "
+                             f"Available: {', '.join(LATENCY_PROFILES)}")
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                          'malformed': 0, 'rate_limited': 0, 'timeouts': 0}
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-moat'
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def _draw(self):
+        """Latency (seconds) and injected fault for one call."""
+        with self._lock:
+            self._counters['calls'] += 1
+            base = self.latency_ms / 1000.0
+            if self.latency == 'lognormal':
+                delay = base * self._rng.lognormvariate(0.0, self.latency_sigma)
+            elif self.latency == 'heavy_tail':
+                delay = base * self._rng.paretovariate(self.tail_alpha)
+            else:
+                delay = base
+            roll = self._rng.random()
+            fault = None
+            for kind, rate in (('rate_limited', self.rate_limit_rate),
+                               ('timeouts', self.timeout_rate),
+                               ('malformed', self.malformed_rate)):
+                if roll < rate:
+                    fault = kind
+                    break
+                roll -= rate
+            if fault:
+                self._counters[fault] += 1
+            return delay, fault
+
+    def _answer(self, prompt: str, malformed: bool) -> str:
+        batch = _BATCH_COMPANIES.search(prompt)
+        if batch:
+            companies = json.loads(batch.group('payload'))
+            content = json.dumps([fake_moat(c['company_name'], c['sector'], self.seed)
+                                  for c in companies])
+        else:
+            match = _SINGLE_COMPANY.search(prompt)
+            name, sector = (match.group('name'), match.group('sector')) if match else ('Unknown', 'Unknown')
+            result = fake_moat(name, sector, self.seed)
+            content = json.dumps({'moat_score': result['moat_score'], 'narrative': result['narrative']})
+        if malformed:
+            # Truncated reply wrapped in a fence, like a cut-off model answer
+            content = '```json\n' + content[:max(1, len(content) // 2)]
+        return content
+
+    def _result(self, messages: List[BaseMessage], fault: Optional[str]) -> ChatResult:
+        prompt = '\n'.join(str(m.content) for m in messages)
+        content = self._answer(prompt, fault == 'malformed')
+        usage = {'input_tokens': max(1, len(prompt) // 4),
+                 'output_tokens': max(1, len(content) // 4)}
+        usage['total_tokens'] = usage['input_tokens'] + usage['output_tokens']
+        with self._lock:
+            self._counters['prompt_tokens'] += usage['input_tokens']
+            self._counters['completion_tokens'] += usage['output_tokens']
+        message = AIMessage(content=content, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _raise(self, fault: Optional[str]):
+        if fault == 'rate_limited':
+            raise FakeRateLimitError('429 RESOURCE_EXHAUSTED: fake quota exceeded')
+        if fault == 'timeouts':
+            raise TimeoutError(f'Fake LLM request timed out after {self.timeout_seconds}s')
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        delay, fault = self._draw()
+        time.sleep(self.timeout_seconds if fault == 'timeouts' else delay)
+        self._raise(fault)
+        return self._result(messages, fault)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        delay, fault = self._draw()
+        await asyncio.sleep(self.timeout_seconds if fault == 'timeouts' else delay)
+        self._raise(fault)
+        return self._result(messages, fault)
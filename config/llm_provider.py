@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import weakref
+from typing import Callable, Dict, Optional
+from config.settings import (
+    LLM_BACKEND, LLM_MODEL, LLM_TEMPERATURE, LLM_POOL_SIZE, LLM_KEEPALIVE_EXPIRY,
+    require_api_key
+)
+
+class ConnectionStats:
+    """Counts HTTP requests and how many of them rode an already-open connection."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self._streams = weakref.WeakSet()
+        self._seen_ids = set()
+        self._lock = threading.Lock()
+
+    def _record(self, stream):
+        with self._lock:
+            self.requests += 1
+            try:
+                is_new = stream not in self._streams
+                if is_new:
+                    self._streams.add(stream)
+            except TypeError:
+                is_new = id(stream) not in self._seen_ids
+                self._seen_ids.add(id(stream))
+            if is_new:
+                self.connections_opened += 1
+
+    def response_hook(self, response):
+        """httpx response event hook; works for both sync and async clients."""
+        stream = response.extensions.get('network_stream')
+        if stream is not None:
+            self._record(stream)
+        if isinstance(response.stream, _async_byte_stream()):
+            return _noop()
+        return None
+
+    def as_dict(self) -> Dict:
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            'http_requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'connections_reused': reused,
+            'connection_reuse_rate': reused / self.requests if self.requests else 0.0
+        }
+
+def _async_byte_stream():
+    import httpx
+    return httpx.AsyncByteStream
+
+async def _noop():
+    return None
+
+# A backend factory receives the provider options and returns a LangChain chat model
+BackendFactory = Callable[[Dict], object]
+
+_BACKENDS: Dict[str, BackendFactory] = {}
+
+def register_backend(name: str, factory: BackendFactory):
+    """Register an LLM backend selectable through LLM_BACKEND."""
+    _BACKENDS[name] = factory
+
+def _gemini_backend(options: Dict):
+    require_api_key()
+    import httpx
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    pool_size = options['pool_size']
+    return ChatGoogleGenerativeAI(
+        model=options['model'],
+        temperature=options['temperature'],
+        client_args={
+            'limits': httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=options['keepalive_expiry']
+            ),
+            'event_hooks': {'response': [options['connection_stats'].response_hook]}
+        }
+    )
+
+def _fake_backend(options: Dict):
+    from config.fake_llm import FakeMoatLLM
+    return FakeMoatLLM()
+
+register_backend('gemini', _gemini_backend)
+register_backend('fake', _fake_backend)
+
+class LLMProvider:
+    """Process-wide owner of the chat model and the prompt chains built on it.
+
+    One model instance is shared by every sync caller (its HTTP client pools
+    keep-alive connections); async callers get one instance per event loop,
+    since pooled async connections cannot outlive the loop that opened them.
+    """
+
+    def __init__(self, backend: str = LLM_BACKEND, pool_size: int = LLM_POOL_SIZE,
+                 model: str = LLM_MODEL, temperature: float = LLM_TEMPERATURE):
+        self.backend = backend
+        self.pool_size = pool_size
+        self.model = model
+        self.temperature = temperature
+        self.connection_stats = ConnectionStats()
+        self.instances_created = 0
+        self.llm_requests = 0
+        self._injected = None
+        self._sync_slot = None
+        self._loop_slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _create(self):
+        if self.backend not in _BACKENDS:
+            raise ValueError(f"Unknown LLM backend '{self.backend}'. "
+                             f"Available: {', '.join(sorted(_BACKENDS))}")
+        self.instances_created += 1
+        return _BACKENDS[self.backend]({
+            'model': self.model,
+            'temperature': self.temperature,
+            'pool_size': self.pool_size,
+            'keepalive_expiry': LLM_KEEPALIVE_EXPIRY,
+            'connection_stats': self.connection_stats
+        })
+
+    def _slot(self) -> Dict:
+        # A slot holds one model instance plus the chains built on it
+        if self._injected is not None:
+            return self._injected
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            if self._sync_slot is None:
+                self._sync_slot = {'llm': self._create(), 'chains': {}}
+            return self._sync_slot
+        slot = self._loop_slots.get(loop)
+        if slot is None:
+            slot = self._loop_slots[loop] = {'llm': self._create(), 'chains': {}}
+        return slot
+
+    def get_llm(self):
+        """Shared chat model for the calling context."""
+        with self._lock:
+            self.llm_requests += 1
+            return self._slot()['llm']
+
+    def get_chain(self, prompt):
+        """Reusable `prompt | llm` chain for the calling context."""
+        with self._lock:
+            self.llm_requests += 1
+            slot = self._slot()
+            chain = slot['chains'].get(id(prompt))
+            if chain is None:
+                chain = slot['chains'][id(prompt)] = prompt | slot['llm']
+            return chain
+
+    def set_backend(self, backend: str):
+        """Switch to another registered backend, dropping cached instances."""
+        with self._lock:
+            self.backend = backend
+            self._injected = None
+            self._sync_slot = None
+            self._loop_slots = weakref.WeakKeyDictionary()
+
+    def inject(self, llm: Optional[object]):
+        """Serve a ready-made model (e.g. a local stand-in) to every caller; None resets."""
+        with self._lock:
+            self._injected = None if llm is None else {'llm': llm, 'chains': {}}
+
+    @property
+    def model_id(self) -> str:
+        """Model identity used in cache keys; non-Gemini backends never share entries with Gemini."""
+        if self._injected is not None:
+            return f"injected:{type(self._injected['llm']).__name__}"
+        if self.backend == 'gemini':
+            return self.model
+        if self.backend == 'fake':
+            from config.settings import FAKE_LLM_SEED
+            return f"fake:seed={FAKE_LLM_SEED}"
+        return f"{self.backend}:{self.model}"
+
+    def stats(self) -> Dict:
+        reused = max(0, self.llm_requests - self.instances_created)
+        return {
+            'backend': self.backend,
+            'pool_size': self.pool_size,
+            'llm_requests': self.llm_requests,
+            'instances_created': self.instances_created,
+            'instance_reuse_rate': reused / self.llm_requests if self.llm_requests else 0.0,
+            **self.connection_stats.as_dict()
+        }
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider() -> LLMProvider:
+    """Process-wide LLM provider."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = LLMProvider()
+        return _provider
@@ -1,21 +1,114 @@
 import os
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Set your API Key
+# Set your API Key (checked when the Gemini backend is first used, not at import)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
+def require_api_key() -> str:
+    """Return the Google API key, raising if it is not configured."""
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
+    os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+    return GOOGLE_API_KEY
 
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+# Model settings (also part of the moat cache key)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+
+# LLM client: backend registered in config/llm_provider.py and HTTP pool sizing
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))  # seconds
+
+# Offline fake backend (LLM_BACKEND=fake): seeded scores, latency profile and fault injection
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "fixed")  # fixed | lognormal | heavy_tail
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))  # fixed value / median / minimum
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))  # lognormal spread
+FAKE_LLM_TAIL_ALPHA = float(os.getenv("FAKE_LLM_TAIL_ALPHA", "1.5"))  # Pareto shape for heavy_tail
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+FAKE_LLM_TIMEOUT_RATE = float(os.getenv("FAKE_LLM_TIMEOUT_RATE", "0"))
+FAKE_LLM_TIMEOUT_SECONDS = float(os.getenv("FAKE_LLM_TIMEOUT_SECONDS", "1.0"))
+
+# Shared LLM rate limits (0 disables a limit) and 429 retry/backoff policy
+LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "400"))  # per-company estimate
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))  # seconds
+
+# Maximum number of companies analyzed in flight by the async batch path
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))
+
+# On-disk caches (moat scores, run checkpoints, ...)
+CACHE_DIR = os.getenv("CACHE_DIR", "data/cache")
+MOAT_CACHE_ENABLED = os.getenv("MOAT_CACHE_ENABLED", "1") != "0"
+MOAT_CACHE_TTL = int(os.getenv("MOAT_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+MOAT_CACHE_MAX_ENTRIES = int(os.getenv("MOAT_CACHE_MAX_ENTRIES", "50000"))
+
+# Batch-run checkpoints (data/cache/runs.sqlite): results per write / max seconds between writes
+CHECKPOINT_BATCH_SIZE = int(os.getenv("CHECKPOINT_BATCH_SIZE", "25"))
+CHECKPOINT_FLUSH_SECONDS = float(os.getenv("CHECKPOINT_FLUSH_SECONDS", "5"))
+
+# Per-company workflow traces (CACHE_DIR/traces/<session>/) and Prometheus metrics file;
+# only the newest TRACE_KEEP_SESSIONS sessions are kept on disk, and older ones are removed
+# once no process of theirs is alive and nothing was written for TRACE_PRUNE_GRACE_SECONDS
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") != "0"
+TRACE_KEEP_SESSIONS = int(os.getenv("TRACE_KEEP_SESSIONS", "20"))
+TRACE_PRUNE_GRACE_SECONDS = float(os.getenv("TRACE_PRUNE_GRACE_SECONDS", "3600"))
+
+# Result exports (data/output): results per write, max seconds between writes, Parquet codec
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/output")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "100"))
+EXPORT_FLUSH_SECONDS = float(os.getenv("EXPORT_FLUSH_SECONDS", "5"))
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+# Max age (seconds) of a stored result that the dashboard / job workers reuse for unchanged inputs
+RESULT_REUSE_MAX_AGE = int(os.getenv("RESULT_REUSE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Dashboard background analysis: worker threads, progress poll interval, hand jobs to the job queue
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "1"))
+DASHBOARD_POLL_SECONDS = float(os.getenv("DASHBOARD_POLL_SECONDS", "1.0"))
+DASHBOARD_JOB_QUEUE = os.getenv("DASHBOARD_JOB_QUEUE", "0") != "0"
+
+# Job queue (CACHE_DIR/jobs.sqlite): seconds before a silent worker's job is requeued, idle poll,
+# and how often a running worker renews its lease and reports progress
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2.0"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5.0"))
+
+# Monte Carlo rank stability: default draws, forecast uncertainty (absolute margin sd,
+# relative lognormal growth sigma), array elements per chunk, draws kept for score bands
+SIM_DRAWS = int(os.getenv("SIM_DRAWS", "100000"))
+SIM_MARGIN_SD = float(os.getenv("SIM_MARGIN_SD", "0.03"))
+SIM_GROWTH_SIGMA = float(os.getenv("SIM_GROWTH_SIGMA", "0.10"))
+SIM_CHUNK_ELEMENTS = int(os.getenv("SIM_CHUNK_ELEMENTS", "4000000"))
+SIM_SCORE_SAMPLE = int(os.getenv("SIM_SCORE_SAMPLE", "100000"))
+
+# Score history (append-only, one Parquet partition per run plus a SQLite index):
+# location, on/off, rows per Parquet part
+HISTORY_DIR = os.getenv("HISTORY_DIR", "data/history")
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") != "0"
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "50000"))
+
+# Weight sweeps: score-matrix entries (configurations × companies) per chunk, and the
+# largest configuration grid accepted
+SWEEP_CHUNK_ELEMENTS = int(os.getenv("SWEEP_CHUNK_ELEMENTS", "8000000"))
+SWEEP_MAX_CONFIGS = int(os.getenv("SWEEP_MAX_CONFIGS", "100000"))
+
+# Top of the moat scale in the prompts below; parsed scores are clamped to [0, MOAT_SCORE_MAX]
+MOAT_SCORE_MAX = 5
+
+# Companies scored per LLM request in batched moat mode (1 = one request per company)
+MOAT_BATCH_SIZE = int(os.getenv("MOAT_BATCH_SIZE", "1"))
 
 # Prompt for moat analysis
-MOAT_PROMPT = ChatPromptTemplate.from_template("""
+MOAT_PROMPT_TEMPLATE = """
 You are a Senior Equity Research Analyst. Your task is to score the 'Moat' of a company
 contributing to the AI Factory Capital Stack.
 
@@ -37,11 +130,51 @@ Return ONLY a JSON object in this format:
   "moat_score": integer,
   "narrative": "string summary"
 }}
-""")
+"""
+
+# Prompt for scoring several companies in one request (batched moat mode)
+MOAT_BATCH_PROMPT_TEMPLATE = """
+You are a Senior Equity Research Analyst. Your task is to score the 'Moat' of each company
+below as a contributor to the AI Factory Capital Stack.
+
+Companies (JSON list of company_name / sector):
+{companies}
+
+Criteria for Moat Score (0-5):
+1. Architectural lock-in (e.g., proprietary standards like CUDA)
+2. Ecosystem dominance (design wins, reference architectures)
+3. Switching costs / standard-setting influence
+4. Scarcity or bottleneck position in the supply chain
+
+Analysis Task (for every company listed):
+- Briefly describe the company's differentiation in the AI Factory ecosystem.
+- Assign a Moat Score from 0 to 5 based on the criteria above.
+
+Return ONLY a JSON array with exactly one object per company, using the
+company_name exactly as given:
+[
+  {{
+    "company_name": "string",
+    "moat_score": integer,
+    "narrative": "string summary"
+  }}
+]
+"""
+
+_PROMPT_TEMPLATES = {
+    "MOAT_PROMPT": MOAT_PROMPT_TEMPLATE,
+    "MOAT_BATCH_PROMPT": MOAT_BATCH_PROMPT_TEMPLATE
+}
+
+def __getattr__(name):
+    # Prompts are built on first access so importing settings doesn't load LangChain
+    if name in _PROMPT_TEMPLATES:
+        from langchain_core.prompts import ChatPromptTemplate
+        prompt = globals().setdefault(name, ChatPromptTemplate.from_template(_PROMPT_TEMPLATES[name]))
+        return prompt
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Initialize the model
+# Shared model instance (see config/llm_provider.py)
 def get_llm():
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.2
-    )
\ No newline at end of file
+    from config.llm_provider import get_provider
+    return get_provider().get_llm()
\ No newline at end of file
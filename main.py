@@ -1,10 +1,117 @@
 # main.py - Enhanced version
+import os
 import json
 import sys
+import time
 import argparse
-from utils.workflow import create_workflow
 from utils.data_loader import DataLoader
 from utils.analysis_engine import AnalysisEngine
+from utils.live_rankings import LiveRankings
+from utils.ranking_index import RankingIndex
+from utils.results import ResultTable
+from utils.run_store import RunStore
+from utils.job_queue import JobQueue, JobWorker, PRIORITY_BATCH
+from utils.score_history import get_score_history
+from utils.moat_cache import get_moat_cache
+from config.llm_provider import get_provider
+from utils.rate_limiter import get_rate_limiter
+from utils.tracing import get_tracer, format_breakdown, write_prometheus
+from config.settings import MOAT_BATCH_SIZE, EXPORT_DIR
+
+def report_partial_export(sink):
+    """Flush an interrupted run's export and say where the partial output is."""
+    if sink is None:
+        return
+    sink.flush()
+    if sink.rows_written:
+        partial = '' if sink.fmt == 'parquet' else ' (as .partial files)'
+        print(f"📁 {sink.rows_written} results so far in {sink.location}{partial}")
+
+def show_jobs(queue, job_id=None, limit=20):
+    """Print recent jobs, or one job's progress and its leading results."""
+    jobs = [queue.status(job_id)] if job_id else queue.list_jobs(limit=limit)
+    if not jobs or jobs[0] is None:
+        print(f"❌ Unknown job id: {job_id}" if job_id else "No jobs queued yet")
+        return
+    for job in jobs:
+        print(f"{job['job_id']}  {job['status']:9s} priority {job['priority']:3d}  "
+              f"{job['processed']}/{job['total']} done ({job['reused']} reused, {job['errors']} errors)  "
+              f"{job['label']}{'  worker ' + job['worker'] if job['worker'] else ''}")
+        if job['error']:
+            print(f"    ❌ {job['error']}")
+    if job_id:
+        results = [r for r in queue.results(job_id).values() if 'error' not in r]
+        for rank, result in enumerate(RankingIndex.from_results(results).top(limit), 1):
+            print(f"{rank:2d}. {result['company_name']:25s} Score: {result.get('final_score', 0):7.2f}")
+
+def show_history(history, company_name=None, movers=None, sector_trends=False, limit=20):
+    """Print a company's score history, rank movers between two runs, or sector trends."""
+    if company_name:
+        rows = history.company_history(company_name, limit)
+        if not rows:
+            print(f"❌ No recorded runs include {company_name}")
+            return
+        print(f"📜 {company_name}: last {len(rows)} run(s)")
+        for row in rows:
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(row['finished_at']))}  "
+                  f"{row['run_id']}  rank {row['rank']:4d}/{row['companies']:<5d} "
+                  f"score {row['final_score']:7.2f}  moat {row['moat_score']}  margin {row['margin_score']}")
+    if movers is not None:
+        diff = history.movers(*(movers or (None, None)), limit=limit)
+        if diff is None:
+            print("❌ Need two recorded runs to compare" if not movers else
+                  f"❌ Unknown run id in: {' '.join(movers)}")
+            return
+        print(f"\n🔀 RANK MOVERS {diff['from']} → {diff['to']} ({diff['compared']} companies in both, "
+              f"{diff['entered']} new, {diff['dropped']} dropped)")
+        for title, rows in (('Risers', diff['risers']), ('Fallers', diff['fallers'])):
+            print(f"{title}:")
+            for row in rows:
+                print(f"  {row['company_name']:25s} {row['rank_from']:4d} → {row['rank_to']:<4d} "
+                      f"({row['change']:+d})  score {row['score_from']:.2f} → {row['score_to']:.2f}")
+    if sector_trends:
+        rows = history.sector_trends()
+        if not rows:
+            print("❌ No recorded runs yet")
+            return
+        by_sector = {}
+        for row in rows:
+            by_sector.setdefault(row['sector'], []).append(row)
+        print(f"\n📈 SECTOR TRENDS (average TAFGS, oldest → newest of the last {limit} runs)")
+        for sector, points in sorted(by_sector.items()):
+            points = points[-limit:]
+            print(f"{sector:25s} " + " ".join(f"{p['avg_score']:6.2f}" for p in points)
+                  + f"  ({points[-1]['avg_score'] - points[0]['avg_score']:+.2f})")
+
+def show_simulation(report, limit=20):
+    """Print rank bands and top-K odds from a RankSimulator report."""
+    print(f"\n🎲 RANK STABILITY ({report['draws']:,} draws in {report['seconds']:.1f}s, "
+          f"top {report['k']})")
+    print("=" * 60)
+    for company in report['companies'][:limit]:
+        print(f"{company['company_name']:25s} P(top {report['k']}): {company['p_top_k']:6.1%}  "
+              f"rank {company['base_rank']:3d} (90% band {company['rank_p5']}-{company['rank_p95']})  "
+              f"score {company['score_p5']:.1f}-{company['score_p95']:.1f}")
+    print(f"\n{'Sector':25s} {'Expected seats':>14s} {'90% band':>9s} {'Best rank (median)':>19s}")
+    for sector in report['sectors']:
+        print(f"{sector['sector']:25s} {sector['expected_top_k']:14.2f} "
+              f"{sector['top_k_p5']:>4d}-{sector['top_k_p95']:<4d} {sector['best_rank_p50']:19d}")
+
+def show_sweep(report, limit=20):
+    """Print each company's rank range across a WeightSweep's configurations."""
+    print(f"\n⚖️  WEIGHT SWEEP ({report['configs']:,} configurations in {report['seconds']:.2f}s"
+          f"{', varying ' + ', '.join(report['axes']) if report['axes'] else ''})")
+    print("=" * 60)
+    for company in report['summary'][:limit]:
+        print(f"{company['base_rank']:3d}. {company['company_name']:25s} "
+              f"rank {company['best_rank']}-{company['worst_rank']} (mean {company['mean_rank']:.1f})  "
+              f"P(top {report['k']}): {company['p_top_k']:6.1%}  "
+              f"leads {company['leads']} config(s)")
+    movers = sorted((c for c in report['summary'] if c['best_rank'] <= report['k']),
+                    key=lambda c: -c['rank_range'])[:5]
+    if movers and movers[0]['rank_range']:
+        print("\nMost weight-sensitive contenders: " + ", ".join(
+            f"{c['company_name']} ({c['best_rank']}-{c['worst_rank']})" for c in movers if c['rank_range']))
 
 def main():
     parser = argparse.ArgumentParser(description='AI Factory Growth Ranker')
@@ -12,8 +119,65 @@ def main():
                        default='cli', help='Run mode')
     parser.add_argument('--limit', type=int, default=20, 
                        help='Number of companies to analyze')
+    parser.add_argument('--source', choices=['companies', 'dataset', 'csv'], default='companies',
+                       help='Company source: data/companies.json, data/company_dataset.txt or data/companies.csv')
+    parser.add_argument('--input', metavar='PATH',
+                       help='Stream every company in a JSON-array / JSON-lines file in bounded chunks '
+                            '(--limit sets the leaderboard size; not checkpointed)')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                       help='Companies held in memory at a time with --input')
     parser.add_argument('--export', action='store_true', 
-                       help='Export results to CSV')
+                       help='Export every result while the run progresses, plus the final rankings')
+    parser.add_argument('--export-format', choices=['csv', 'jsonl', 'parquet'], default='csv',
+                       help='Export file format (parquet is zstd-compressed)')
+    parser.add_argument('--export-partition', choices=['date', 'sector'],
+                       help='Partition exports Hive-style by run date or sector')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Companies analyzed in parallel (1 = sequential)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes, each analyzing a shard of the companies')
+    parser.add_argument('--moat-batch-size', type=int, default=MOAT_BATCH_SIZE,
+                       help='Companies scored per moat LLM request (1 = one request each)')
+    parser.add_argument('--no-prune', action='store_true',
+                       help='With --mode top20, analyze every company instead of pruning by score bound')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only re-analyze companies that changed since the last incremental run')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                       help='Resume a checkpointed run, retrying only failed/unfinished companies')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Bypass the moat-score cache for this run')
+    parser.add_argument('--purge-cache', action='store_true',
+                       help='Delete all cached moat scores before running')
+    parser.add_argument('--submit', action='store_true',
+                       help='Queue the companies as a job for the worker pool instead of analyzing them here')
+    parser.add_argument('--priority', type=int, default=PRIORITY_BATCH,
+                       help='Job priority for --submit (higher runs first; dashboard requests use 10)')
+    parser.add_argument('--job-worker', action='store_true',
+                       help='Run a long-lived worker that processes queued jobs (uses --concurrency)')
+    parser.add_argument('--drain', action='store_true',
+                       help='With --job-worker, exit once the queue is empty')
+    parser.add_argument('--jobs', action='store_true',
+                       help='List recent jobs and their progress')
+    parser.add_argument('--job', metavar='JOB_ID',
+                       help="Show a job's status and its top --limit results")
+    parser.add_argument('--simulate', type=int, metavar='DRAWS',
+                       help='After the run, simulate forecast uncertainty over DRAWS scenarios '
+                            'and report rank stability (uses --workers processes)')
+    parser.add_argument('--sweep', metavar='SPEC',
+                       help='After the run, rank the results under every weight configuration in '
+                            'SPEC (JSON: a list of sector_weights.json-style configs, or a grid '
+                            'of candidate values per sector / growth tier)')
+    parser.add_argument('--top-k', type=int, default=20, metavar='K',
+                       help='Top-K cut-off for --simulate and --sweep (default: 20)')
+    parser.add_argument('--history', metavar='COMPANY',
+                       help="Show a company's score, moat and rank over the last --limit recorded runs")
+    parser.add_argument('--movers', nargs='*', metavar='RUN_ID',
+                       help='Show the biggest rank movers between two recorded runs '
+                            '(default: the two latest)')
+    parser.add_argument('--sector-trends', action='store_true',
+                       help='Show average TAFGS per sector over the recorded runs')
+    parser.add_argument('--llm-backend', metavar='NAME',
+                       help="LLM backend for this run, e.g. 'fake' for offline runs (default: LLM_BACKEND)")
     
     args = parser.parse_args()
     
@@ -22,27 +186,148 @@ def main():
         subprocess.run(["streamlit", "run", "streamlit_app.py"])
         return
     
+    if args.jobs or args.job:
+        show_jobs(JobQueue(), args.job, args.limit)
+        return
+    
+    if args.history or args.movers is not None or args.sector_trends:
+        if args.movers and len(args.movers) != 2:
+            parser.error('--movers takes two run ids (or none for the two latest runs)')
+        show_history(get_score_history(), args.history, args.movers, args.sector_trends, args.limit)
+        return
+    
+    if args.llm_backend:
+        # Exported so --workers child processes pick the same backend
+        os.environ['LLM_BACKEND'] = args.llm_backend
+        get_provider().set_backend(args.llm_backend)
+    
     # Initialize components
-    engine = AnalysisEngine()
+    tracer = get_tracer()
+    engine = AnalysisEngine(moat_batch_size=args.moat_batch_size)
     data_loader = DataLoader()
+    moat_cache = get_moat_cache()
+    if args.purge_cache:
+        print(f"🧹 Purged {moat_cache.purge()} cached moat scores")
+    if args.no_cache:
+        moat_cache.enabled = False
+    
+    if args.submit:
+        companies = data_loader.get_top_companies(args.limit, args.source)
+        if not companies:
+            print(f"❌ No company data found. Please check {data_loader.source_path(args.source)}")
+            return
+        job_id = JobQueue().submit(companies, args.priority, label=f'cli:{args.source}:{args.limit}')
+        print(f"📬 Queued {len(companies)} companies as job {job_id} (priority {args.priority}); "
+              f"follow it with --job {job_id}")
+        return
+    
+    if args.job_worker:
+        worker = JobWorker(engine, concurrency=args.concurrency)
+        try:
+            worker.run(drain=args.drain)
+        except KeyboardInterrupt:
+            pass
+        print(f"👋 Worker stopped after {worker.jobs_run} job(s)")
+        return
     
     print(f"🏭 AI Factory Growth Ranker - Analyzing Top {args.limit} Companies")
     print("=" * 60)
     
-    # Load companies
-    companies = data_loader.get_top_companies(args.limit)
+    # Run analysis, keeping a live leaderboard as results stream in
+    live = LiveRankings(args.limit)
+    analyzed = ResultTable()  # every scored result (columnar), for --simulate / --sweep
+    sink = (data_loader.export_sink(f"results_{time.strftime('%Y%m%d-%H%M%S')}",
+                                    args.export_format, args.export_partition)
+            if args.export else None)
     
-    if not companies:
-        print("❌ No company data found. Please check data/companies.json")
-        return
-    
-    print(f"📊 Found {len(companies)} companies to analyze...")
+    def track(result):
+        live.add(result)
+        if args.simulate or args.sweep:
+            analyzed.append(result)
+        if sink is not None:
+            sink.write(result)
+        leader = live.top(1)
+        if 'error' in result:
+            print(f"   ⚠️  {result['company_name']}: {result['error'][:80]}")
+        elif leader:
+            print(f"   ↳ {result['company_name']}: {result.get('final_score', 0):.2f} | "
+                  f"leader {leader[0]['company_name']} ({leader[0].get('final_score', 0):.2f}) | "
+                  f"top-{args.limit} cutoff {live.cutoff():.2f}")
     
-    # Run analysis
-    results = engine.analyze_batch(companies)
+    if args.input:
+        if not os.path.exists(args.input):
+            print(f"❌ Input file not found: {args.input}")
+            return
+        print(f"📊 Streaming companies from {args.input} in chunks of {args.chunk_size}...")
+        chunks = data_loader.iter_company_chunks(args.input, args.chunk_size)
+        stream = engine.iter_stream(chunks, args.concurrency, args.workers, label='cli:stream')
+        try:
+            for result in stream:
+                track(result)
+        except KeyboardInterrupt:
+            stream.close()
+            print(f"\n⏸️  Interrupted after {live.processed} companies")
+            report_partial_export(sink)
+            return
+        print(f"\n📊 Analyzed {live.processed} companies ({live.errors} errors)")
+    elif args.mode == 'top20' and not (args.no_prune or args.resume or args.incremental):
+        # Screen the whole source for the top --limit, skipping companies whose bound can't rank
+        companies = data_loader.load_companies(args.source)
+        if not companies:
+            print(f"❌ No company data found. Please check {data_loader.source_path(args.source)}")
+            return
+        print(f"📊 Screening {len(companies)} companies for the top {args.limit}...")
+        stream = engine.iter_top_k(companies, args.limit, args.concurrency)
+        try:
+            for result in stream:
+                track(result)
+        except KeyboardInterrupt:
+            stream.close()
+            print(f"\n⏸️  Interrupted after {live.processed} companies")
+            report_partial_export(sink)
+            return
+        screen = engine.last_top_k
+        print(f"\n✂️  Pruned {screen['pruned']} of {screen['total']} companies "
+              f"(~{screen['llm_calls_avoided']} LLM calls avoided)")
+    else:
+        # Load companies (a resumed run keeps the company list it started with; an
+        # unpruned top20 run analyzes the whole source and ranks the top --limit)
+        run_info = RunStore().run_info(args.resume) if args.resume else None
+        if args.resume and run_info is None:
+            print(f"❌ Unknown run id: {args.resume}")
+            return
+        if run_info:
+            companies = run_info['companies']
+        elif args.mode == 'top20':
+            companies = data_loader.load_companies(args.source)
+        else:
+            companies = data_loader.get_top_companies(args.limit, args.source)
+        
+        if not companies:
+            print(f"❌ No company data found. Please check {data_loader.source_path(args.source)}")
+            return
+        
+        print(f"📊 Found {len(companies)} companies to analyze...")
+        
+        if args.incremental:
+            for result in engine.analyze_incremental(companies, args.concurrency):
+                track(result)
+        else:
+            stream = engine.iter_checkpointed(companies, args.resume, args.concurrency, args.workers,
+                                              label=f'cli:{args.source}')
+            try:
+                for result in stream:
+                    track(result)
+            except KeyboardInterrupt:
+                stream.close()
+                print(f"\n⏸️  Interrupted; resume with --resume {engine.last_run_id}")
+                report_partial_export(sink)
+                return
+            print(f"\n💾 Run checkpointed as {engine.last_run_id} "
+                  f"(resume with --resume {engine.last_run_id})")
     
-    # Get rankings
-    rankings = engine.get_top_rankings(results, args.limit)
+    # Get rankings (a pruned screen ranks ties by input order, like a full run)
+    rankings = engine.last_top_k['rankings'] if engine.last_top_k else live.top()
     
     # Display results
     print(f"\n🏆 TOP {len(rankings)} AI FACTORY COMPANIES")
@@ -64,11 +349,70 @@ def main():
         print(f"{sector:25s} Companies: {stats['count']:2d} "
               f"Avg Score: {stats['avg_score']:6.2f}")
     
+    if args.simulate:
+        from utils.simulation import RankSimulator
+        with tracer.span('simulate'):
+            report = RankSimulator(k=args.top_k, draws=args.simulate,
+                                   workers=args.workers).run(analyzed)
+        if report['draws']:
+            show_simulation(report, args.limit)
+    
+    if args.sweep:
+        try:
+            with open(args.sweep) as f:
+                spec = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Could not read sweep spec {args.sweep}: {e}")
+            return
+        ranks_path = (os.path.join(EXPORT_DIR, f"weight_sweep_{time.strftime('%Y%m%d-%H%M%S')}.npy")
+                      if args.export else None)
+        if ranks_path:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+        with tracer.span('sweep'):
+            report = engine.sweep_weights(
+                analyzed, configs=spec if isinstance(spec, list) else None,
+                grid=spec if isinstance(spec, dict) else None, k=args.top_k,
+                keep_ranks=False, ranks_path=ranks_path)
+        if report['configs']:
+            show_sweep(report, args.limit)
+            if ranks_path:
+                print(f"📁 Rank matrix ({report['configs']} configurations × "
+                      f"{len(report['columns'])} companies) saved to: {ranks_path}")
+    
+    cache_stats = moat_cache.stats()
+    if cache_stats['enabled']:
+        print(f"\n💾 Moat cache: {cache_stats['hits']} hits, "
+              f"{cache_stats['misses']} misses ({cache_stats['entries']} entries)")
+    limiter_stats = get_rate_limiter().stats()
+    if limiter_stats['requests']:
+        print(f"⏱️  Rate limiter: {limiter_stats['requests']} requests, "
+              f"{limiter_stats['rate_limited']} rate-limited, "
+              f"{limiter_stats['wait_seconds']:.1f}s throttled")
+    llm_stats = get_provider().stats()
+    if llm_stats['llm_requests']:
+        print(f"🔌 LLM client: {llm_stats['instances_created']} instance(s) for "
+              f"{llm_stats['llm_requests']} calls, {llm_stats['connections_reused']}/"
+              f"{llm_stats['http_requests']} HTTP requests on reused connections")
+    
     # Export if requested
     if args.export:
-        output_file = data_loader.export_results(rankings, 
-                                                f'top_{args.limit}_rankings.csv')
-        print(f"\n📁 Results exported to: {output_file}")
+        with tracer.span('export'):
+            sink.close()
+            output_file = data_loader.export_results(rankings, 
+                                                    f'top_{args.limit}_rankings.{args.export_format}',
+                                                    args.export_partition)
+        print(f"\n📁 All {sink.rows_written} results exported to: {sink.location}")
+        print(f"📁 Rankings exported to: {output_file}")
+    
+    # Where the time went, per workflow stage (all worker processes included)
+    if tracer.enabled:
+        summary = tracer.summary()
+        if summary['traces']:
+            print(f"\n⏱️  STAGE BREAKDOWN (session {tracer.session})")
+            print("=" * 60)
+            for line in format_breakdown(summary):
+                print(line)
+            print(f"📈 Traces: {tracer.directory} | metrics: {write_prometheus(summary)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,21 +1,19 @@
 import streamlit as st
-import json
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from utils.workflow import create_workflow
 from state import AgentState
 import time
 from utils.data_loader import DataLoader
-from utils.analysis_engine import AnalysisEngine
+from utils.background import get_background_analyzer
+from utils.ranking_index import RankingIndex
+from config.settings import DASHBOARD_POLL_SECONDS, SIM_DRAWS, SIM_MARGIN_SD, SIM_GROWTH_SIGMA
 import os
 
 # Environment check
 def check_environment():
     """Check if environment is properly configured."""
     try:
-        from config.settings import GOOGLE_API_KEY
-        if not GOOGLE_API_KEY:
+        from config.settings import GOOGLE_API_KEY, LLM_BACKEND
+        if LLM_BACKEND == 'gemini' and not GOOGLE_API_KEY:
             st.error("❌ GOOGLE_API_KEY not found. Please check your .env file.")
             st.info("📝 Create a .env file in the project root with: GOOGLE_API_KEY=your_api_key_here")
             return False
@@ -57,13 +55,10 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
 def load_companies_data():
-    """Load companies data from JSON file."""
-    try:
-        with open('data/companies.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    """Load companies data from JSON file (validated and cached by the company store)."""
+    companies = DataLoader().load_companies_json()
+    if not companies:
         # Fallback data if file doesn't exist
         return [
             {"company_name": "Vertiv", "sector": "Cooling/Power", "operating_margin": 0.15, "growth_forecast": 1.40},
@@ -71,6 +66,7 @@ def load_companies_data():
             {"company_name": "Schneider Electric", "sector": "Power", "operating_margin": 0.18, "growth_forecast": 1.15},
             {"company_name": "NVIDIA", "sector": "Compute/AI Hardware", "operating_margin": 0.60, "growth_forecast": 1.80}
         ]
+    return companies
 
 @st.cache_resource
 def get_workflow():
@@ -117,10 +113,12 @@ def main():
         st.stop()
     
     # Main tabs
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    tab1, tab2, tab3, tab_sim, tab_sweep, tab4, tab5 = st.tabs([
         "🔍 Analysis", 
         "📈 Rankings", 
         "🏆 Top 20", 
+        "🎲 Rank Stability",
+        "⚖️ Weight Sweep",
         "➕ Add Company", 
         "ℹ️ About"
     ])
@@ -134,12 +132,53 @@ def main():
     with tab3:
         top20_analysis_tab()
     
+    with tab_sim:
+        rank_stability_tab()
+    
+    with tab_sweep:
+        weight_sweep_tab()
+    
     with tab4:
         add_company_tab()
     
     with tab5:
         about_tab()
 
+def _job_progress(key):
+    """Progress of a background analysis; polled without blocking the rest of the page."""
+    job = get_background_analyzer().job(key)
+    if job is None:
+        return
+    snapshot = job.snapshot()
+    st.progress(snapshot['processed'] / max(snapshot['total'], 1))
+    st.text(f"Analyzed {snapshot['processed']}/{snapshot['total']} "
+            f"({snapshot['reused']} reused from stored results, {snapshot['errors']} errors)")
+    leaders = job.top(5)
+    if leaders:
+        st.subheader("🔄 Live Rankings")
+        for rank, res in enumerate(leaders, 1):
+            st.write(f"{rank}. {res['company_name']}: {res.get('final_score', 0):.2f}")
+    if job.done:
+        st.rerun()  # redraw the whole page with the finished results
+
+job_progress = st.fragment(run_every=DASHBOARD_POLL_SECONDS)(_job_progress)
+
+def show_job_status(job):
+    """Poll a running job, or say where the results on screen came from."""
+    if not job.done:
+        job_progress(job.key)
+    elif job.status == 'failed':
+        st.error(f"❌ Analysis failed: {job.error}")
+    else:
+        snapshot = job.snapshot()
+        st.success(f"✅ Analysis complete: {snapshot['processed']} companies "
+                   f"({snapshot['reused']} reused, {snapshot['errors']} errors; run {snapshot['run_id']})")
+
+def show_stored_caption(results, total):
+    as_of = max(r.get('timestamp', 0) for r in results)
+    st.caption(f"Showing stored results for {len(results)} of {total} companies "
+               f"(latest {time.strftime('%Y-%m-%d %H:%M', time.localtime(as_of))})")
+
 def analysis_tab(workflow):
     """Analysis tab content."""
     st.header("Company Analysis")
@@ -226,93 +265,101 @@ def analysis_tab(workflow):
 
 def rankings_tab(workflow):
     """Rankings tab content."""
+    # pandas/plotly are only needed once results are drawn; keep them off the startup path
+    import pandas as pd
+    import plotly.express as px
     st.header("📈 Company Rankings")
     
     companies = load_companies_data()
+    analyzer = get_background_analyzer()
     
     col1, col2 = st.columns([1, 1])
     
     with col1:
-        if st.button("🚀 Analyze All Companies", type="primary"):
-            results = []
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+        job = analyzer.job('rankings')
+        reuse = st.checkbox("Reuse stored results", value=True, key="rankings_reuse",
+                            help="Skip companies whose inputs are unchanged since their last analysis")
+        if st.button("🚀 Analyze All Companies", type="primary",
+                     disabled=job is not None and not job.done):
+            job = analyzer.submit('rankings', companies, reuse)
+        
+        if job is not None:
+            show_job_status(job)
+            results = job.results() if job.done else []
+        else:
+            # Nothing running in this process: render whatever earlier runs stored
+            results = analyzer.stored_results(companies)
+            if results:
+                show_stored_caption(results, len(companies))
+        
+        if results:
+            # Sort by final score
+            ranked_results = RankingIndex.from_results(results).top(len(results))
             
-            for i, company in enumerate(companies):
-                status_text.text(f"Analyzing {company['company_name']}...")
-                result = analyze_company(company, workflow)
-                if result:
-                    results.append(result)
-                progress_bar.progress((i + 1) / len(companies))
-                time.sleep(0.5)  # Small delay for better UX
+            # Display rankings
+            st.subheader("🏆 Top Companies Ranking")
             
-            status_text.text("Analysis complete!")
+            for rank, result in enumerate(ranked_results, 1):
+                with st.container():
+                    st.markdown(f"""
+                    <div class="company-card">
+                        <h4>#{rank} {result['company_name']}</h4>
+                        <p><strong>Score:</strong> {result.get('final_score', 0):.2f}</p>
+                        <p><strong>Sector:</strong> {result.get('sector', 'N/A')}</p>
+                        <p><strong>Summary:</strong> {result.get('report_summary', 'N/A')[:200]}...</p>
+                    </div>
+                    """, unsafe_allow_html=True)
             
-            if results:
-                # Sort by final score
-                ranked_results = sorted(results, key=lambda x: x.get('final_score', 0), reverse=True)
-                
-                # Display rankings
-                st.subheader("🏆 Top Companies Ranking")
-                
-                for rank, result in enumerate(ranked_results, 1):
-                    with st.container():
-                        st.markdown(f"""
-                        <div class="company-card">
-                            <h4>#{rank} {result['company_name']}</h4>
-                            <p><strong>Score:</strong> {result.get('final_score', 0):.2f}</p>
-                            <p><strong>Sector:</strong> {result.get('sector', 'N/A')}</p>
-                            <p><strong>Summary:</strong> {result.get('report_summary', 'N/A')[:200]}...</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                
-                # Create visualization
-                st.subheader("📊 Score Visualization")
-                
-                # Prepare data for plotting
-                chart_data = pd.DataFrame([
-                    {
-                        'Company': result['company_name'],
-                        'Final Score': result.get('final_score', 0),
-                        'Moat Score': result.get('moat_score', 0),
-                        'Margin Score': result.get('margin_score', 0),
-                        'Sector': result.get('sector', 'N/A')
-                    } for result in ranked_results
-                ])
-                
-                # Bar chart
-                fig = px.bar(
-                    chart_data, 
-                    x='Company', 
-                    y='Final Score',
-                    color='Sector',
-                    title="TAFGS Scores by Company"
-                )
-                fig.update_layout(xaxis_tickangle=-45)
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Scatter plot
-                fig2 = px.scatter(
-                    chart_data,
-                    x='Moat Score',
-                    y='Margin Score',
-                    size='Final Score',
-                    color='Sector',
-                    hover_name='Company',
-                    title="Moat Score vs Margin Score"
-                )
-                st.plotly_chart(fig2, use_container_width=True)
+            # Create visualization
+            st.subheader("📊 Score Visualization")
+            
+            # Prepare data for plotting
+            chart_data = pd.DataFrame([
+                {
+                    'Company': result['company_name'],
+                    'Final Score': result.get('final_score', 0),
+                    'Moat Score': result.get('moat_score', 0),
+                    'Margin Score': result.get('margin_score', 0),
+                    'Sector': result.get('sector', 'N/A')
+                } for result in ranked_results
+            ])
+            
+            # Bar chart
+            fig = px.bar(
+                chart_data, 
+                x='Company', 
+                y='Final Score',
+                color='Sector',
+                title="TAFGS Scores by Company"
+            )
+            fig.update_layout(xaxis_tickangle=-45)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Scatter plot
+            fig2 = px.scatter(
+                chart_data,
+                x='Moat Score',
+                y='Margin Score',
+                size='Final Score',
+                color='Sector',
+                hover_name='Company',
+                title="Moat Score vs Margin Score"
+            )
+            st.plotly_chart(fig2, use_container_width=True)
 
 
 # Add new function for Top 20 analysis
 def top20_analysis_tab():
     """Top 20 Analysis tab."""
+    import pandas as pd
+    import plotly.express as px
     st.header("🏆 Top 20 AI Factory Rankings")
     
-    engine = AnalysisEngine()
+    analyzer = get_background_analyzer()
     data_loader = DataLoader()
     
     col1, col2 = st.columns([2, 1])
+    final_rankings = []
     
     with col1:
         st.subheader("📊 Analysis Configuration")
@@ -325,34 +372,22 @@ def top20_analysis_tab():
         
         include_metadata = st.checkbox("Include Company Metadata", value=True)
         
-        if st.button("🚀 Run Top 20 Analysis", type="primary"):
-            companies = data_loader.get_top_companies(20)
-            
-            # Progress tracking
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            results_placeholder = st.empty()
-            
-            results = []
-            for i, company in enumerate(companies):
-                status_text.text(f"Analyzing {company['company_name']} ({i+1}/20)")
-                result = engine.analyze_single_company(company)
-                results.append(result)
-                progress_bar.progress((i + 1) / 20)
-                
-                # Show live updates
-                if results:
-                    current_rankings = engine.get_top_rankings(results, len(results))
-                    with results_placeholder.container():
-                        st.subheader("🔄 Live Rankings")
-                        for rank, res in enumerate(current_rankings[:5], 1):
-                            st.write(f"{rank}. {res['company_name']}: {res.get('final_score', 0):.2f}")
-            
-            status_text.text("✅ Analysis Complete!")
-            
-            # Final rankings
-            final_rankings = engine.get_top_rankings(results, 20)
-            
+        companies = data_loader.get_top_companies(20)
+        job = analyzer.job('top20')
+        if st.button("🚀 Run Top 20 Analysis", type="primary",
+                     disabled=job is not None and not job.done):
+            job = analyzer.submit('top20', companies)
+        
+        if job is not None:
+            show_job_status(job)
+            final_rankings = job.top(20) if job.done else []
+        else:
+            stored = analyzer.stored_results(companies)
+            if stored:
+                show_stored_caption(stored, len(companies))
+                final_rankings = RankingIndex.from_results(stored).top(20)
+        
+        if final_rankings:
             # Display Top 20
             st.subheader("🏆 Final Top 20 AI Factory Companies")
             
@@ -373,7 +408,7 @@ def top20_analysis_tab():
             st.dataframe(rankings_df, use_container_width=True)
             
             # Sector analysis
-            sector_stats = engine.generate_sector_analysis(final_rankings)
+            sector_stats = RankingIndex.from_results(final_rankings).sector_stats()
             
             st.subheader("📊 Sector Analysis")
             sector_df = pd.DataFrame([
@@ -382,22 +417,26 @@ def top20_analysis_tab():
                     'Companies': stats['count'],
                     'Avg Score': f"{stats['avg_score']:.2f}",
                     'Top Score': f"{stats['top_score']:.2f}",
-                    'Best Company': max(final_rankings, key=lambda x: x.get('final_score', 0) if x.get('sector') == sector else 0)['company_name'] if any(r.get('sector') == sector for r in final_rankings) else 'N/A'
+                    'Best Company': stats['best_company']
                 } for sector, stats in sector_stats.items()
             ])
             
             st.dataframe(sector_df, use_container_width=True)
             
-            # Export functionality
+            # Export functionality (atomic; Parquet is zstd-compressed)
+            export_format = st.selectbox("Export Format", ["csv", "jsonl", "parquet"])
+            export_partition = st.selectbox("Partition By", ["none", "date", "sector"])
             if st.button("📥 Export Results"):
-                output_file = data_loader.export_results(final_rankings)
+                output_file = data_loader.export_results(
+                    final_rankings, f"top_20_rankings.{export_format}",
+                    None if export_partition == "none" else export_partition)
                 st.success(f"Results exported to {output_file}")
 
     with col2:
         st.subheader("📈 Key Insights")
         
         # Show sector distribution
-        if 'final_rankings' in locals():
+        if final_rankings:
             sector_counts = {}
             for result in final_rankings:
                 sector = result.get('sector', 'Unknown')
@@ -410,6 +449,182 @@ def top20_analysis_tab():
             )
             st.plotly_chart(fig, use_container_width=True)
 
+def rank_stability_tab():
+    """Monte Carlo rank stability of the stored results under forecast uncertainty."""
+    import pandas as pd
+    import plotly.graph_objects as go
+    from utils.simulation import RankSimulator
+    st.header("🎲 Rank Stability")
+    st.caption("Perturbs operating margins and growth forecasts around their point estimates, "
+               "re-scores every scenario with the stored moat scores (no LLM calls) and "
+               "shows how often each company makes the top K.")
+    
+    companies = load_companies_data()
+    results = get_background_analyzer().stored_results(companies)
+    if not results:
+        st.info("No stored results yet. Run an analysis in the Rankings or Top 20 tab first.")
+        return
+    show_stored_caption(results, len(companies))
+    
+    col1, col2, col3, col4 = st.columns(4)
+    draw_choices = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+    draws = col1.select_slider("Draws", draw_choices,
+                               value=SIM_DRAWS if SIM_DRAWS in draw_choices else 100_000)
+    k = col2.slider("Top K", 1, len(results), min(20, len(results)))
+    margin_sd = col3.slider("Margin sd (absolute)", 0.0, 0.15, SIM_MARGIN_SD, 0.005, format="%.3f")
+    growth_sigma = col4.slider("Growth sigma (relative)", 0.0, 0.5, SIM_GROWTH_SIGMA, 0.01)
+    
+    settings = (draws, k, margin_sd, growth_sigma, tuple(sorted(
+        (r['company_name'], r.get('timestamp')) for r in results)))
+    if st.button("🎲 Run Simulation", type="primary"):
+        simulator = RankSimulator({'operating_margin': {'dist': 'normal', 'scale': margin_sd},
+                                   'growth_forecast': {'dist': 'lognormal', 'scale': growth_sigma}},
+                                  k=k, draws=draws)
+        with st.spinner(f"Simulating {draws:,} scenarios..."):
+            st.session_state.rank_stability = (settings, simulator.run(results))
+    
+    stored = st.session_state.get('rank_stability')
+    if stored is None:
+        return
+    if stored[0] != settings:
+        st.warning("Settings or results changed since this simulation; run it again to update.")
+    report = stored[1]
+    st.success(f"✅ {report['draws']:,} draws over {len(report['companies'])} companies "
+               f"in {report['seconds']:.2f}s")
+    
+    frame = pd.DataFrame(report['companies'])
+    # Every draw fills K seats, so this is never empty
+    shown = frame[frame['p_top_k'] > 0].sort_values('base_rank')
+    
+    fig = go.Figure(go.Bar(x=shown['company_name'], y=shown['p_top_k'],
+                           marker_color=shown['p_top_k'], marker_colorscale='Viridis'))
+    fig.update_layout(title=f"Probability of ranking in the top {report['k']}",
+                      yaxis_tickformat='.0%', xaxis_tickangle=-45)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    fig = go.Figure(go.Scatter(
+        x=shown['company_name'], y=shown['rank_p50'], mode='markers', name='Median rank',
+        error_y={'type': 'data', 'symmetric': False,
+                 'array': shown['rank_p95'] - shown['rank_p50'],
+                 'arrayminus': shown['rank_p50'] - shown['rank_p5']}))
+    fig.add_trace(go.Scatter(x=shown['company_name'], y=shown['base_rank'], mode='markers',
+                             marker_symbol='x', name='Point-estimate rank'))
+    fig.update_layout(title="Rank with 90% band", yaxis_autorange='reversed', xaxis_tickangle=-45)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("📋 Per-Company Bands")
+    st.dataframe(frame.rename(columns={
+        'company_name': 'Company', 'sector': 'Sector', 'moat_score': 'Moat Score',
+        'base_score': 'TAFGS', 'base_rank': 'Rank', 'mean_score': 'Mean Score',
+        'score_p5': 'Score P5', 'score_p50': 'Score P50', 'score_p95': 'Score P95',
+        'mean_rank': 'Mean Rank', 'rank_p5': 'Rank P5', 'rank_p50': 'Rank P50',
+        'rank_p95': 'Rank P95', 'p_top_k': f"P(Top {report['k']})"}),
+        use_container_width=True)
+    
+    st.subheader("📊 Per-Sector Top-K Seats")
+    st.dataframe(pd.DataFrame([{
+        'Sector': sector['sector'],
+        'Companies': sector['companies'],
+        f"P(Any in Top {report['k']})": f"{sector['p_in_top_k']:.1%}",
+        'Expected Seats': f"{sector['expected_top_k']:.2f}",
+        'Seats 90% Band': f"{sector['top_k_p5']}-{sector['top_k_p95']}",
+        'Best Rank (median)': sector['best_rank_p50'],
+        'Best Rank 90% Band': f"{sector['best_rank_p5']}-{sector['best_rank_p95']}",
+    } for sector in report['sectors']]), use_container_width=True)
+
+def weight_sweep_tab():
+    """Rankings of the stored results across a grid of sector weights and growth multipliers."""
+    import numpy as np
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from utils.sweep import WeightSweep, TIER_NAMES
+    st.header("⚖️ Weight Sweep")
+    st.caption("Re-ranks the stored results under every combination of the weights below "
+               "(weighted TAFGS = TAFGS × sector weight × growth multiplier); moat and margin "
+               "scores are reused, so no LLM calls are made.")
+    
+    companies = load_companies_data()
+    results = get_background_analyzer().stored_results(companies)
+    if not results:
+        st.info("No stored results yet. Run an analysis in the Rankings or Top 20 tab first.")
+        return
+    show_stored_caption(results, len(companies))
+    base = DataLoader().load_sector_weights()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        sectors = st.multiselect("Sector weights to vary",
+                                 sorted({r.get('sector', 'Unknown') for r in results}))
+        sector_range = st.slider("Sector weight range", 0.0, 3.0, (0.8, 1.6), 0.05)
+        sector_steps = st.slider("Values per sector", 2, 10, 3)
+    with col2:
+        tiers = st.multiselect("Growth multipliers to vary", list(TIER_NAMES))
+        tier_range = st.slider("Growth multiplier range", 0.0, 3.0, (1.0, 1.5), 0.05)
+        tier_steps = st.slider("Values per tier", 2, 10, 3)
+    k = st.slider("Top K", 1, len(results), min(20, len(results)), key="sweep_top_k")
+    
+    grid = {
+        'sector_weights': {name: np.linspace(*sector_range, sector_steps).round(4).tolist()
+                           for name in sectors},
+        'growth_multipliers': {name: np.linspace(*tier_range, tier_steps).round(4).tolist()
+                               for name in tiers},
+    }
+    size = sector_steps ** len(sectors) * tier_steps ** len(tiers)
+    st.write(f"**{size:,}** weight configurations × **{len(results)}** companies")
+    
+    settings = (repr(grid), k, tuple(sorted((r['company_name'], r.get('timestamp')) for r in results)))
+    if st.button("⚖️ Run Sweep", type="primary", disabled=not (sectors or tiers)):
+        try:
+            with st.spinner(f"Ranking under {size:,} configurations..."):
+                report = WeightSweep(k).run(results, grid=grid, base=base)
+            st.session_state.weight_sweep = (settings, report)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+    
+    stored = st.session_state.get('weight_sweep')
+    if stored is None:
+        return
+    if stored[0] != settings:
+        st.warning("Settings or results changed since this sweep; run it again to update.")
+    report = stored[1]
+    st.success(f"✅ {report['configs']:,} configurations ranked in {report['seconds']:.2f}s")
+    
+    summary = pd.DataFrame(report['summary'])
+    # Everyone who reaches the top K in some configuration
+    shown = summary[summary['best_rank'] <= report['k']]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=shown['company_name'], base=shown['best_rank'],
+                         y=shown['worst_rank'] - shown['best_rank'] + 0.2,
+                         name='Best–worst rank', marker_color='lightsteelblue'))
+    fig.add_trace(go.Scatter(x=shown['company_name'], y=shown['base_rank'], mode='markers',
+                             marker_symbol='x', marker_size=10, name='Current weights'))
+    fig.add_trace(go.Scatter(x=shown['company_name'], y=shown['mean_rank'], mode='markers',
+                             name='Mean rank'))
+    fig.update_layout(title="Rank range across weight configurations",
+                      yaxis_autorange='reversed', xaxis_tickangle=-45)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    if report['ranks'] is not None:
+        # Rank matrix for the contenders, over (at most) the first 500 configurations
+        columns = [report['columns'].index(name) for name in shown['company_name']]
+        labels = [", ".join(f"{axis.split('.', 1)[1]}={value:g}"
+                            for axis, value in zip(report['axes'], row))
+                  for row in report['values'][:500]]
+        fig = px.imshow(report['ranks'][:500, columns], x=list(shown['company_name']), y=labels,
+                        color_continuous_scale='Viridis_r', aspect='auto',
+                        labels={'color': 'Rank'}, title="Rank by configuration")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("📋 Rank Ranges")
+    st.dataframe(summary.rename(columns={
+        'company_name': 'Company', 'sector': 'Sector', 'final_score': 'TAFGS',
+        'weighted_score': 'Weighted TAFGS', 'base_rank': 'Rank', 'best_rank': 'Best Rank',
+        'worst_rank': 'Worst Rank', 'rank_range': 'Range', 'mean_rank': 'Mean Rank',
+        'rank_sd': 'Rank SD', 'p_top_k': f"Share in Top {report['k']}", 'leads': 'Leads'}),
+        use_container_width=True)
+
 def add_company_tab():
     """Add company tab content."""
     st.header("➕ Add New Company")
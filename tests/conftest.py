@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Settings are read at import time: point every store at a scratch directory and use the
+# offline fake LLM before any project module is imported
+_SCRATCH = tempfile.mkdtemp(prefix='tafgs-tests-')
+os.environ.update({
+    'LLM_BACKEND': 'fake',
+    'FAKE_LLM_LATENCY': 'fixed',
+    'FAKE_LLM_LATENCY_MS': '0',
+    'LLM_RPM': '0',
+    'LLM_TPM': '0',
+    'MOAT_CACHE_ENABLED': '0',
+    'TRACE_ENABLED': '0',
+    'CACHE_DIR': os.path.join(_SCRATCH, 'cache'),
+    'HISTORY_DIR': os.path.join(_SCRATCH, 'history'),
+    'EXPORT_DIR': os.path.join(_SCRATCH, 'output'),
+})
+os.environ.pop('GOOGLE_API_KEY', None)
+
+import pytest
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    """DataLoader paths (data/companies.json, ...) are relative to the repository root."""
+    monkeypatch.chdir(ROOT)
+
+@pytest.fixture(scope='session')
+def companies():
+    from utils.data_loader import DataLoader
+    return DataLoader().load_companies()
@@ -0,0 +1,75 @@
+from agents.report_agent import format_report
+from utils.analysis_engine import AnalysisEngine
+from utils.run_store import RunStore
+
+def test_analyze_end_to_end(companies):
+    engine = AnalysisEngine()
+    results = engine.analyze_batch(companies[:5])
+
+    assert [r['company_name'] for r in results] == [c['company_name'] for c in companies[:5]]
+    for result in results:
+        assert 'error' not in result
+        assert 0 <= result['moat_score'] <= 5
+        assert result['final_score'] >= 0
+        assert result['report'] == format_report(result['company_name'], result['final_score'],
+                                                 result['report_summary'])
+    rankings = engine.get_top_rankings(results, 3)
+    scores = [r['final_score'] for r in rankings]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == max(r['final_score'] for r in results)
+    sectors = engine.generate_sector_analysis(results)
+    assert sum(stats['count'] for stats in sectors.values()) == len(results)
+
+def test_result_indexing_is_opt_in(companies):
+    batch = companies[:4]
+    engine = AnalysisEngine()
+    list(engine.iter_checkpointed(batch))
+    assert len(engine.ranking_index) == 0  # a streamed universe is never held in memory
+
+    engine = AnalysisEngine(index_results=True)
+    results = list(engine.iter_checkpointed(batch))
+    best = max(results, key=lambda r: r['final_score'])
+    assert len(engine.ranking_index) == len(batch)
+    assert engine.ranking_index.rank(best['company_name']) == 1
+
+def test_pruned_top_k_matches_full_analysis(companies):
+    k = 5
+    full = AnalysisEngine().analyze_batch(companies)
+    expected = AnalysisEngine().get_top_rankings(full, k)
+
+    engine = AnalysisEngine()
+    pruned = engine.analyze_top_k(companies, k)
+
+    assert [(r['company_name'], r['final_score']) for r in pruned] == \
+        [(r['company_name'], r['final_score']) for r in expected]
+    assert engine.last_top_k['pruned'] > 0
+    assert engine.last_top_k['analyzed'] + engine.last_top_k['pruned'] == len(companies)
+
+def test_resume_from_checkpoint(companies):
+    batch = companies[:8]
+    engine = AnalysisEngine()
+    stream = engine.iter_checkpointed(batch)
+    first = [next(stream) for _ in range(3)]
+    stream.close()  # interrupted after three companies
+    run_id = engine.last_run_id
+
+    store = RunStore()
+    try:
+        assert store.run_info(run_id)['status'] == 'interrupted'
+        assert set(store.completed(run_id)) == {r['company_name'] for r in first}
+    finally:
+        store.close()
+
+    resumed = list(engine.iter_checkpointed(batch, run_id))
+    assert engine.last_run_id == run_id
+    assert sorted(r['company_name'] for r in resumed) == sorted(c['company_name'] for c in batch)
+    # Finished companies come back from the store untouched instead of being re-analyzed
+    by_name = {r['company_name']: r for r in resumed}
+    for result in first:
+        assert by_name[result['company_name']]['timestamp'] == result['timestamp']
+    store = RunStore()
+    try:
+        assert store.run_info(run_id)['status'] == 'completed'
+        assert len(store.load_results(run_id)) == len(batch)
+    finally:
+        store.close()
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from utils.background import AnalysisJob, BackgroundAnalyzer
+from utils.run_store import RunStore
+
+def _ok(name, score):
+    return {'company_name': name, 'sector': 'Software', 'final_score': score}
+
+def _failed(name):
+    return {'company_name': name, 'error': 'moat analysis failed', 'final_score': 0}
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_later_result_replaces_the_earlier_one():
+    job = AnalysisJob('test', [{'company_name': n} for n in 'ABC'])
+    job.add(_ok('A', 10.0), reused=True)
+    job.add(_failed('B'))
+    job.add(_ok('C', 5.0))
+    assert (job.processed, job.reused, job.errors) == (3, 1, 1)
+
+    job.add(_ok('B', 7.0))  # the retry succeeded
+    job.add(_failed('C'))   # and a later attempt failed
+    assert (job.processed, job.reused, job.errors) == (3, 1, 1)
+    assert [r['company_name'] for r in job.results()] == ['A', 'B']
+    job.add(_ok('A', 1.0))
+    assert [(r['company_name'], r['final_score']) for r in job.results()] == [('B', 7.0), ('A', 1.0)]
+
+def test_follow_queue_keeps_the_retry_after_an_expired_lease(monkeypatch):
+    monkeypatch.setattr('utils.background.DASHBOARD_POLL_SECONDS', 0.01)
+    companies = [{'company_name': 'A', 'sector': 'Software'},
+                 {'company_name': 'B', 'sector': 'Software'}]
+    analyzer = BackgroundAnalyzer(use_queue=True)
+    job = AnalysisJob('follow', companies)
+    job_id = analyzer.queue.submit(companies, label='follow')
+    follower = threading.Thread(target=analyzer._follow_queue, args=(job, companies))
+    follower.start()
+
+    store = RunStore(batch_size=1)
+    try:
+        assert analyzer.queue.claim('worker-a')['job_id'] == job_id
+        store.append(job_id, _ok('A', 3.0))
+        store.append(job_id, _failed('B'))  # worker-a's lease then expires
+        _wait_for(lambda: job.errors == 1)
+        store.append(job_id, _ok('B', 9.0))  # worker-b's retry lands in the same run
+        analyzer.queue.finish(job_id, 'worker-a', 'completed')
+        follower.join(5)
+    finally:
+        store.close()
+
+    assert not follower.is_alive()
+    assert job.run_id == job_id
+    assert job.status == 'completed' and (job.processed, job.errors) == (2, 0)
+    assert [r['company_name'] for r in job.results()] == ['B', 'A']
@@ -0,0 +1,75 @@
+import json
+
+from utils.change_tracker import ChangeTracker
+
+def _company(name, **overrides):
+    company = {'company_name': name, 'ticker': name.upper()[:4], 'sector': 'Software',
+               'operating_margin': 0.25, 'growth_forecast': 1.3}
+    company.update(overrides)
+    return company
+
+def _result(company, moat=3):
+    return {**company, 'moat_score': moat, 'report_summary': f"{company['company_name']} moat",
+            'margin_score': 3, 'final_score': 11.7, 'report': 'report'}
+
+def _recorded(path, companies):
+    tracker = ChangeTracker(path)
+    for company in companies:
+        tracker.record(company, _result(company))
+    tracker.close()
+    return ChangeTracker(path)  # a later run reads the state back from disk
+
+def _names(entries):
+    return [entry['company_name'] for entry in entries]
+
+def test_unseen_rows_need_the_full_workflow(tmp_path):
+    tracker = ChangeTracker(str(tmp_path / 'state.sqlite'))
+    plan = tracker.plan([_company('Acme'), _company('Beta')])
+    assert _names(plan['full']) == ['Acme', 'Beta']
+    assert plan['unchanged'] == [] and plan['financial'] == []
+
+def test_plan_classifies_changes(tmp_path):
+    base = [_company(name) for name in ('Acme', 'Beta', 'Core', 'Dyna', 'Echo', 'Flux')]
+    tracker = _recorded(str(tmp_path / 'state.sqlite'), base)
+
+    plan = tracker.plan([
+        base[0],                                   # untouched
+        {**base[1], 'notes': 'analyst comment'},   # a field the workflow doesn't read
+        {**base[2], 'operating_margin': 0.45},     # financials only
+        {**base[3], 'growth_forecast': 1.9},
+        {**base[4], 'sector': 'Energy'},           # identity change invalidates the moat
+        {**base[5], 'moat_score': 5},              # a supplied moat score is used as-is
+        _company('Gala'),                          # new row
+    ])
+
+    assert [key for key, _ in plan['unchanged']] == ['ACME', 'BETA']
+    assert plan['unchanged'][0][1]['report_summary'] == 'Acme moat'
+    assert _names(plan['financial']) == ['Core', 'Dyna']
+    financial = plan['financial'][0]
+    assert financial['operating_margin'] == 0.45
+    assert (financial['moat_score'], financial['report_summary']) == (3, 'Core moat')
+    assert _names(plan['full']) == ['Echo', 'Flux', 'Gala']
+
+def test_rows_are_keyed_by_ticker(tmp_path):
+    tracker = _recorded(str(tmp_path / 'state.sqlite'), [_company('Acme')])
+    renamed = _company('Acme Corp', ticker='ACME')
+    assert tracker.changed_fields(renamed) == {'company_name'}
+    assert _names(tracker.plan([renamed])['full']) == ['Acme Corp']
+
+def test_failed_rows_are_retried(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    company = _company('Acme')
+    tracker = _recorded(path, [company])
+    tracker.record(company, {'company_name': 'Acme', 'error': 'moat analysis failed'})
+    tracker.close()
+    assert _names(ChangeTracker(path).plan([company])['full']) == ['Acme']
+
+def test_legacy_json_state_is_imported(tmp_path):
+    company = _company('Acme')
+    legacy = {'ACME': {'fields': ChangeTracker.fingerprint(company), 'result': _result(company)}}
+    (tmp_path / 'state.json').write_text(json.dumps(legacy))
+
+    tracker = ChangeTracker(str(tmp_path / 'state.sqlite'))
+    assert [key for key, _ in tracker.plan([company])['unchanged']] == ['ACME']
+    assert not (tmp_path / 'state.json').exists()
+    assert (tmp_path / 'state.json.migrated').exists()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from utils.analysis_engine import AnalysisEngine
+
+class _SlowWorkflow:
+    """Stands in for the compiled graph and records how many companies run at once."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.started = []
+
+    async def ainvoke(self, company):
+        self.started.append(company['company_name'])
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if company['company_name'] == 'Broken':
+                raise RuntimeError('node failed')
+            return {**company, 'moat_score': 3, 'final_score': 1.0}
+        finally:
+            self.running -= 1
+
+def _engine(workflow):
+    engine = AnalysisEngine()
+    engine._workflow = workflow
+    return engine
+
+def _companies(*names):
+    return [{'company_name': name, 'sector': 'Software'} for name in names]
+
+@pytest.mark.parametrize('concurrency', [1, 3, 8])
+def test_concurrency_is_bounded(concurrency):
+    workflow = _SlowWorkflow()
+    batch = _companies(*'ABCDEFGHIJ')
+    results = asyncio.run(_engine(workflow).analyze_batch_async(batch, concurrency))
+    assert sorted(r['company_name'] for r in results) == sorted(c['company_name'] for c in batch)
+    assert workflow.peak == concurrency
+
+def test_failures_become_error_results():
+    results = _engine(_SlowWorkflow()).analyze_batch_concurrent(_companies('A', 'Broken', 'B'), 3)
+    errors = [r for r in results if 'error' in r]
+    assert [(r['company_name'], r['error'], r['final_score']) for r in errors] == \
+        [('Broken', 'node failed', 0)]
+    assert len(results) == 3
+
+def test_stopping_early_cancels_the_rest():
+    workflow = _SlowWorkflow(delay=0.05)
+
+    async def first_two():
+        stream = _engine(workflow).aiter_batch(_companies(*'ABCDEFGHIJ'), concurrency=2)
+        results = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        await asyncio.sleep(0.1)  # anything still scheduled would start now
+        return results
+
+    assert len(asyncio.run(first_two())) == 2
+    assert workflow.running == 0
+    assert len(workflow.started) <= 4
+
+def test_iter_batch_concurrent_matches_the_sequential_run(companies):
+    batch = companies[:8]
+    expected = {r['company_name']: r['final_score'] for r in AnalysisEngine().analyze_batch(batch)}
+    streamed = list(AnalysisEngine().iter_batch_concurrent(batch, concurrency=4))
+    assert {r['company_name']: r['final_score'] for r in streamed} == expected
@@ -0,0 +1,87 @@
+import csv
+import json
+import os
+
+import pytest
+
+from utils.export_sink import EXTRA_COLUMN, ExportSink
+
+def _rows(*sectors):
+    return [{'company_name': f'C{i}', 'sector': sector, 'operating_margin': 0.2,
+             'growth_forecast': 1.25, 'moat_score': 3, 'margin_score': 3, 'final_score': 11.25,
+             'report_summary': 'summary', 'timestamp': 1700000000.0 + i, 'report': f'report {i}'}
+            for i, sector in enumerate(sectors)]
+
+def _listing(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, files in os.walk(directory) for name in files)
+
+def test_csv_is_published_atomically_on_close(tmp_path):
+    final = tmp_path / 'top.csv'
+    final.write_text('previous export\n')
+    sink = ExportSink('top', 'csv', directory=str(tmp_path), batch_size=2, flush_seconds=3600)
+    sink.write_many(_rows('Chips', 'Software', 'Energy'))
+
+    # Two rows are flushed to the .partial file; the old export is untouched until close()
+    assert final.read_text() == 'previous export\n'
+    with open(f'{final}.partial') as f:
+        assert len(list(csv.DictReader(f))) == 2
+    assert sink.close() == [str(final)]
+
+    assert not os.path.exists(f'{final}.partial')
+    with open(final) as f:
+        rows = list(csv.DictReader(f))
+    assert [r['company_name'] for r in rows] == ['C0', 'C1', 'C2']
+    assert rows[0]['report'] == 'report 0'  # extra keys get columns of their own
+    assert float(rows[0]['final_score']) == 11.25
+
+def test_failed_run_keeps_the_previous_export(tmp_path):
+    final = tmp_path / 'top.jsonl'
+    final.write_text('{"previous": true}\n')
+    with pytest.raises(RuntimeError):
+        with ExportSink('top', 'jsonl', directory=str(tmp_path), batch_size=100) as sink:
+            sink.write_many(_rows('Chips', 'Software'))
+            raise RuntimeError('run died')
+    assert final.read_text() == '{"previous": true}\n'
+    with open(f'{final}.partial') as f:
+        assert [json.loads(line)['company_name'] for line in f] == ['C0', 'C1']
+
+def test_parquet_parts_and_extra_columns(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    rows = _rows('Chips', 'Software', 'Energy')
+    rows[1]['final_score'] = None
+    rows[2]['ticker'] = 'C2'
+    with ExportSink('top', 'parquet', directory=str(tmp_path), batch_size=2) as sink:
+        sink.write_many(rows)
+    paths = sink.close()
+
+    assert len(paths) == 2 and all(path.endswith('.parquet') for path in paths)
+    assert not any(name.endswith('.tmp') for name in _listing(tmp_path))
+    table = pq.read_table(str(tmp_path / 'top')).to_pylist()
+    assert [r['final_score'] for r in table] == [11.25, None, 11.25]
+    assert json.loads(table[2][EXTRA_COLUMN]) == {'report': 'report 2', 'ticker': 'C2'}
+
+def test_replace_swaps_in_the_staged_dataset(tmp_path):
+    with ExportSink('runs', 'csv', partition_by='sector', directory=str(tmp_path)) as sink:
+        sink.write_many(_rows('Chips', 'AI/ML'))
+    assert _listing(tmp_path) == ['runs/sector=AI%2FML/data.csv', 'runs/sector=Chips/data.csv']
+
+    sink = ExportSink('runs', 'csv', partition_by='sector', directory=str(tmp_path), replace=True)
+    sink.write_many(_rows('Energy'))
+    sink.flush()
+    # Still staged: readers see the previous export in full
+    assert _listing(tmp_path / 'runs') == ['sector=AI%2FML/data.csv', 'sector=Chips/data.csv']
+    paths = sink.close()
+
+    assert paths == [str(tmp_path / 'runs' / 'sector=Energy' / 'data.csv')]
+    assert _listing(tmp_path) == ['runs/sector=Energy/data.csv']  # no staging or old directories
+
+def test_invalid_options_and_closed_sink(tmp_path):
+    with pytest.raises(ValueError, match='Unknown export format'):
+        ExportSink('top', 'xlsx', directory=str(tmp_path))
+    with pytest.raises(ValueError, match='Unknown partitioning'):
+        ExportSink('top', 'csv', partition_by='ticker', directory=str(tmp_path))
+    sink = ExportSink('top', 'csv', directory=str(tmp_path))
+    sink.close()
+    with pytest.raises(ValueError, match='closed'):
+        sink.write(_rows('Chips')[0])
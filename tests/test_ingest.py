@@ -0,0 +1,83 @@
+import io
+import json
+
+import pytest
+
+from utils.ingest import _iter_json_array, iter_company_chunks, iter_records
+
+RECORDS = [
+    {'company_name': 'Acme', 'sector': 'Compute/AI Hardware', 'operating_margin': 0.42},
+    {'company_name': 'Brace "quoted" [x]', 'tags': ['a', {'b': None}]},
+    12345678901234567890,
+    -0.125,
+    'plain string',
+    True,
+    None,
+    [],
+    {},
+]
+
+@pytest.mark.parametrize('block_bytes', [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize('separator', [', ', ',\n  ', ','])
+def test_json_array_matches_json_loads(block_bytes, separator):
+    text = '  \n[' + separator.join(json.dumps(r) for r in RECORDS) + ']\n'
+    assert list(_iter_json_array(io.StringIO(text), block_bytes)) == json.loads(text)
+
+@pytest.mark.parametrize('text', ['[]', '  [ ]  ', ''])
+def test_empty_arrays(text):
+    assert list(_iter_json_array(io.StringIO(text), 4)) == []
+
+def test_scalar_cut_at_a_block_boundary_is_not_decoded_early():
+    # '12' and '-0' decode on their own; the parser has to wait for the rest of the number
+    assert list(_iter_json_array(io.StringIO('[123456, 7]'), 3)) == [123456, 7]
+    assert list(_iter_json_array(io.StringIO('[-0.5e+3,1]'), 2)) == [-500.0, 1]
+
+def test_not_an_array():
+    with pytest.raises(ValueError, match='Expected a JSON array'):
+        list(_iter_json_array(io.StringIO('{"a": 1}'), 4))
+
+def test_malformed_element_raises_at_the_record_cap():
+    reads = []
+
+    class Stream(io.StringIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    text = '[{"ok": 1}, {"broken": ' + 'x' * 10_000 + '}]'
+    items = _iter_json_array(Stream(text), 16, max_record_bytes=64)
+    assert next(items) == {'ok': 1}
+    with pytest.raises(ValueError, match='Array element 1'):
+        next(items)
+    # Stopped shortly after the cap instead of buffering the rest of the file
+    assert len(reads) * 16 < 64 + 3 * 16
+
+def test_malformed_element_below_the_cap_raises_at_eof():
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_json_array(io.StringIO('[{"ok": 1}, {"broken": }]'), 4))
+
+def test_json_lines(tmp_path):
+    path = tmp_path / 'companies.jsonl'
+    path.write_text('\n'.join(json.dumps(r) for r in RECORDS[:2]) + '\n\n' + json.dumps(RECORDS[2]))
+    assert list(iter_records(str(path))) == RECORDS[:3]
+
+def test_json_lines_record_cap(tmp_path):
+    path = tmp_path / 'companies.jsonl'
+    path.write_text(json.dumps({'a': 1}) + '\n' + json.dumps({'b': 'x' * 100}) + '\n')
+    records = iter_records(str(path), max_record_bytes=32)
+    assert next(records) == {'a': 1}
+    with pytest.raises(ValueError, match='Line 2'):
+        next(records)
+
+def test_company_chunks_skip_invalid_rows(tmp_path, capsys):
+    rows = [{'company_name': f'C{i}', 'sector': 'Software', 'operating_margin': 0.1,
+             'growth_forecast': 1.2} for i in range(5)]
+    rows.insert(2, {'sector': 'Software'})  # no company_name
+    path = tmp_path / 'companies.json'
+    path.write_text(json.dumps(rows))
+
+    chunks = list(iter_company_chunks(str(path), chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert [c['company_name'] for chunk in chunks for c in chunk] == [f'C{i}' for i in range(5)]
+    assert 'skipped 1 invalid row' in capsys.readouterr().out
+    assert sum(map(len, iter_company_chunks(str(path), chunk_size=2, limit=3))) == 3
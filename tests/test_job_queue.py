@@ -0,0 +1,27 @@
+import time
+
+from utils.job_queue import JobQueue
+
+def test_job_lease_expiry(tmp_path):
+    queue = JobQueue(path=str(tmp_path / 'jobs.sqlite'), lease_seconds=0.2)
+    job_id = queue.submit([{'company_name': 'A', 'sector': 'S'}], label='lease')
+    assert queue.submit([{'company_name': 'A', 'sector': 'S'}]) == job_id  # deduplicated
+
+    job = queue.claim('worker-a')
+    assert job['job_id'] == job_id and job['attempts'] == 1
+    assert queue.claim('worker-b') is None  # leased to worker-a
+    assert queue.heartbeat(job_id, 'worker-a', 0, 0, 0) == 'running'
+
+    time.sleep(0.3)  # worker-a goes silent past its lease
+    job = queue.claim('worker-b')
+    assert job['job_id'] == job_id and job['attempts'] == 2 and job['worker'] == 'worker-b'
+
+    # The stale worker can no longer touch the job
+    assert queue.heartbeat(job_id, 'worker-a', 1, 0, 0) == 'lost'
+    assert not queue.finish(job_id, 'worker-a', 'completed')
+    assert not queue.release(job_id, 'worker-a')
+    assert queue.status(job_id)['status'] == 'running'
+
+    assert queue.finish(job_id, 'worker-b', 'completed')
+    assert queue.status(job_id)['status'] == 'completed'
+    assert queue.heartbeat(job_id, 'worker-b', 1, 0, 0) == 'completed'
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from agents import moat_agent
+from agents.moat_agent import (
+    FAILED_JSON_SUMMARY, _parse_moat_response, abatch_moat_analysis, batch_moat_analysis
+)
+
+class _Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+def _answer(inputs):
+    """Batches of three or more come back truncated, pairs only score their first company."""
+    if 'companies' not in inputs:
+        if inputs['company_name'] == 'Broken':
+            return _Reply('{"moat_score": "high", "narrative": "unparseable score"}')
+        return _Reply(json.dumps({'moat_score': 3, 'narrative': f"single {inputs['company_name']}"}))
+    batch = json.loads(inputs['companies'])
+    if len(batch) > 2:
+        return _Reply('[{"company_name": "')
+    first = batch[0]
+    return _Reply(json.dumps([{'company_name': first['company_name'], 'moat_score': 4,
+                               'narrative': f"batched {first['company_name']}"}]))
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+
+    def invoke(chain, inputs, budget):
+        calls.append(inputs)
+        return _answer(inputs)
+
+    async def ainvoke(chain, inputs, budget):
+        calls.append(inputs)
+        return _answer(inputs)
+
+    monkeypatch.setattr(moat_agent, '_invoke', invoke)
+    monkeypatch.setattr(moat_agent, '_ainvoke', ainvoke)
+    return calls
+
+def _companies(*names):
+    return [{'company_name': name, 'sector': 'Compute/AI Hardware'} for name in names]
+
+@pytest.mark.parametrize('content, expected', [
+    ('{"moat_score": 4, "narrative": "wide"}', (4, 'wide')),
+    ('```json\n{"moat_score": "4", "narrative": "fenced"}\n```', (4, 'fenced')),
+    ('{"moat_score": 9, "narrative": "capped"}', (5, 'capped')),
+    ('{"moat_score": -2, "narrative": 7}', (0, '7')),
+    ('{"narrative": "no score"}', (0, FAILED_JSON_SUMMARY)),
+    ('{"moat_score": 3}', (0, FAILED_JSON_SUMMARY)),
+    ('{"moat_score": "high", "narrative": "x"}', (0, FAILED_JSON_SUMMARY)),
+    ('{"moat_score": null, "narrative": "x"}', (0, FAILED_JSON_SUMMARY)),
+    ('[1, 2]', (0, FAILED_JSON_SUMMARY)),
+    ('not json', (0, FAILED_JSON_SUMMARY)),
+])
+def test_parse_moat_response(content, expected):
+    result = _parse_moat_response(content)
+    assert (result['moat_score'], result['report_summary']) == expected
+
+def test_batch_splits_malformed_and_partial_replies(llm_calls):
+    companies = _companies('A', 'B', 'C', 'D', 'E')
+    scored = batch_moat_analysis(companies, batch_size=5)
+
+    assert set(scored) == {'A', 'B', 'C', 'D', 'E'}
+    # 5 -> truncated -> 2 + 3; each pair scores its first company, the rest go alone
+    assert scored['A'] == {'moat_score': 4, 'report_summary': 'batched A'}
+    assert scored['B'] == {'moat_score': 3, 'report_summary': 'single B'}
+    assert scored['C'] == {'moat_score': 3, 'report_summary': 'single C'}
+    assert scored['D'] == {'moat_score': 4, 'report_summary': 'batched D'}
+    assert scored['E'] == {'moat_score': 3, 'report_summary': 'single E'}
+    sizes = [len(json.loads(c['companies'])) if 'companies' in c else 1 for c in llm_calls]
+    assert sizes == [5, 2, 1, 3, 1, 2, 1]
+
+def test_bad_single_reply_degrades_without_aborting_the_batch(llm_calls):
+    scored = batch_moat_analysis(_companies('Broken', 'X', 'Y'), batch_size=3)
+    assert scored['Broken'] == {'moat_score': 0, 'report_summary': FAILED_JSON_SUMMARY}
+    assert scored['X']['report_summary'] == 'batched X'
+    assert scored['Y']['report_summary'] == 'single Y'
+
+def test_async_batch_matches_sync(llm_calls):
+    companies = _companies(*'ABCDEFGHIJ')
+    expected = batch_moat_analysis(companies, batch_size=4)
+    sync_calls = len(llm_calls)
+    assert asyncio.run(abatch_moat_analysis(companies, batch_size=4, concurrency=3)) == expected
+    assert len(llm_calls) == 2 * sync_calls
@@ -0,0 +1,37 @@
+from utils.analysis_engine import AnalysisEngine
+from utils.moat_cache import MoatCache, get_moat_cache
+
+def test_moat_cache_hits_skip_the_llm(companies, monkeypatch):
+    cache = get_moat_cache()
+    monkeypatch.setattr(cache, 'enabled', True)
+    cache.purge()
+    batch = companies[:3]
+
+    first = AnalysisEngine().analyze_batch(batch)
+    hits = cache.hits
+    second = AnalysisEngine().analyze_batch(batch)
+
+    assert cache.hits - hits == len(batch)
+    assert [r['moat_score'] for r in second] == [r['moat_score'] for r in first]
+    assert [r['report_summary'] for r in second] == [r['report_summary'] for r in first]
+
+def test_moat_cache_eviction(tmp_path, monkeypatch):
+    clock = iter(range(1, 1000))
+    monkeypatch.setattr('utils.moat_cache.time.time', lambda: float(next(clock)))
+    monkeypatch.setattr(MoatCache, 'ACCESS_RESOLUTION', 0.0)
+    cache = MoatCache(path=str(tmp_path / 'moat.sqlite'), ttl=100, max_entries=3, enabled=True)
+
+    for i in range(5):
+        cache.set(f'k{i}', {'moat_score': i})
+    assert cache.get('k0') == {'moat_score': 0}  # k0 becomes the most recently used
+    assert cache.get('missing') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert cache.evict() == 2
+    assert cache.get('k1') is None and cache.get('k2') is None
+    assert cache.get('k0') is not None and cache.get('k4') is not None
+    assert cache.stats()['entries'] == 3
+
+    # Past the TTL everything goes, however recently it was read
+    assert cache.evict(now=10_000.0) == 3
+    assert cache.stats()['entries'] == 0
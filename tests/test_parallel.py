@@ -0,0 +1,34 @@
+import os
+
+from utils import tracing
+from utils.analysis_engine import AnalysisEngine
+from utils.parallel import iter_sharded
+from utils.tracing import Tracer
+
+def _comparable(result):
+    return {key: value for key, value in result.items() if key != 'timestamp'}
+
+def test_sharded_run_matches_the_sequential_run(companies, monkeypatch):
+    batch = companies[:9]
+    expected = [_comparable(r) for r in AnalysisEngine().analyze_batch(batch)]
+
+    # Workers are spawned, so they read settings (TRACE_ENABLED) from the environment;
+    # the trace session they write into comes from this process's tracer
+    monkeypatch.setenv('TRACE_ENABLED', '1')
+    monkeypatch.setattr(tracing, '_tracer', Tracer(enabled=False, session='sharded-test'))
+    pairs = list(iter_sharded(batch, workers=3, concurrency=2))
+
+    assert sorted(index for index, _ in pairs) == list(range(len(batch)))
+    assert [_comparable(result) for _, result in sorted(pairs, key=lambda p: p[0])] == expected
+
+    traces = Tracer(session='sharded-test')
+    company_traces = [r for r in traces.load() if r['kind'] == 'company']
+    assert sorted(r['name'] for r in company_traces) == sorted(c['company_name'] for c in batch)
+    assert len(os.listdir(traces.directory)) == 3  # one file per worker process
+    assert 'TRACE_SESSION' not in os.environ
+
+def test_analyze_sharded_keeps_input_order(companies):
+    batch = companies[:5]
+    results = AnalysisEngine().analyze_sharded(batch, workers=2)
+    assert [r['company_name'] for r in results] == [c['company_name'] for c in batch]
+    assert all('error' not in r for r in results)
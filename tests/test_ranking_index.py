@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from utils.ranking_index import RankingIndex
+
+SECTORS = ('Chips', 'Software', 'Energy')
+
+def _results(n=300, seed=0):
+    rng = random.Random(seed)
+    # Few distinct scores, so ties are common
+    return [{'company_name': f'C{i}', 'sector': rng.choice(SECTORS),
+             'final_score': float(rng.randint(0, 40))} for i in range(n)]
+
+def _stable_order(results):
+    return [r['company_name'] for r in sorted(results, key=lambda r: -r['final_score'])]
+
+def test_rank_and_top_match_a_stable_sort():
+    results = _results()
+    index = RankingIndex.from_results(results)
+    order = _stable_order(results)
+
+    assert len(index) == len(results)
+    assert [r['company_name'] for r in index.top(25)] == order[:25]
+    for position, name in enumerate(order, 1):
+        assert index.rank(name) == position
+    for sector in SECTORS:
+        members = _stable_order(r for r in results if r['sector'] == sector)
+        assert [r['company_name'] for r in index.top(len(results), sector)] == members
+        assert [index.rank(name, sector) for name in members] == list(range(1, len(members) + 1))
+    assert index.rank('missing') is None
+    assert index.rank(order[0], 'Nope') is None
+
+def test_percentile():
+    index = RankingIndex.from_results(
+        {'company_name': name, 'sector': 'S', 'final_score': score}
+        for name, score in (('A', 40.0), ('B', 30.0), ('C', 20.0), ('D', 10.0)))
+    assert [index.percentile(name) for name in 'ABCD'] == [100.0, 75.0, 50.0, 25.0]
+    assert index.percentile('missing') is None
+    # The inverse of percentile(): the lowest score at or above a percentile
+    assert [index.score_at_percentile(pct) for pct in (100, 80, 75, 60, 50, 25, 0)] == \
+        [40.0, 40.0, 30.0, 30.0, 20.0, 10.0, 10.0]
+    assert RankingIndex().score_at_percentile(50) is None
+
+def test_updates_keep_first_arrival_and_move_between_sectors():
+    index = RankingIndex.from_results(
+        {'company_name': name, 'sector': 'S', 'final_score': 10.0} for name in 'ABC')
+    # A tie with earlier arrivals still ranks after them ...
+    index.upsert({'company_name': 'C', 'sector': 'S', 'final_score': 10.0})
+    assert [r['company_name'] for r in index.top()] == ['A', 'B', 'C']
+    # ... and a re-analyzed company keeps its original arrival for ties
+    index.upsert({'company_name': 'A', 'sector': 'T', 'final_score': 10.0})
+    assert [r['company_name'] for r in index.top()] == ['A', 'B', 'C']
+    assert index.rank('A', 'T') == 1 and index.rank('B', 'S') == 1
+    assert sorted(index.sectors()) == ['S', 'T']
+
+    assert index.remove('A')['sector'] == 'T'
+    assert index.remove('A') is None
+    assert index.sectors() == ['S'] and len(index) == 2
+
+def test_failed_results_are_not_indexed():
+    index = RankingIndex()
+    assert not index.upsert({'company_name': 'X', 'error': 'boom', 'final_score': 0})
+    assert 'X' not in index and len(index) == 0
+
+def test_sector_stats_follow_updates():
+    results = _results(120, seed=1)
+    index = RankingIndex.from_results(results)
+    for result in results[::3]:
+        index.upsert({**result, 'final_score': result['final_score'] + 5})
+    for result in results[1::7]:
+        index.remove(result['company_name'])
+
+    current = {r['company_name']: r for r in results}
+    current.update({r['company_name']: {**r, 'final_score': r['final_score'] + 5}
+                    for r in results[::3]})
+    for result in results[1::7]:
+        current.pop(result['company_name'])
+    stats = index.sector_stats()
+    for sector in SECTORS:
+        members = [r for r in current.values() if r['sector'] == sector]
+        ordered = _stable_order(members)
+        assert stats[sector]['count'] == len(members)
+        assert stats[sector]['avg_score'] == pytest.approx(
+            sum(r['final_score'] for r in members) / len(members))
+        assert stats[sector]['best_company'] == ordered[0]
+        assert stats[sector]['top_score'] == current[ordered[0]]['final_score']
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.rate_limiter import RateLimiter, is_rate_limit_error
+
+class _HTTPError(Exception):
+    def __init__(self, message='', status_code=None, response=None, code=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response
+        self.code = code
+
+class _Response:
+    status_code = 429
+
+def _wrapped(inner):
+    try:
+        try:
+            raise inner
+        except Exception as e:
+            raise RuntimeError('LLM call failed') from e
+    except RuntimeError as outer:
+        return outer
+
+def _context_cycle():
+    first, second = ValueError('a'), ValueError('b')
+    first.__context__, second.__context__ = second, first
+    return first
+
+@pytest.mark.parametrize('error, expected', [
+    (_HTTPError(status_code=429), True),
+    (_HTTPError(response=_Response()), True),
+    (_HTTPError(code='RESOURCE_EXHAUSTED'), True),
+    (_wrapped(_HTTPError(status_code=429)), True),
+    (_HTTPError(status_code=500), False),
+    (ValueError('upstream said 429 Too Many Requests'), False),
+    (_wrapped(ValueError('quota 429')), False),
+    (_context_cycle(), False),
+])
+def test_is_rate_limit_error(error, expected):
+    assert is_rate_limit_error(error) is expected
+
+def test_aimd_halves_on_rate_limits_and_recovers_additively(monkeypatch):
+    monkeypatch.setattr('utils.rate_limiter.random.uniform', lambda low, high: 0.0)
+    limiter = RateLimiter(rpm=60, tpm=6000, increase_step=10, min_rpm=5)
+
+    limiter.on_rate_limited(0)
+    assert (limiter.rpm, limiter.tpm) == (30, 3000)
+    for _ in range(3):
+        limiter.on_rate_limited(0)
+    assert limiter.rpm == 5  # floored at min_rpm
+    assert limiter.rate_limited == 4
+
+    limiter.on_success()
+    assert limiter.rpm == 15
+    for _ in range(10):
+        limiter.on_success()
+    assert (limiter.rpm, limiter.tpm) == (60, 6000)  # capped at the configured ceiling
+
+def test_backoff_grows_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr('utils.rate_limiter.random.uniform', lambda low, high: high)
+    limiter = RateLimiter(rpm=0, tpm=0, backoff_base=1.0, backoff_max=5.0)
+    for attempt, delay in enumerate((1.0, 2.0, 4.0, 5.0, 5.0)):
+        limiter._blocked_until = 0.0
+        limiter.on_rate_limited(attempt)
+        assert limiter._blocked_until - time.monotonic() == pytest.approx(delay, abs=0.05)
+    # Everyone waits out the pause, not just the caller that hit the limit
+    assert limiter._reserve(1) == pytest.approx(5.0, abs=0.05)
+
+def test_request_bucket_waits_once_empty():
+    limiter = RateLimiter(rpm=60, tpm=0)
+    for _ in range(60):
+        assert limiter._reserve(1) == 0.0
+    assert limiter._reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert limiter.requests == 60
+
+def test_token_bucket_charges_the_estimate_and_actual_usage():
+    limiter = RateLimiter(rpm=0, tpm=600)
+    assert limiter._reserve(500) == 0.0
+    limiter.record_usage(estimated=500, actual=550)
+    # 50 tokens left; 100 more need 50 tokens of refill at 10 tokens per second
+    assert limiter._reserve(100) == pytest.approx(5.0, abs=0.05)
+
+def _flaky(failures, error):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return 'ok'
+    return fn, calls
+
+def test_call_retries_rate_limits_only():
+    limiter = RateLimiter(rpm=0, tpm=0, max_retries=3, backoff_base=0.001, backoff_max=0.001)
+    fn, calls = _flaky(2, _HTTPError(status_code=429))
+    assert limiter.call(fn) == 'ok'
+    assert len(calls) == 3 and limiter.retries == 2 and limiter.rate_limited == 2
+
+    fn, calls = _flaky(1, ValueError('bad request'))
+    with pytest.raises(ValueError):
+        limiter.call(fn)
+    assert len(calls) == 1
+
+    fn, calls = _flaky(10, _HTTPError(status_code=429))
+    with pytest.raises(_HTTPError):
+        limiter.call(fn)
+    assert len(calls) == 4  # the first attempt plus max_retries
+
+def test_acall_retries_rate_limits():
+    limiter = RateLimiter(rpm=0, tpm=0, max_retries=2, backoff_base=0.001, backoff_max=0.001)
+    fn, calls = _flaky(2, _HTTPError(code='RESOURCE_EXHAUSTED'))
+
+    async def afn():
+        return fn()
+
+    assert asyncio.run(limiter.acall(afn)) == 'ok'
+    assert len(calls) == 3 and limiter.retries == 2
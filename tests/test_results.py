@@ -0,0 +1,60 @@
+import json
+import pickle
+
+import pytest
+
+from agents.report_agent import format_report
+from utils.results import ResultRecord, ResultTable, json_default
+
+def _result(**overrides):
+    summary = 'Acme has a durable moat built on switching costs and scale. ' * 8
+    result = {
+        'company_name': 'Acme', 'sector': 'Compute/AI Hardware', 'operating_margin': 0.42,
+        'moat_score': 4, 'growth_forecast': 1.6, 'final_score': 22.4,
+        'report': format_report('Acme', 22.4, summary), 'margin_score': 10,
+        'report_summary': summary, 'timestamp': 1700000000.0,
+    }
+    result.update(overrides)
+    return result
+
+@pytest.mark.parametrize('result', [
+    _result(),
+    _result(report='A hand-written report', ticker='ACME', tags=['ai', 'chips']),
+    {'company_name': 'Broken', 'error': 'moat analysis failed', 'final_score': 0,
+     'timestamp': 1700000000.0},
+])
+def test_result_record_round_trip(result):
+    record = ResultRecord(result)
+    assert record == result
+    assert sorted(record) == sorted(result)
+    assert record.copy() == result and type(record.copy()) is dict
+
+    assert ResultRecord(json.loads(json.dumps(record, default=json_default))) == result
+    assert pickle.loads(pickle.dumps(record)) == result
+    table = ResultTable([record, result])
+    assert table[0] == result and table[1] == result
+
+def test_result_record_mutation():
+    record = ResultRecord(_result(ticker='ACME'))
+    report = record['report']
+
+    record['final_score'] = 1.0
+    assert record['report'] == report  # the report it was built with is kept
+    del record['ticker']
+    del record['report_summary']
+    assert 'ticker' not in record and 'report_summary' not in record
+    assert record['report'] == report
+    assert record.pop('margin_score') == 10
+    with pytest.raises(KeyError):
+        del record['margin_score']
+    with pytest.raises(TypeError):
+        json.dumps({'value': object()}, default=json_default)
+
+def test_result_table_columns_and_many_sectors():
+    sectors = 70_000  # past what a 16-bit sector code can hold
+    table = ResultTable({'company_name': f'C{i}', 'sector': f'S{i}', 'final_score': float(i)}
+                        for i in range(sectors))
+    assert len(table) == sectors
+    assert table[sectors - 1]['sector'] == f'S{sectors - 1}'
+    assert table.column('sector')[-1] == f'S{sectors - 1}'
+    assert table.column('final_score')[-1] == sectors - 1
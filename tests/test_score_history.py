@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from utils.score_history import ScoreHistory
+
+def _record(history, run_id, scores, status='completed', label='cli'):
+    writer = history.writer(run_id, label)
+    writer.batch_size = 3
+    for name, score in scores.items():
+        writer.append({'company_name': name, 'sector': 'Chips' if name < 'M' else 'Software',
+                       'final_score': score, 'moat_score': 3, 'margin_score': 2})
+    writer.append({'company_name': 'Broken', 'error': 'moat analysis failed'})
+    writer.close(status)
+
+def _ranks(scores):
+    ordered = sorted(scores, key=lambda name: -scores[name])
+    return {name: rank for rank, name in enumerate(ordered, 1)}
+
+@pytest.fixture
+def history(tmp_path):
+    return ScoreHistory(str(tmp_path / 'history'), enabled=True)
+
+def test_movers_between_two_runs(history):
+    before = {'A': 50.0, 'B': 40.0, 'C': 30.0, 'D': 20.0, 'E': 10.0, 'Gone': 5.0}
+    after = {'A': 15.0, 'B': 45.0, 'C': 30.0, 'D': 60.0, 'E': 12.0, 'New': 1.0}
+    _record(history, 'run-1', before)
+    _record(history, 'run-2', after)
+
+    moves = history.movers()
+    assert (moves['from'], moves['to']) == ('run-1', 'run-2')
+    assert (moves['compared'], moves['entered'], moves['dropped']) == (5, 1, 1)
+
+    rank_from, rank_to = _ranks(before), _ranks(after)
+    change = {name: rank_from[name] - rank_to[name] for name in 'ABCDE'}
+    assert [m['company_name'] for m in moves['risers']] == \
+        sorted((n for n in change if change[n] > 0), key=lambda n: -change[n])
+    assert [m['company_name'] for m in moves['fallers']] == \
+        sorted((n for n in change if change[n] < 0), key=lambda n: change[n])
+    d = next(m for m in moves['risers'] if m['company_name'] == 'D')
+    assert d == {'company_name': 'D', 'rank_from': 4, 'rank_to': 1, 'change': 3,
+                 'score_from': 20.0, 'score_to': 60.0}
+
+    limited = history.movers('run-1', 'run-2', limit=1)
+    assert [m['company_name'] for m in limited['risers']] == ['D']
+    assert [m['company_name'] for m in limited['fallers']] == ['A']
+    # Reversed, risers and fallers swap
+    assert [m['company_name'] for m in history.movers('run-2', 'run-1', limit=1)['risers']] == ['A']
+
+def test_movers_need_two_reported_runs(history):
+    assert history.movers() is None
+    _record(history, 'run-1', {'A': 1.0, 'B': 2.0})
+    _record(history, 'run-2', {'A': 3.0, 'B': 2.0}, status='interrupted')
+    assert history.movers() is None  # interrupted runs are skipped by default
+    assert history.movers('run-1', 'run-2')['risers'][0]['company_name'] == 'A'
+    assert history.movers('run-1', 'missing') is None
+
+def test_unchanged_ranks_have_no_movers(history):
+    _record(history, 'run-1', {'A': 2.0, 'B': 1.0})
+    _record(history, 'run-2', {'A': 4.0, 'B': 3.0})
+    moves = history.movers()
+    assert moves['risers'] == [] and moves['fallers'] == [] and moves['compared'] == 2
+
+def test_resumed_run_replaces_its_earlier_attempt(history):
+    _record(history, 'run-1', {'A': 1.0, 'B': 2.0}, status='interrupted')
+    _record(history, 'run-1', {'A': 3.0, 'B': 2.0, 'C': 1.0})
+
+    assert [(r['run_id'], r['status'], r['companies'], r['errors']) for r in history.runs()] == \
+        [('run-1', 'completed', 3, 1)]
+    attempts = os.listdir(os.path.join(history.directory, 'runs', 'run_id=run-1'))
+    assert len(attempts) == 1
+    frame = history.read_run('run-1')
+    assert sorted(frame['company_name']) == ['A', 'B', 'C']
+    assert [h['rank'] for h in history.company_history('A')] == [1]
+
+def test_company_history_and_sector_trends(history):
+    _record(history, 'run-1', {'A': 1.0, 'N': 2.0}, label='cli:batch')
+    _record(history, 'run-2', {'A': 3.0, 'N': 2.0}, label='dashboard:top20')
+    assert [(h['run_id'], h['rank'], h['final_score']) for h in history.company_history('A')] == \
+        [('run-1', 2, 1.0), ('run-2', 1, 3.0)]
+    assert [r['run_id'] for r in history.runs(label='cli')] == ['run-1']
+    trends = history.sector_trends(sectors=['Chips'])
+    assert [(t['run_id'], t['avg_score'], t['avg_moat']) for t in trends] == \
+        [('run-1', 1.0, 3.0), ('run-2', 3.0, 3.0)]
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agents.growth_agent import ranking_agent
+from agents.margin_agent import margin_analysis_agent
+from utils.analysis_engine import AnalysisEngine
+from utils.scoring import (
+    MARGIN_THRESHOLDS, ScoringEngine, descending_order, descending_ranks, margin_scores, tafgs,
+    tafgs_upper_bound
+)
+
+def _universe(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    margins = np.concatenate([rng.uniform(-0.3, 0.7, n), MARGIN_THRESHOLDS,
+                              np.nextafter(MARGIN_THRESHOLDS, 1), [0.0, -0.0]])
+    size = margins.size
+    return pd.DataFrame({
+        'company_name': [f'C{i}' for i in range(size)],
+        'sector': rng.choice(['Chips', 'Software', 'Energy'], size),
+        'operating_margin': margins,
+        'growth_forecast': rng.uniform(-0.5, 2.5, size).round(3),
+        'moat_score': rng.integers(0, 6, size),
+    })
+
+def _graph_scores(frame):
+    margin, final = [], []
+    for row in frame.to_dict('records'):
+        state = {**row, **margin_analysis_agent(row)}
+        margin.append(state['margin_score'])
+        final.append(ranking_agent({**state, 'moat_score': int(row['moat_score'])})['final_score'])
+    return np.array(margin), np.array(final)
+
+def test_scoring_engine_matches_the_graph_nodes():
+    frame = _universe()
+    scored = ScoringEngine().score(frame)
+    margin, final = _graph_scores(frame)
+    assert np.array_equal(scored['margin_score'].to_numpy(), margin)
+    # Same operations in the same order: bit-identical, not just close
+    assert np.array_equal(scored['final_score'].to_numpy(), final)
+    assert np.array_equal(scored['weighted_score'].to_numpy(), final)  # neutral weights
+
+def test_scoring_engine_matches_analyzed_results(companies):
+    results = AnalysisEngine().analyze_batch(companies[:12])
+    frame = pd.DataFrame([r for r in results if 'error' not in r])
+    scored = ScoringEngine().score(frame)
+    assert np.array_equal(scored['final_score'].to_numpy(), frame['final_score'].to_numpy())
+    assert np.array_equal(scored['margin_score'].to_numpy(), frame['margin_score'].to_numpy())
+
+def test_weighted_score_applies_sector_and_growth_tier():
+    engine = ScoringEngine({'sector_weights': {'Chips': 1.5},
+                            'growth_multipliers': {'high_growth': 2.0, 'medium_growth': 1.1}})
+    frame = pd.DataFrame({'sector': ['Chips', 'Chips', 'Other', 'Other'],
+                          'operating_margin': [0.5, 0.5, 0.25, 0.05],
+                          'growth_forecast': [1.5, 1.2, 1.19, 2.0],
+                          'moat_score': [4, 4, 3, 1]})
+    scored = engine.score(frame)
+    assert scored['final_score'].tolist() == pytest.approx([30.0, 24.0, 10.71, 2.0])
+    assert scored['sector_weight'].tolist() == [1.5, 1.5, 1.0, 1.0]
+    assert scored['growth_multiplier'].tolist() == [2.0, 1.1, 1.0, 2.0]
+    assert scored['weighted_score'].tolist() == pytest.approx([90.0, 39.6, 10.71, 4.0])
+
+def test_upper_bound_never_undercuts_the_final_score():
+    frame = _universe(500, seed=1)
+    final = tafgs(frame['moat_score'], margin_scores(frame['operating_margin']),
+                  frame['growth_forecast'])
+    bound = tafgs_upper_bound(frame['operating_margin'], frame['growth_forecast'])
+    assert np.all(bound >= final)
+    known = np.where(np.arange(len(frame)) % 2, frame['moat_score'], np.nan)
+    exact = tafgs_upper_bound(frame['operating_margin'], frame['growth_forecast'], known)
+    assert np.array_equal(exact[1::2], final[1::2])
+    assert np.array_equal(exact[::2], bound[::2])
+
+def test_descending_order_matches_a_stable_argsort():
+    rng = np.random.default_rng(3)
+    scores = rng.integers(0, 8, (20, 300)).astype(np.float64) * rng.choice([1.0, -1.0, 0.5], 300)
+    scores[:, :5] = -0.0
+    expected = np.argsort(-scores, axis=1, kind='stable')
+    assert np.array_equal(descending_order(scores), expected)
+    ranks = descending_ranks(scores)
+    assert np.array_equal(np.take_along_axis(ranks, expected, axis=1),
+                          np.broadcast_to(np.arange(300), (20, 300)))
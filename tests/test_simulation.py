@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from utils.simulation import (
+    _BUCKETS, _THRESHOLDS, RankSimulator, _draw, _margin_buckets, _margin_cdf
+)
+
+DRAWS = 200_000
+MARGINS = np.array([0.35, 0.12, -0.05, 0.0, 0.41, 0.25])
+
+@pytest.mark.parametrize('dist, scale', [('normal', 0.1), ('uniform', 0.15), ('lognormal', 0.4)])
+def test_margin_cdf_matches_sampled_frequencies(dist, scale):
+    scales = np.full(MARGINS.size, scale)
+    scales[-1] = 0.0  # no uncertainty: the base margin is exact
+    values = _draw(np.random.default_rng(1), MARGINS, dist, scales, DRAWS, (-np.inf, None))
+    sampled = (values[:, None, :] <= _THRESHOLDS[None, :, None]).mean(axis=0)
+
+    cdf = _margin_cdf(MARGINS, dist, scales)
+    assert cdf.shape == (_THRESHOLDS.size, MARGINS.size)
+    tolerance = 5 * np.sqrt(cdf * (1 - cdf) / DRAWS) + 1e-3
+    assert np.all(np.abs(sampled - cdf) <= tolerance)
+
+def test_margin_buckets_follow_the_cdf():
+    cdf = _margin_cdf(MARGINS, 'normal', np.full(MARGINS.size, 0.1))
+    buckets = _margin_buckets(np.random.default_rng(2), cdf, DRAWS)
+    # Ascending bucket b is hit when the margin lies between thresholds b-1 and b
+    expected = np.diff(np.vstack([np.zeros(MARGINS.size), cdf, np.ones(MARGINS.size)]), axis=0)
+    for level, score in enumerate(_BUCKETS):
+        share = (buckets == score).mean(axis=0)
+        assert np.all(np.abs(share - expected[level]) <= 5 * np.sqrt(0.25 / DRAWS) + 1e-3)
+
+def _results():
+    return [
+        {'company_name': 'A', 'sector': 'Chips', 'operating_margin': 0.45, 'growth_forecast': 1.8,
+         'moat_score': 5},
+        {'company_name': 'B', 'sector': 'Chips', 'operating_margin': 0.31, 'growth_forecast': 1.5,
+         'moat_score': 4},
+        {'company_name': 'C', 'sector': 'Software', 'operating_margin': 0.29, 'growth_forecast': 1.5,
+         'moat_score': 4},
+        {'company_name': 'D', 'sector': 'Software', 'operating_margin': 0.05, 'growth_forecast': 1.1,
+         'moat_score': 2},
+        {'company_name': 'E', 'sector': 'Energy', 'operating_margin': -0.1, 'growth_forecast': 0.9,
+         'moat_score': 1},
+        {'company_name': 'F', 'error': 'moat analysis failed'},
+    ]
+
+def test_without_uncertainty_the_base_ranking_is_certain():
+    exact = {field: {'dist': 'normal', 'scale': 0.0}
+             for field in ('operating_margin', 'growth_forecast')}
+    report = RankSimulator(exact, k=2, draws=50).run(_results())
+    assert report['draws'] == 50
+    companies = {c['company_name']: c for c in report['companies']}
+    assert set(companies) == set('ABCDE')  # the failed result is ignored
+    for company in companies.values():
+        assert company['mean_rank'] == company['base_rank']
+        assert company['rank_p5'] == company['rank_p95'] == company['base_rank']
+        assert company['p_top_k'] == (1.0 if company['base_rank'] <= 2 else 0.0)
+        assert company['mean_score'] == pytest.approx(company['base_score'])
+
+def test_simulation_does_not_depend_on_the_worker_count():
+    results = _results()
+    first = RankSimulator(k=2, draws=400, seed=7, chunk_elements=250).run(results)
+    again = RankSimulator(k=2, draws=400, seed=7, chunk_elements=250, workers=2).run(results)
+    first.pop('seconds'), again.pop('seconds')
+    assert first == again
+
+    companies = first['companies']
+    assert sum(c['p_top_k'] for c in companies) == pytest.approx(2.0)
+    assert sum(s['expected_top_k'] for s in first['sectors']) == pytest.approx(2.0)
+    assert sum(c['mean_rank'] for c in companies) == pytest.approx(sum(range(1, 6)))
+    for c in companies:
+        assert c['rank_p5'] <= c['rank_p50'] <= c['rank_p95']
+        assert c['score_p5'] <= c['score_p50'] <= c['score_p95']
+
+def test_unknown_distribution_is_rejected():
+    with pytest.raises(ValueError, match='Unknown distribution'):
+        RankSimulator({'operating_margin': {'dist': 'cauchy', 'scale': 0.1}})
+    with pytest.raises(ValueError, match='Cannot simulate'):
+        RankSimulator({'moat_score': {'dist': 'normal', 'scale': 1}})
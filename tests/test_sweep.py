@@ -0,0 +1,100 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from utils.scoring import ScoringEngine
+from utils.sweep import WeightSweep
+
+SECTORS = ('Chips', 'Software', 'Energy', 'Cloud')
+BASE = {'sector_weights': {'Chips': 1.2, 'Energy': 0.9},
+        'growth_multipliers': {'high_growth': 1.3, 'medium_growth': 1.1}}
+
+def _results(n=60, seed=0):
+    rng = random.Random(seed)
+    results = [{'company_name': f'C{i}', 'sector': rng.choice(SECTORS),
+                'operating_margin': rng.uniform(-0.1, 0.6), 'growth_forecast': rng.uniform(0.8, 2.0),
+                'moat_score': rng.randint(0, 5)} for i in range(n)]
+    results.append({'company_name': 'Broken', 'error': 'moat analysis failed'})
+    return results
+
+def _expected_ranks(results, weights):
+    """1-based ranks from ScoringEngine's weighted score, ties in input order."""
+    scored = ScoringEngine(weights).score([r for r in results if 'error' not in r])
+    order = np.argsort(-scored['weighted_score'].to_numpy(), kind='stable')
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(1, len(order) + 1)
+    return ranks
+
+def _merged(config):
+    return {table: {**BASE[table], **config.get(table, {})} for table in BASE}
+
+def test_configs_match_scoring_engine_rankings():
+    results = _results()
+    configs = [{}, {'sector_weights': {'Cloud': 2.0}},
+               {'sector_weights': {'Chips': 0.5}, 'growth_multipliers': {'stable_growth': 1.4}}]
+    report = WeightSweep(k=10, chunk_elements=70).run(results, configs=configs, base=BASE)
+
+    assert report['configs'] == 3
+    assert report['columns'] == [r['company_name'] for r in results[:-1]]
+    for row, config in zip(report['ranks'], configs):
+        assert np.array_equal(row, _expected_ranks(results, _merged(config)))
+    assert report['axes'] == ['sector_weights.Chips', 'sector_weights.Cloud',
+                              'growth_multipliers.stable_growth']
+
+def test_grid_matches_the_cartesian_product():
+    results = _results(seed=1)
+    grid = {'sector_weights': {'Chips': [0.8, 1.0, 1.5], 'Software': [1.0, 2.0]},
+            'growth_multipliers': {'high_growth': [1.0, 1.6]}}
+    sweep = WeightSweep(k=5)
+    report = sweep.run(results, grid=grid, base=BASE)
+
+    combos = list(itertools.product([0.8, 1.0, 1.5], [1.0, 2.0], [1.0, 1.6]))
+    assert report['configs'] == len(combos)
+    assert report['values'].tolist() == [list(c) for c in combos]
+    for row, (chips, software, high) in zip(report['ranks'], combos):
+        config = {'sector_weights': {'Chips': chips, 'Software': software},
+                  'growth_multipliers': {'high_growth': high}}
+        assert np.array_equal(row, _expected_ranks(results, _merged(config)))
+
+    # Ranking one configuration per chunk changes nothing
+    small = WeightSweep(k=5, chunk_elements=1).run(results, grid=grid, base=BASE)
+    assert np.array_equal(small['ranks'], report['ranks'])
+    for chunked, whole in zip(small['summary'], report['summary']):
+        assert chunked['company_name'] == whole['company_name']
+        assert (chunked['best_rank'], chunked['worst_rank'], chunked['leads']) == \
+            (whole['best_rank'], whole['worst_rank'], whole['leads'])
+        assert chunked['mean_rank'] == pytest.approx(whole['mean_rank'])
+
+def test_summary_agrees_with_the_rank_matrix(tmp_path):
+    results = _results(seed=2)
+    grid = {'sector_weights': {name: [0.5, 1.0, 2.0] for name in SECTORS[:3]}}
+    path = str(tmp_path / 'ranks.npy')
+    report = WeightSweep(k=10).run(results, grid=grid, base=BASE, ranks_path=path)
+    ranks = np.load(path)
+    assert np.array_equal(ranks, report['ranks'])
+
+    by_name = {s['company_name']: s for s in report['summary']}
+    for column, name in enumerate(report['columns']):
+        summary = by_name[name]
+        assert summary['best_rank'] == ranks[:, column].min()
+        assert summary['worst_rank'] == ranks[:, column].max()
+        assert summary['mean_rank'] == pytest.approx(ranks[:, column].mean())
+        assert summary['rank_sd'] == pytest.approx(ranks[:, column].std(), abs=1e-9)
+        assert summary['p_top_k'] == pytest.approx((ranks[:, column] <= 10).mean())
+        assert summary['leads'] == (ranks[:, column] == 1).sum()
+    assert [s['base_rank'] for s in report['summary']] == list(range(1, len(by_name) + 1))
+
+def test_invalid_requests():
+    results = _results(5)
+    sweep = WeightSweep(max_configs=4)
+    with pytest.raises(ValueError, match='either configs or grid'):
+        sweep.run(results)
+    with pytest.raises(ValueError, match='either configs or grid'):
+        sweep.run(results, configs=[{}], grid={})
+    with pytest.raises(ValueError, match='limit is 4'):
+        sweep.run(results, grid={'sector_weights': {'Chips': [1, 2, 3], 'Cloud': [1, 2]}})
+    with pytest.raises(ValueError, match='Unknown growth tier'):
+        sweep.run(results, grid={'growth_multipliers': {'hyper_growth': [1, 2]}})
+    assert sweep.run([results[-1]], configs=[{}])['configs'] == 0
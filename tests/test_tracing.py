@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils import tracing
+from utils.tracing import Tracer, configure_tracer, get_tracer, record, stage, summarize
+
+def _session(root, name, pid, age):
+    directory = root / name
+    directory.mkdir()
+    path = directory / f'{pid}.jsonl'
+    path.write_text('{}\n')
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    os.utime(directory, (stamp, stamp))
+    return directory
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def test_traces_and_summary(tmp_path):
+    tracer = Tracer(directory=str(tmp_path), enabled=True, session='s1')
+    for name in ('A', 'B'):
+        with tracer.trace(name, queued_at=time.time()):
+            with stage('moat_analysis'):
+                record(llm_requests=1, prompt_tokens=10)
+    with pytest.raises(RuntimeError):
+        with tracer.trace('C'):
+            raise RuntimeError('boom')
+
+    records = tracer.load()
+    assert [r['name'] for r in records] == ['A', 'B', 'C']
+    assert records[-1]['error'] == "RuntimeError('boom')"
+    summary = tracer.summary()
+    assert summary == summarize(records)
+    assert (summary['traces'], summary['errors']) == (3, 1)
+    assert summary['stages']['moat_analysis']['llm_requests'] == 2
+
+def test_prune_keeps_recent_and_live_sessions(tmp_path, dead_pid):
+    hour = 3600
+    live = _session(tmp_path, 'live', os.getpid(), age=10 * hour)
+    recent = _session(tmp_path, 'recent', dead_pid, age=60)
+    stale = _session(tmp_path, 'stale', dead_pid, age=10 * hour)
+    newest = _session(tmp_path, 'newest', dead_pid, age=1)
+
+    tracer = Tracer(directory=str(tmp_path), enabled=True, session='current',
+                    keep_sessions=2, prune_grace=hour)
+    with tracer.trace('A'):
+        pass
+
+    # Only 'newest' is within keep_sessions - 1, but 'recent' is inside the grace period
+    # and 'live' still has a running writer
+    assert sorted(os.listdir(tmp_path)) == ['current', 'live', 'newest', 'recent']
+    assert not stale.exists() and live.exists() and recent.exists() and newest.exists()
+
+def test_get_tracer_leaves_the_environment_alone(monkeypatch):
+    monkeypatch.setattr(tracing, '_tracer', None)
+    monkeypatch.delenv('TRACE_SESSION', raising=False)
+    tracer = get_tracer()
+    assert get_tracer() is tracer
+    assert 'TRACE_SESSION' not in os.environ
+
+    monkeypatch.setattr(tracing, '_tracer', None)
+    monkeypatch.setenv('TRACE_SESSION', 'joined')
+    assert get_tracer().session == 'joined'
+
+    assert configure_tracer('worker-session') is get_tracer()
+    assert get_tracer().session == 'worker-session'
@@ -1,67 +1,474 @@
 import asyncio
-from typing import List, Dict
+import queue
+import threading
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
 from utils.workflow import create_workflow
 from utils.data_loader import DataLoader
+from utils.change_tracker import ChangeTracker
+from utils.ranking_index import RankingIndex
+from utils.run_store import RunStore
+from utils.results import ResultRecord, as_record
+from utils.score_history import get_score_history
+from utils.parallel import iter_sharded
+from utils.tracing import get_tracer
+from config.settings import MAX_CONCURRENCY, MOAT_BATCH_SIZE
 import time
 
 class AnalysisEngine:
-    def __init__(self):
-        self.workflow = create_workflow()
+    def __init__(self, moat_batch_size: int = MOAT_BATCH_SIZE, index_results: bool = False):
+        self._workflow = None
+        self._scoring = None
+        self._lock = threading.Lock()
         self.data_loader = DataLoader()
+        self.moat_batch_size = moat_batch_size
+        # With index_results=True, every result this engine produces, for interactive
+        # rank/top-K queries. Off by default: it grows with the universe, not the chunk.
+        self.ranking_index = RankingIndex()
+        self.index_results = index_results
+        self.last_run_id = None
+        self.last_top_k = None
+        # Complete runs (checkpointed, streamed, incremental) are appended to the score history
+        self.history = get_score_history()
+
+    def _history_writer(self, run_id: str, label: str):
+        return self.history.writer(run_id, label) if self.history.enabled else None
+
+    def _index(self, result: Dict):
+        if self.index_results:
+            self.ranking_index.upsert(result)
+
+    @property
+    def workflow(self):
+        """Compiled LangGraph workflow, built on first use (loads the LLM stack)."""
+        with self._lock:
+            if self._workflow is None:
+                self._workflow = create_workflow()
+            return self._workflow
+
+    @property
+    def scoring(self):
+        """Vectorized scoring engine, built on first use (loads NumPy/pandas)."""
+        with self._lock:
+            if self._scoring is None:
+                from utils.scoring import ScoringEngine
+                self._scoring = ScoringEngine(self.data_loader.load_sector_weights())
+            return self._scoring
+
+    def _attach_moat_scores(self, companies: List[Dict], scored: Dict[str, Dict]) -> List[Dict]:
+        """Copy batch-scored moat fields onto the companies so the moat node skips the LLM."""
+        return [{**company, **scored[company['company_name']]}
+                if company.get('moat_score') is None and company.get('company_name') in scored
+                else company
+                for company in companies]
+
+    def prefill_moat_scores(self, companies: List[Dict]) -> List[Dict]:
+        """Score moats in multi-company requests when batched moat mode is on."""
+        pending = [c for c in companies if c.get('moat_score') is None]
+        if self.moat_batch_size <= 1 or not pending:
+            return companies
+        from agents.moat_agent import batch_moat_analysis
+        try:
+            with get_tracer().span('prefill_moat'):
+                scored = batch_moat_analysis(pending, self.moat_batch_size)
+        except Exception as e:
+            # Fall back to per-company moat calls inside the workflow
+            print(f"Batched moat scoring failed ({e}); scoring per company")
+            return companies
+        return self._attach_moat_scores(companies, scored)
+
+    async def prefill_moat_scores_async(self, companies: List[Dict],
+                                        concurrency: int = MAX_CONCURRENCY) -> List[Dict]:
+        """Async variant of prefill_moat_scores."""
+        pending = [c for c in companies if c.get('moat_score') is None]
+        if self.moat_batch_size <= 1 or not pending:
+            return companies
+        from agents.moat_agent import abatch_moat_analysis
+        try:
+            with get_tracer().span('prefill_moat'):
+                scored = await abatch_moat_analysis(pending, self.moat_batch_size, concurrency)
+        except Exception as e:
+            print(f"Batched moat scoring failed ({e}); scoring per company")
+            return companies
+        return self._attach_moat_scores(companies, scored)
         
-    def analyze_single_company(self, company: Dict) -> Dict:
-        """Analyze a single company."""
+    def analyze_single_company(self, company: Dict, queued_at: Optional[float] = None) -> Dict:
+        """Analyze a single company; queued_at (time.time()) marks when it joined a batch."""
         try:
-            result = self.workflow.invoke(company)
+            with get_tracer().trace(company.get('company_name', 'Unknown'), queued_at=queued_at):
+                result = self.workflow.invoke(company)
             result['timestamp'] = time.time()
+            result = ResultRecord(result)
+            self._index(result)
             return result
         except Exception as e:
-            return {
+            return ResultRecord({
                 'company_name': company.get('company_name', 'Unknown'),
                 'error': str(e),
                 'final_score': 0,
                 'timestamp': time.time()
-            }
+            })
     
+    async def analyze_single_company_async(self, company: Dict,
+                                           queued_at: Optional[float] = None) -> Dict:
+        """Analyze a single company through the workflow's async path."""
+        try:
+            with get_tracer().trace(company.get('company_name', 'Unknown'), queued_at=queued_at):
+                result = await self.workflow.ainvoke(company)
+            result['timestamp'] = time.time()
+            result = ResultRecord(result)
+            self._index(result)
+            return result
+        except Exception as e:
+            return ResultRecord({
+                'company_name': company.get('company_name', 'Unknown'),
+                'error': str(e),
+                'final_score': 0,
+                'timestamp': time.time()
+            })
+
+    async def aiter_batch(self, companies: List[Dict],
+                          concurrency: int = MAX_CONCURRENCY) -> AsyncIterator[Dict]:
+        """Yield results concurrently as each company completes."""
+        companies = await self.prefill_moat_scores_async(companies, concurrency)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(company: Dict) -> Dict:
+            queued_at = time.time()
+            async with semaphore:
+                return await self.analyze_single_company_async(company, queued_at)
+
+        tasks = [asyncio.create_task(run(company)) for company in companies]
+        try:
+            for i, task in enumerate(asyncio.as_completed(tasks)):
+                result = await task
+                print(f"Completed {i+1}/{len(companies)}: {result.get('company_name', 'Unknown')}")
+                yield result
+        finally:
+            # The consumer may stop early; don't leave companies running in the background
+            for task in tasks:
+                task.cancel()
+
+    async def analyze_batch_async(self, companies: List[Dict],
+                                  concurrency: int = MAX_CONCURRENCY) -> List[Dict]:
+        """Analyze companies concurrently; results come back in completion order."""
+        return [result async for result in self.aiter_batch(companies, concurrency)]
+
+    def analyze_batch_concurrent(self, companies: List[Dict],
+                                 concurrency: int = MAX_CONCURRENCY) -> List[Dict]:
+        """Blocking wrapper around analyze_batch_async for sync callers."""
+        return asyncio.run(self.analyze_batch_async(companies, concurrency))
+
+    def iter_batch_concurrent(self, companies: List[Dict],
+                              concurrency: int = MAX_CONCURRENCY) -> Iterator[Dict]:
+        """Sync generator over aiter_batch; the event loop runs in a helper thread."""
+        results = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for result in self.aiter_batch(companies, concurrency):
+                    results.put(result)
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=asyncio.run, args=(pump(),), daemon=True)
+        thread.start()
+        while True:
+            result = results.get()
+            if result is done:
+                break
+            yield result
+        thread.join()
+
+    def iter_batch(self, companies: List[Dict]) -> Iterator[Dict]:
+        """Analyze companies in sequence, yielding each result as it is ready."""
+        companies = self.prefill_moat_scores(companies)
+        for i, company in enumerate(companies):
+            print(f"Analyzing {i+1}/{len(companies)}: {company['company_name']}")
+            # Queued from when the consumer asked for it, not from the start of the batch
+            yield self.analyze_single_company(company, time.time())
+
+    def iter_sharded(self, companies: List[Dict], workers: int,
+                     concurrency: int = 1) -> Iterator[Dict]:
+        """Stream results from `workers` processes, each running its own shard."""
+        for _, result in iter_sharded(companies, workers, concurrency, self.moat_batch_size):
+            self._index(result)
+            yield result
+
+    def analyze_sharded(self, companies: List[Dict], workers: int,
+                        concurrency: int = 1) -> List[Dict]:
+        """Multi-process analyze_batch; results are returned in input order."""
+        ordered = [None] * len(companies)
+        for index, result in iter_sharded(companies, workers, concurrency, self.moat_batch_size):
+            self._index(result)
+            ordered[index] = result
+        return ordered
+
+    def iter_checkpointed(self, companies: List[Dict], run_id: Optional[str] = None,
+                          concurrency: int = 1, workers: int = 1,
+                          label: str = 'batch') -> Iterator[Dict]:
+        """Stream a batch while appending every result to the run store.
+
+        Passing the id of an earlier run resumes it: companies that already
+        succeeded are yielded from the store, and only failed or unfinished
+        ones are analyzed again. The run id is available as self.last_run_id.
+        The run is also recorded in the score history under `label`.
+        """
+        store = RunStore()
+        done = store.completed(run_id) if run_id else {}
+        self.last_run_id = run_id = store.start_run(companies, run_id)
+        if done:
+            print(f"Resuming run {run_id}: {len(done)} of {len(companies)} already complete")
+        history = self._history_writer(run_id, label)
+
+        pending = []
+        for company in companies:
+            previous = done.get(company.get('company_name'))
+            if previous is not None:
+                self._index(previous)
+                if history is not None:
+                    history.append(previous)
+                yield previous
+            else:
+                pending.append(company)
+
+        if workers > 1:
+            stream = self.iter_sharded(pending, workers, concurrency)
+        elif concurrency > 1:
+            stream = self.iter_batch_concurrent(pending, concurrency)
+        else:
+            stream = self.iter_batch(pending)
+        failures = 0
+        status = 'interrupted'
+        try:
+            for result in stream:
+                store.append(run_id, result)
+                if history is not None:
+                    history.append(result)
+                failures += 'error' in result
+                yield result
+            status = 'partial' if failures else 'completed'
+        finally:
+            store.finish_run(run_id, status)
+            store.close()
+            if history is not None:
+                history.close(status)
+
+    def iter_stream(self, chunks: Iterable[List[Dict]], concurrency: int = 1,
+                    workers: int = 1, label: str = 'stream') -> Iterator[Dict]:
+        """Analyze an iterable of company chunks (e.g. iter_company_chunks) chunk by chunk.
+
+        Only one chunk is materialized at a time, so memory follows the chunk
+        size rather than the universe size (use LiveRankings for bounded-memory
+        rankings, and leave index_results off). The run is recorded in the
+        score history as self.last_run_id.
+        """
+        self.last_run_id = run_id = RunStore.new_run_id()
+        history = self._history_writer(run_id, label)
+        failures = 0
+        status = 'interrupted'
+        try:
+            for chunk in chunks:
+                if workers > 1:
+                    stream = self.iter_sharded(chunk, workers, concurrency)
+                elif concurrency > 1:
+                    stream = self.iter_batch_concurrent(chunk, concurrency)
+                else:
+                    stream = self.iter_batch(chunk)
+                for result in stream:
+                    if history is not None:
+                        history.append(result)
+                    failures += 'error' in result
+                    yield result
+            status = 'partial' if failures else 'completed'
+        finally:
+            if history is not None:
+                history.close(status)
+
+    def iter_top_k(self, companies: List[Dict], k: int = 20,
+                   concurrency: int = 1) -> Iterator[Dict]:
+        """Find the top K companies, skipping the LLM for companies that cannot make it.
+
+        Margin score and growth are known up front and the moat is capped at
+        MOAT_SCORE_MAX, so each company's TAFGS has an upper bound. Companies
+        are analyzed in descending-bound order (in waves of `concurrency` /
+        moat_batch_size) until no remaining bound can reach the current K-th
+        score. The rankings match a full analysis of every company, ties
+        included (earlier input rows win). Each analyzed result is yielded;
+        the rankings and pruning stats are left in self.last_top_k.
+        """
+        import heapq
+        import numpy as np
+        from utils.scoring import tafgs_upper_bound
+        bounds = tafgs_upper_bound(
+            [c['operating_margin'] for c in companies],
+            [c['growth_forecast'] for c in companies],
+            [np.nan if c.get('moat_score') is None else c['moat_score'] for c in companies])
+        order = np.argsort(-bounds, kind='stable')
+        wave = max(1, concurrency, self.moat_batch_size)
+        kth = []  # min-heap of the best k scores so far; kth[0] is the cutoff
+        analyzed = []  # (input position, result)
+        pos = 0
+        while pos < len(order):
+            if len(kth) >= k and bounds[order[pos]] < kth[0]:
+                break
+            # Bounds are descending, so everything in the wave can still reach the cutoff
+            end = min(pos + wave, len(order))
+            if len(kth) >= k:
+                end = pos + int(np.count_nonzero(bounds[order[pos:end]] >= kth[0]))
+            positions = {companies[i]['company_name']: int(i) for i in order[pos:end]}
+            batch = [companies[i] for i in order[pos:end]]
+            pos = end
+            print(f"Top-{k} screen: analyzing {len(batch)} more (bound >= {bounds[order[pos - 1]]:.2f}, "
+                  f"cutoff {kth[0] if len(kth) >= k else 0:.2f})")
+            if concurrency > 1:
+                stream = self.iter_batch_concurrent(batch, concurrency)
+            else:
+                stream = (self.analyze_single_company(company, time.time())
+                          for company in self.prefill_moat_scores(batch))
+            for result in stream:
+                analyzed.append((positions.get(result.get('company_name'), len(companies)), result))
+                if 'error' not in result:
+                    score = result.get('final_score', 0)
+                    if len(kth) < k:
+                        heapq.heappush(kth, score)
+                    elif score > kth[0]:
+                        heapq.heapreplace(kth, score)
+                yield result
+
+        pruned = len(companies) - len(analyzed)
+        batch_size = max(1, self.moat_batch_size)
+        analyzed.sort(key=lambda item: item[0])  # input order, so ties rank like a full run
+        self.last_top_k = {
+            'rankings': RankingIndex.from_results(r for _, r in analyzed).top(k),
+            'total': len(companies),
+            'analyzed': len(analyzed),
+            'pruned': pruned,
+            'llm_calls_avoided': -(-pruned // batch_size),
+            'cutoff': kth[0] if len(kth) >= k else 0,
+        }
+        print(f"Top-{k} screen: analyzed {len(analyzed)} of {len(companies)} companies; "
+              f"{pruned} pruned by their score bound (~{self.last_top_k['llm_calls_avoided']} "
+              f"LLM calls avoided)")
+
+    def analyze_top_k(self, companies: List[Dict], k: int = 20,
+                      concurrency: int = 1) -> List[Dict]:
+        """Blocking iter_top_k; returns the top K results, best first."""
+        for _ in self.iter_top_k(companies, k, concurrency):
+            pass
+        return self.last_top_k['rankings']
+
     def analyze_batch(self, companies: List[Dict]) -> List[Dict]:
         """Analyze multiple companies in sequence."""
+        return list(self.iter_batch(companies))
+    
+    def analyze_incremental(self, companies: List[Dict],
+                            concurrency: int = 1) -> List[Dict]:
+        """Re-analyze only what changed since the last incremental run.
+
+        Unchanged rows reuse their previous result, rows with only financial
+        edits reuse the previous moat fields (no LLM call), and new rows or
+        rows whose company_name/sector or supplied moat fields changed go
+        through the full workflow. Edits to fields the workflow doesn't read
+        leave a row unchanged.
+        """
+        tracker = ChangeTracker()
+        plan = tracker.plan(companies)
+        print(f"Incremental: {len(plan['unchanged'])} unchanged, "
+              f"{len(plan['financial'])} financial-only, {len(plan['full'])} full")
+
+        to_run = plan['financial'] + plan['full']
+        if concurrency > 1:
+            fresh = self.analyze_batch_concurrent(to_run, concurrency)
+        else:
+            fresh = self.analyze_batch(to_run)
+
+        by_key = dict(plan['unchanged'])
+        # Concurrent results arrive in completion order, so match on company_name
+        fresh_by_name = {r.get('company_name'): r for r in fresh}
+        for company in to_run:
+            by_key[tracker.row_key(company)] = fresh_by_name.get(company['company_name'])
+
         results = []
-        for i, company in enumerate(companies):
-            print(f"Analyzing {i+1}/{len(companies)}: {company['company_name']}")
-            result = self.analyze_single_company(company)
+        for company in companies:
+            result = by_key.get(tracker.row_key(company))
+            if result is None:
+                continue
+            result = as_record(result)
+            tracker.record(company, result)
+            self._index(result)
             results.append(result)
-            time.sleep(0.5)  # Rate limiting
+        tracker.close()
+
+        self.last_run_id = RunStore.new_run_id()
+        history = self._history_writer(self.last_run_id, 'incremental')
+        if history is not None:
+            for result in results:
+                history.append(result)
+            history.close('partial' if history.errors else 'completed')
         return results
-    
+
+    def rescore(self, results: List[Dict], weights: Dict = None):
+        """Recompute margin/TAFGS (and weighted TAFGS) for analyzed results without the LLM."""
+        if weights is not None:
+            self.scoring.set_weights(weights)
+        import pandas as pd
+        valid = pd.DataFrame([r for r in results if 'error' not in r])
+        if valid.empty:
+            return valid
+        return self.scoring.score(valid)
+
+    def sweep_weights(self, results: List[Dict], configs: Optional[List[Dict]] = None,
+                      grid: Optional[Dict] = None, k: int = 20, **kwargs) -> Dict:
+        """Rank analyzed results under many weight configurations at once (no LLM calls).
+
+        Weights not set by a configuration come from data/sector_weights.json;
+        see WeightSweep for the report and the keyword options.
+        """
+        from utils.sweep import WeightSweep
+        return WeightSweep(k).run(results, configs, grid, self.data_loader.load_sector_weights(),
+                                  **kwargs)
+
     def get_top_rankings(self, results: List[Dict], limit: int = 20) -> List[Dict]:
-        """Get top N companies by TAFGS score."""
-        valid_results = [r for r in results if 'error' not in r]
-        ranked = sorted(valid_results, key=lambda x: x.get('final_score', 0), reverse=True)
-        return ranked[:limit]
+        """Get top N companies by TAFGS score.
+
+        Every successful result is ranked, duplicates included, with ties in
+        input order; use RankingIndex for a deduplicated, updatable index.
+        """
+        import heapq
+        valid_results = (r for r in results if 'error' not in r)
+        # Same order as sorted(..., reverse=True)[:limit], in O(n log limit)
+        return heapq.nlargest(limit, valid_results, key=lambda x: x.get('final_score', 0))
     
     def generate_sector_analysis(self, results: List[Dict]) -> Dict:
-        """Generate sector-wise analysis."""
+        """Generate sector-wise analysis.
+
+        One pass over every result, failed ones included: a result without
+        a sector is counted under 'Unknown' but left out of its average, as
+        before. best_company is the first result with the sector's top score.
+        """
         sector_stats = {}
+        totals = {}
         for result in results:
             sector = result.get('sector', 'Unknown')
-            if sector not in sector_stats:
-                sector_stats[sector] = {
+            stats = sector_stats.get(sector)
+            if stats is None:
+                stats = sector_stats[sector] = {
                     'companies': [],
                     'avg_score': 0,
                     'count': 0,
-                    'top_score': 0
+                    'top_score': 0,
+                    'best_company': None
                 }
-            
-            sector_stats[sector]['companies'].append(result['company_name'])
-            sector_stats[sector]['count'] += 1
+                totals[sector] = 0
+            stats['companies'].append(result['company_name'])
+            stats['count'] += 1
             score = result.get('final_score', 0)
-            if score > sector_stats[sector]['top_score']:
-                sector_stats[sector]['top_score'] = score
-        
-        # Calculate averages
-        for sector in sector_stats:
-            if sector_stats[sector]['count'] > 0:
-                total_score = sum(r.get('final_score', 0) for r in results if r.get('sector') == sector)
-                sector_stats[sector]['avg_score'] = total_score / sector_stats[sector]['count']
-        
-        return sector_stats
\ No newline at end of file
+            if score > stats['top_score'] or stats['best_company'] is None:
+                stats['top_score'] = max(stats['top_score'], score)
+                stats['best_company'] = result['company_name']
+            if result.get('sector') == sector:
+                totals[sector] += score
+        for sector, stats in sector_stats.items():
+            stats['avg_score'] = totals[sector] / stats['count']
+        return sector_stats
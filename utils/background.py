@@ -0,0 +1,183 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from utils.analysis_engine import AnalysisEngine
+from utils.ranking_index import RankingIndex
+from utils.run_store import RunStore
+from utils.job_queue import JobQueue, FINAL_STATUSES, PRIORITY_INTERACTIVE
+from config.settings import (
+    DASHBOARD_WORKERS, DASHBOARD_POLL_SECONDS, DASHBOARD_JOB_QUEUE, RESULT_REUSE_MAX_AGE
+)
+
+class AnalysisJob:
+    """Progress and results of one background batch, readable from any thread."""
+
+    def __init__(self, key: str, companies: List[Dict]):
+        self.key = key
+        self.total = len(companies)
+        self.run_id = RunStore.new_run_id()
+        self.status = 'queued'
+        self.processed = 0
+        self.reused = 0
+        self.errors = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._index = RankingIndex()
+        self._added = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def add(self, result: Dict, reused: bool = False):
+        """Record a company's result; a later result for the same company replaces the earlier one."""
+        name = result['company_name']
+        with self._lock:
+            if name not in self._added:
+                self._added.add(name)
+                self.processed += 1
+                self.reused += reused
+            if name in self._failed:
+                self._failed.discard(name)
+                self.errors -= 1
+            if 'error' in result:
+                self._failed.add(name)
+                self.errors += 1
+                self._index.remove(name)
+            else:
+                self._index.upsert(result)
+
+    def finish(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'partial', 'failed')
+
+    def results(self) -> List[Dict]:
+        """Successful results so far, best first."""
+        with self._lock:
+            return self._index.top(len(self._index))
+
+    def top(self, limit: int) -> List[Dict]:
+        with self._lock:
+            return self._index.top(limit)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'key': self.key, 'run_id': self.run_id, 'status': self.status,
+                    'total': self.total, 'processed': self.processed, 'reused': self.reused,
+                    'errors': self.errors, 'error': self.error,
+                    'submitted_at': self.submitted_at, 'finished_at': self.finished_at}
+
+class BackgroundAnalyzer:
+    """Runs dashboard analyses off the script thread and shares them across sessions.
+
+    Jobs run on a small thread pool through one AnalysisEngine, so the
+    workflow is compiled once per process. Every result is checkpointed to
+    the RunStore, and companies whose latest stored result (from any run,
+    including CLI batches) has the same inputs are reused instead of being
+    sent to the LLM again. Jobs are keyed by name (e.g. 'top20'): submitting
+    a key that is still running returns the running job.
+
+    With use_queue=True (DASHBOARD_JOB_QUEUE) the analysis itself is handed
+    to the job queue at interactive priority and the thread only follows
+    its progress, so separate JobWorker processes do the LLM work.
+    """
+
+    def __init__(self, max_workers: int = DASHBOARD_WORKERS,
+                 max_age: float = RESULT_REUSE_MAX_AGE, use_queue: bool = DASHBOARD_JOB_QUEUE):
+        self.engine = AnalysisEngine(index_results=False)
+        self.max_age = max_age
+        self.use_queue = use_queue
+        self.queue = JobQueue() if use_queue else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='dashboard-analysis')
+        self._store = RunStore()
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._lock = threading.Lock()
+
+    def stored_results(self, companies: List[Dict]) -> List[Dict]:
+        """Latest stored result for each company whose inputs still match."""
+        return list(self._store.reusable_results(companies, self.max_age).values())
+
+    def submit(self, key: str, companies: List[Dict], reuse: bool = True) -> AnalysisJob:
+        """Start analyzing `companies` in the background (or return the job already running)."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done:
+                return job
+            job = self._jobs[key] = AnalysisJob(key, companies)
+
+        stored = self._store.reusable_results(companies, self.max_age) if reuse else {}
+        for result in stored.values():
+            job.add(result, reused=True)
+        pending = [c for c in companies if c['company_name'] not in stored]
+        if pending:
+            self._executor.submit(self._follow_queue if self.use_queue else self._run, job, pending)
+        else:
+            job.finish('completed')
+        return job
+
+    def _run(self, job: AnalysisJob, companies: List[Dict]):
+        job.status = 'running'
+        try:
+            for result in self.engine.iter_checkpointed(companies, job.run_id,
+                                                        label=f'dashboard:{job.key}'):
+                job.add(result)
+        except Exception as e:
+            print(f"❌ Background analysis '{job.key}' failed: {e}")
+            job.finish('failed', str(e))
+            return
+        job.finish('partial' if job.errors else 'completed')
+
+    def _follow_queue(self, job: AnalysisJob, companies: List[Dict]):
+        """Queue the companies for the worker pool and mirror the job's results as they land."""
+        job.run_id = self.queue.submit(companies, PRIORITY_INTERACTIVE, label=f'dashboard:{job.key}')
+        job.status = 'queued'
+        last_id = 0
+        # One store for the whole follow; each poll reads only the rows past last_id
+        store = RunStore()
+        try:
+            while True:
+                info = self.queue.status(job.run_id)
+                if info is not None and info['status'] == 'running':
+                    job.status = 'running'
+                # A retry after an expired lease stores a newer row for the same company;
+                # add() lets it replace the earlier (possibly failed) one
+                last_id, results = store.results_since(job.run_id, last_id)
+                for result in results.values():
+                    job.add(result)
+                if info is None or info['status'] in FINAL_STATUSES:
+                    break
+                time.sleep(DASHBOARD_POLL_SECONDS)
+        finally:
+            store.close()
+            self.queue.close()
+        if info is None or info['status'] in ('failed', 'cancelled'):
+            job.finish('failed', (info['error'] or f"job {info['status']}") if info
+                       else 'job disappeared from the queue')
+        else:
+            job.finish('partial' if job.errors else 'completed')
+
+    def job(self, key: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def jobs(self) -> List[Dict]:
+        with self._lock:
+            return [job.snapshot() for job in self._jobs.values()]
+
+_background_analyzer = None
+_background_analyzer_lock = threading.Lock()
+
+def get_background_analyzer() -> BackgroundAnalyzer:
+    """Process-wide analyzer shared by every dashboard session and rerun."""
+    global _background_analyzer
+    with _background_analyzer_lock:
+        if _background_analyzer is None:
+            _background_analyzer = BackgroundAnalyzer()
+        return _background_analyzer
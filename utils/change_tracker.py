@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+from state import AgentState
+from utils.results import ResultRecord, json_default
+from config.settings import CACHE_DIR
+
+# A change here invalidates the moat score and sends the row back to the LLM
+IDENTITY_FIELDS = ('company_name', 'sector')
+# Moat fields supplied with the input are used as-is, so a change re-runs the row with them
+MOAT_FIELDS = ('moat_score', 'report_summary')
+# Every input field the workflow reads; a change to any other of these (the
+# financials, or precomputed scores) re-runs margin, rank and report. Fields
+# outside the workflow state can't change a result and are not fingerprinted.
+WORKFLOW_FIELDS = tuple(AgentState.__annotations__)
+FINANCIAL_FIELDS = tuple(f for f in WORKFLOW_FIELDS if f not in IDENTITY_FIELDS + MOAT_FIELDS)
+
+class ChangeTracker:
+    """Persisted per-row and per-field fingerprints for incremental runs.
+
+    Rows are keyed by ticker when present, otherwise by company_name. Each
+    row's field hashes and last result live in a SQLite table (WAL mode);
+    only the rows a run looks at are read, and save() writes just the rows
+    that changed, in one transaction. A state file from the former JSON
+    format is imported on first use.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(CACHE_DIR, 'incremental_state.sqlite')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS incremental_rows (
+                    row_key TEXT PRIMARY KEY,
+                    fields TEXT NOT NULL,
+                    result TEXT NOT NULL
+                ) WITHOUT ROWID""")
+        self.rows: Dict[str, Dict] = {}  # row_key -> {'fields', 'result'} read or recorded so far
+        self._queried = set()
+        self._dirty: Dict[str, Optional[Dict]] = {}  # row_key -> new state, None to delete
+        self._import_legacy()
+
+    def _import_legacy(self):
+        legacy = f'{os.path.splitext(self.path)[0]}.json'
+        if not os.path.exists(legacy):
+            return
+        if self._conn.execute('SELECT 1 FROM incremental_rows LIMIT 1').fetchone() is None:
+            try:
+                with open(legacy, 'r') as f:
+                    rows = json.load(f)
+            except json.JSONDecodeError:
+                rows = {}
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO incremental_rows VALUES (?, ?, ?)',
+                    [(key, json.dumps(row['fields']), json.dumps(row['result'], default=json_default))
+                     for key, row in rows.items()])
+        os.replace(legacy, f'{legacy}.migrated')
+
+    def _load(self, keys: Iterable[str]):
+        missing = [key for key in dict.fromkeys(keys) if key not in self._queried]
+        self._queried.update(missing)
+        # Stay under SQLite's bound-parameter limit
+        for chunk in (missing[i:i + 500] for i in range(0, len(missing), 500)):
+            rows = self._conn.execute(
+                f"SELECT row_key, fields, result FROM incremental_rows "
+                f"WHERE row_key IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            for key, fields, result in rows:
+                self.rows.setdefault(key, {'fields': json.loads(fields),
+                                           'result': ResultRecord(json.loads(result))})
+
+    def save(self):
+        """Write the rows recorded since the last save in one transaction."""
+        dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO incremental_rows VALUES (?, ?, ?)',
+                [(key, json.dumps(row['fields']), json.dumps(row['result'], default=json_default))
+                 for key, row in dirty.items() if row is not None])
+            self._conn.executemany('DELETE FROM incremental_rows WHERE row_key = ?',
+                                   [(key,) for key, row in dirty.items() if row is None])
+
+    def close(self):
+        self.save()
+        self._conn.close()
+
+    @staticmethod
+    def row_key(company: Dict) -> str:
+        return str(company.get('ticker') or company.get('company_name', ''))
+
+    @staticmethod
+    def fingerprint(company: Dict) -> Dict[str, str]:
+        """Hash of every workflow input field, so changes can be located per field."""
+        return {
+            field: hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+            for field, value in company.items() if field in WORKFLOW_FIELDS
+        }
+
+    def changed_fields(self, company: Dict) -> Optional[set]:
+        """Fields that differ from the stored fingerprint; None for unseen rows."""
+        key = self.row_key(company)
+        self._load([key])
+        previous = self.rows.get(key)
+        if previous is None:
+            return None
+        current = self.fingerprint(company)
+        old = {f: h for f, h in previous['fields'].items() if f in WORKFLOW_FIELDS}
+        return {f for f in set(current) | set(old) if current.get(f) != old.get(f)}
+
+    def plan(self, companies: List[Dict]) -> Dict[str, List]:
+        """Split companies into unchanged / financial-only / full re-analysis.
+
+        'unchanged' holds (row_key, previous_result) pairs; 'financial' holds
+        companies with the previous moat fields attached; 'full' holds the rest.
+        """
+        plan = {'unchanged': [], 'financial': [], 'full': []}
+        self._load(self.row_key(company) for company in companies)
+        for company in companies:
+            changed = self.changed_fields(company)
+            previous = self.rows.get(self.row_key(company), {}).get('result')
+            if changed is None or previous is None or 'error' in previous \
+                    or changed & set(IDENTITY_FIELDS + MOAT_FIELDS):
+                plan['full'].append(company)
+            elif changed & set(FINANCIAL_FIELDS):
+                plan['financial'].append({
+                    **company,
+                    'moat_score': previous['moat_score'],
+                    'report_summary': previous['report_summary']
+                })
+            else:
+                plan['unchanged'].append((self.row_key(company), previous))
+        return plan
+
+    def record(self, company: Dict, result: Dict):
+        """Remember a row's fingerprint and result (errors are retried next run)."""
+        key = self.row_key(company)
+        self._load([key])
+        if 'error' in result:
+            if self.rows.pop(key, None) is not None:
+                self._dirty[key] = None
+            return
+        row = {'fields': self.fingerprint(company), 'result': result}
+        previous = self.rows.get(key)
+        if (previous is not None and previous['result'] is result
+                and previous['fields'] == row['fields']):
+            return  # reused unchanged; nothing to write
+        self.rows[key] = self._dirty[key] = row
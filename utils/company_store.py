@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from config.settings import CACHE_DIR
+
+# Bump when SCHEMA or the validation rules change so cached Parquet files are rebuilt
+SCHEMA_VERSION = '2'
+
+CONVERT_CHUNK_ROWS = 50_000
+
+# field -> (arrow type name, required)
+SCHEMA = {
+    'company_name': ('string', True),
+    'sector': ('string', True),
+    'operating_margin': ('float64', True),
+    'growth_forecast': ('float64', True),
+    'ticker': ('string', False),
+    'sub_sector': ('string', False),
+    'region': ('string', False),
+    'market_cap': ('int64', False),
+    'revenue': ('int64', False),
+    'employees': ('int64', False),
+    'founded': ('int64', False),
+    'headquarters': ('string', False),
+    'key_products': ('list<string>', False),
+    'ai_factory_role': ('string', False),
+    'data_flags': ('list<string>', False),
+}
+
+# Parquet column holding, as a JSON object, the fields of a record that aren't in SCHEMA
+EXTRA_COLUMN = '_extra'
+
+class CompanySchemaError(ValueError):
+    """A company record that cannot be coerced to SCHEMA."""
+
+def _arrow_schema():
+    import pyarrow as pa
+    types = {'string': pa.string(), 'float64': pa.float64(), 'int64': pa.int64(),
+             'list<string>': pa.list_(pa.string())}
+    return pa.schema([pa.field(name, types[kind], nullable=not required)
+                      for name, (kind, required) in SCHEMA.items()]
+                     + [pa.field(EXTRA_COLUMN, pa.string())])
+
+def _coerce(value, kind: str):
+    if kind == 'string':
+        return str(value)
+    if kind == 'float64':
+        return float(value)
+    if kind == 'int64':
+        return int(round(float(value)))
+    if isinstance(value, str):
+        return [value]
+    return [str(item) for item in value]
+
+def validate_company(record: Dict) -> Dict:
+    """Coerce one record to SCHEMA; raises CompanySchemaError if it can't be.
+
+    Fields outside SCHEMA are kept as they are. Values that convert but look
+    implausible (an operating margin outside [-1, 1]) keep the row and are
+    listed in its data_flags instead.
+    """
+    if not isinstance(record, dict):
+        raise CompanySchemaError(f'expected an object, got {type(record).__name__}')
+    row = {}
+    for name, (kind, required) in SCHEMA.items():
+        value = record.get(name)
+        if value is None or value == '' or (isinstance(value, float) and value != value):
+            if required:
+                raise CompanySchemaError(f'missing required field {name!r}')
+            row[name] = None
+            continue
+        try:
+            row[name] = _coerce(value, kind)
+        except (TypeError, ValueError):
+            raise CompanySchemaError(f'{name!r}: cannot convert {value!r} to {kind}')
+    if not row['company_name'].strip() or not row['sector'].strip():
+        raise CompanySchemaError('company_name and sector must be non-empty')
+    flags = list(row['data_flags'] or ())
+    if not -1.0 <= row['operating_margin'] <= 1.0:
+        flags.append(f"operating_margin {row['operating_margin']} outside [-1, 1]")
+    row['data_flags'] = flags or None
+    row.update((key, value) for key, value in record.items() if key not in SCHEMA)
+    return row
+
+def _read_source(path: str) -> List[Dict]:
+    """Raw records from a JSON array / JSON-lines file (any extension) or a CSV."""
+    if os.path.getsize(path) == 0:
+        return []
+    if path.endswith('.csv'):
+        import pandas as pd
+        return pd.read_csv(path).to_dict('records')
+    with open(path, 'r') as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+class CompanyStore:
+    """Validated, columnar, in-process cache of company source files.
+
+    Each source (companies.json, company_dataset.txt, companies.csv, ...) is
+    validated against SCHEMA once and written to a Parquet file under
+    CACHE_DIR/companies; later loads memory-map that file instead of parsing
+    JSON. Loaded tables are kept per process and reused until the source's
+    mtime or size changes, and callers can project just the columns they need.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, 'companies')
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.conversions = 0
+        self.invalid_rows = {}
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _parquet_path(self, path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f'{os.path.basename(path)}.{digest}.parquet')
+
+    def _metadata(self, signature: Tuple[int, int]) -> Dict[bytes, bytes]:
+        return {b'source_mtime_ns': str(signature[0]).encode(),
+                b'source_size': str(signature[1]).encode(),
+                b'schema_version': SCHEMA_VERSION.encode()}
+
+    def _convert(self, path: str, signature: Tuple[int, int]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = _arrow_schema().with_metadata(self._metadata(signature))
+        records = _read_source(path)
+        batches, errors, flagged = [], [], 0
+        # Validate in chunks so only one chunk of coerced dicts is alive next to the raw records
+        for start in range(0, len(records), CONVERT_CHUNK_ROWS):
+            rows = []
+            for index, record in enumerate(records[start:start + CONVERT_CHUNK_ROWS], start):
+                try:
+                    row = validate_company(record)
+                except CompanySchemaError as e:
+                    errors.append(f'row {index}: {e}')
+                    continue
+                flagged += row['data_flags'] is not None
+                extra = {key: row.pop(key) for key in list(row) if key not in SCHEMA}
+                row[EXTRA_COLUMN] = json.dumps(extra, default=str) if extra else None
+                rows.append(row)
+            batches.append(pa.RecordBatch.from_pylist(rows, schema=schema))
+        del records
+        if errors:
+            print(f"⚠️  {path}: skipped {len(errors)} invalid row(s); first: {errors[0]}")
+        if flagged:
+            print(f"⚠️  {path}: kept {flagged} row(s) with implausible values (see data_flags)")
+        self.invalid_rows[path] = errors
+        table = pa.Table.from_batches(batches, schema=schema)
+
+        target = self._parquet_path(path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, target)
+        self.conversions += 1
+        return pq.read_table(target, memory_map=True)
+
+    def _load(self, path: str, signature: Tuple[int, int]):
+        import pyarrow.parquet as pq
+        target = self._parquet_path(path)
+        if os.path.exists(target):
+            try:
+                metadata = pq.read_schema(target).metadata or {}
+            except Exception:
+                metadata = {}  # unreadable/partial cache file: rebuild it
+            if all(metadata.get(k) == v for k, v in self._metadata(signature).items()):
+                return pq.read_table(target, memory_map=True)
+        return self._convert(path, signature)
+
+    def table(self, path: str, columns: Optional[Sequence[str]] = None):
+        """The source as a pyarrow Table, optionally projected to `columns`."""
+        unknown = [c for c in columns or () if c not in SCHEMA]
+        if unknown:
+            raise ValueError(f"Unknown company column(s): {', '.join(unknown)}")
+        signature = self._signature(path)
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                table = cached[1]
+            else:
+                table = self._load(path, signature)
+                self._tables[path] = (signature, table)
+        return table.select(list(columns)) if columns else table
+
+    def records(self, path: str, columns: Optional[Sequence[str]] = None,
+                limit: Optional[int] = None) -> List[Dict]:
+        """Rows as dicts (only fields that are set), optionally the first `limit`."""
+        table = self.table(path, columns)
+        if limit is not None:
+            table = table.slice(0, limit)
+        # Columns the source never sets are dropped up front instead of per row
+        present = [name for name in table.column_names
+                   if table.column(name).null_count < table.num_rows]
+        table = table.select(present)
+        rows = table.to_pylist()
+        if any(table.column(name).null_count for name in present):
+            rows = [{k: v for k, v in row.items() if v is not None} for row in rows]
+        if EXTRA_COLUMN in present:
+            # Fields outside SCHEMA come back after the typed ones, as in the source
+            for row in rows:
+                extra = row.pop(EXTRA_COLUMN, None)
+                if extra:
+                    row.update(json.loads(extra))
+        return rows
+
+    def frame(self, path: str, columns: Optional[Sequence[str]] = None) -> 'pd.DataFrame':
+        """The source as a DataFrame; fields outside SCHEMA become columns of their own."""
+        import pandas as pd
+        frame = self.table(path, columns).to_pandas()
+        if EXTRA_COLUMN not in frame:
+            return frame
+        extra = pd.DataFrame([json.loads(value) if isinstance(value, str) else {}
+                              for value in frame[EXTRA_COLUMN]],
+                             index=frame.index)
+        return frame.drop(columns=EXTRA_COLUMN).join(extra)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop in-process tables (all, or one source); the Parquet files stay."""
+        with self._lock:
+            if path is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(path, None)
+
+    def stats(self) -> Dict:
+        return {
+            'sources': len(self._tables),
+            'hits': self.hits,
+            'conversions': self.conversions,
+            'invalid_rows': {path: len(errors) for path, errors in self.invalid_rows.items()},
+        }
+
+_company_store = None
+_company_store_lock = threading.Lock()
+
+def get_company_store() -> CompanyStore:
+    """Process-wide company store shared by every DataLoader."""
+    global _company_store
+    with _company_store_lock:
+        if _company_store is None:
+            _company_store = CompanyStore()
+        return _company_store
@@ -1,25 +1,58 @@
 import json
-import pandas as pd
-from typing import List, Dict, Optional
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+from utils.company_store import get_company_store
+from utils.ingest import iter_company_chunks
+from utils.export_sink import ExportSink
 
 class DataLoader:
     def __init__(self):
         self.companies_json_path = 'data/companies.json'
         self.companies_csv_path = 'data/companies.csv' 
+        self.company_dataset_path = 'data/company_dataset.txt'
         self.sector_weights_path = 'data/sector_weights.json'
+        # Validated, Parquet-backed tables shared by every DataLoader in the process
+        self.store = get_company_store()
     
-    def load_companies_json(self) -> List[Dict]:
-        """Load companies from JSON file."""
+    def source_path(self, source: str = 'companies') -> str:
+        """File behind a named company source: companies, dataset or csv."""
+        paths = {'companies': self.companies_json_path,
+                 'dataset': self.company_dataset_path,
+                 'csv': self.companies_csv_path}
+        if source not in paths:
+            raise ValueError(f"Unknown company source '{source}'. Available: {', '.join(paths)}")
+        return paths[source]
+    
+    def load_companies(self, source: str = 'companies', columns: Optional[Sequence[str]] = None,
+                       limit: Optional[int] = None) -> List[Dict]:
+        """Validated company records from a source, optionally projected/limited."""
         try:
-            with open(self.companies_json_path, 'r') as f:
-                return json.load(f)
+            return self.store.records(self.source_path(source), columns, limit)
         except FileNotFoundError:
             return []
     
-    def load_companies_csv(self) -> pd.DataFrame:
+    def load_companies_table(self, source: str = 'companies',
+                             columns: Optional[Sequence[str]] = None):
+        """A source as a columnar pyarrow Table (None if the file is missing)."""
+        try:
+            return self.store.table(self.source_path(source), columns)
+        except FileNotFoundError:
+            return None
+    
+    def iter_company_chunks(self, path: str, chunk_size: int = 1000,
+                            limit: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Stream validated companies from a (possibly huge) JSON array / JSON-lines file."""
+        return iter_company_chunks(path, chunk_size, limit)
+    
+    def load_companies_json(self) -> List[Dict]:
+        """Load companies from JSON file."""
+        return self.load_companies('companies')
+    
+    def load_companies_csv(self) -> 'pd.DataFrame':
         """Load companies from CSV file with additional metadata."""
+        import pandas as pd
         try:
-            return pd.read_csv(self.companies_csv_path)
+            return self.store.frame(self.companies_csv_path)
         except FileNotFoundError:
             return pd.DataFrame()
     
@@ -31,14 +64,22 @@ class DataLoader:
         except FileNotFoundError:
             return {"sector_weights": {}, "growth_multipliers": {}}
     
-    def get_top_companies(self, limit: int = 20) -> List[Dict]:
+    def get_top_companies(self, limit: int = 20, source: str = 'companies') -> List[Dict]:
         """Get top N companies for analysis."""
-        companies = self.load_companies_json()
-        return companies[:limit]
-    
-    def export_results(self, results: List[Dict], filename: str = 'analysis_results.csv'):
-        """Export analysis results to CSV."""
-        df = pd.DataFrame(results)
-        output_path = f'data/output/{filename}'
-        df.to_csv(output_path, index=False)
-        return output_path
\ No newline at end of file
+        return self.load_companies(source, limit=limit)
+    
+    def export_sink(self, name: str, fmt: str = 'csv', partition_by: Optional[str] = None,
+                    replace: bool = False) -> ExportSink:
+        """Incremental exporter for results that are still streaming in."""
+        return ExportSink(name, fmt, partition_by, replace=replace)
+    
+    def export_results(self, results: List[Dict], filename: str = 'analysis_results.csv',
+                       partition_by: Optional[str] = None):
+        """Export analysis results; the format follows the extension (.csv, .jsonl, .parquet)."""
+        name, ext = os.path.splitext(filename)
+        # Everything is already in memory: write it as one batch
+        sink = ExportSink(name, ext.lstrip('.') or 'csv', partition_by,
+                          batch_size=max(1, len(results)), replace=True)
+        with sink:
+            sink.write_many(results)
+        return sink.location
\ No newline at end of file
@@ -0,0 +1,238 @@
+import csv
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+from utils.results import json_default
+from config.settings import (
+    EXPORT_DIR, EXPORT_BATCH_SIZE, EXPORT_FLUSH_SECONDS, EXPORT_PARQUET_COMPRESSION
+)
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+PARTITIONS = (None, 'date', 'sector')
+
+# Column order for CSV headers and the Parquet schema. Scores are float64 so a
+# fractional or missing score survives as it is rather than being truncated.
+EXPORT_COLUMNS = {
+    'company_name': 'string',
+    'sector': 'string',
+    'operating_margin': 'float64',
+    'growth_forecast': 'float64',
+    'moat_score': 'float64',
+    'margin_score': 'float64',
+    'final_score': 'float64',
+    'report_summary': 'string',
+    'error': 'string',
+    'timestamp': 'float64',
+}
+# Parquet column holding every other key of a result (e.g. report) as a JSON object;
+# CSV gives such keys columns of their own and JSON lines keeps them as they are
+EXTRA_COLUMN = 'extra_json'
+
+def _parquet_schema():
+    import pyarrow as pa
+    types = {'string': pa.string(), 'float64': pa.float64(), 'int64': pa.int64()}
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS.items()]
+                     + [(EXTRA_COLUMN, pa.string())])
+
+def _parquet_extra(row: Dict) -> Optional[str]:
+    extra = {key: value for key, value in row.items() if key not in EXPORT_COLUMNS}
+    return json.dumps(extra, default=json_default) if extra else None
+
+def _parquet_value(value, kind: str):
+    if value is None:
+        return None
+    try:
+        if kind == 'float64':
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+class ExportSink:
+    """Incremental, crash-tolerant export of analysis results.
+
+    Results are buffered and written every `batch_size` results (or
+    `flush_seconds`) while a run is in progress. CSV and JSON lines append
+    to `<file>.partial`, which is renamed over the final file on close();
+    if the run dies, everything flushed so far is still in the .partial
+    file. Parquet writes each batch as its own zstd-compressed part file
+    (temp file + rename). With partition_by='date' or 'sector', output is
+    laid out Hive-style as <name>/<key>=<value>/...
+
+    Directory outputs (Parquet or partitioned) with replace=True are staged
+    in a hidden directory and swapped in on close(), so a re-export never
+    mixes with the parts or partitions of an earlier one.
+    """
+
+    def __init__(self, name: str, fmt: str = 'csv', partition_by: Optional[str] = None,
+                 directory: str = EXPORT_DIR, batch_size: int = EXPORT_BATCH_SIZE,
+                 flush_seconds: float = EXPORT_FLUSH_SECONDS,
+                 compression: str = EXPORT_PARQUET_COMPRESSION, replace: bool = False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'. Available: {', '.join(FORMATS)}")
+        if partition_by not in PARTITIONS:
+            raise ValueError(f"Unknown partitioning '{partition_by}'. Available: date, sector")
+        self.name = name
+        self.fmt = fmt
+        self.partition_by = partition_by
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.compression = compression
+        self.replace = replace
+        self.run_date = datetime.date.today().isoformat()
+        self._token = uuid.uuid4().hex[:8]
+        self._dataset_root = (os.path.join(directory, f'.{name}.{self._token}.staging')
+                              if replace else os.path.join(directory, name))
+        self.rows_written = 0
+        self._buffer = []
+        self._files = {}  # partition dir -> open .partial file (csv/jsonl)
+        self._writers = {}  # partition dir -> (csv.writer, header fields)
+        self._parts = {}  # partition dir -> next Parquet part number
+        self._paths = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def _partition_dir(self, result: Dict) -> str:
+        if self.partition_by is None:
+            return self.directory if self.fmt != 'parquet' else self._dataset_root
+        if self.partition_by == 'date':
+            segment = f'run_date={self.run_date}'
+        else:
+            segment = f"sector={quote(str(result.get('sector') or 'Unknown'), safe='')}"
+        return os.path.join(self._dataset_root, segment)
+
+    def _target(self, partition: str) -> str:
+        if self.partition_by is None:
+            return os.path.join(partition, f'{self.name}.{self.fmt}')
+        return os.path.join(partition, f'data.{self.fmt}')
+
+    def write(self, result: Dict):
+        """Buffer one result; flushes when the batch is full or stale."""
+        with self._lock:
+            if self.closed:
+                raise ValueError('ExportSink is closed')
+            self._buffer.append(result)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def write_many(self, results: Iterable[Dict]):
+        for result in results:
+            self.write(result)
+
+    def flush(self):
+        """Write buffered results to disk (durably for CSV/JSON lines)."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not batch:
+                return
+            groups = {}
+            for result in batch:
+                groups.setdefault(self._partition_dir(result), []).append(result)
+            for partition, rows in groups.items():
+                os.makedirs(partition, exist_ok=True)
+                if self.fmt == 'parquet':
+                    self._write_parquet_part(partition, rows)
+                else:
+                    self._append_rows(partition, rows)
+            self.rows_written += len(batch)
+
+    def _append_rows(self, partition: str, rows: List[Dict]):
+        f = self._files.get(partition)
+        if f is None:
+            f = self._files[partition] = open(f'{self._target(partition)}.partial', 'w', newline='')
+            if self.fmt == 'csv':
+                # Extra keys (first batch wins) follow the fixed columns
+                fields = list(EXPORT_COLUMNS) + [k for k in rows[0] if k not in EXPORT_COLUMNS]
+                writer = csv.writer(f)
+                writer.writerow(fields)
+                self._writers[partition] = (writer, fields)
+        if self.fmt == 'csv':
+            writer, fields = self._writers[partition]
+            writer.writerows([row.get(k) for k in fields] for row in rows)
+        else:
+            f.writelines(json.dumps(row, default=json_default) + '\n' for row in rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _write_parquet_part(self, partition: str, rows: List[Dict]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = {name: [_parquet_value(row.get(name), kind) for row in rows]
+                   for name, kind in EXPORT_COLUMNS.items()}
+        columns[EXTRA_COLUMN] = [_parquet_extra(row) for row in rows]
+        table = pa.Table.from_pydict(columns, schema=_parquet_schema())
+        if self.partition_by == 'sector':
+            # Hive partitioning supplies the sector from the directory name
+            table = table.drop_columns(['sector'])
+        number = self._parts.get(partition, 0)
+        self._parts[partition] = number + 1
+        path = os.path.join(partition, f'part-{self._token}-{number:05d}.parquet')
+        tmp_path = f'{path}.tmp'
+        pq.write_table(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+        self._paths.append(path)
+
+    def close(self) -> List[str]:
+        """Flush, then atomically publish CSV/JSON-lines files; returns the written paths."""
+        if self.closed:
+            return self._paths
+        self.flush()
+        with self._lock:
+            self.closed = True
+            for partition, f in self._files.items():
+                f.close()
+                target = self._target(partition)
+                os.replace(f'{target}.partial', target)
+                self._paths.append(target)
+            self._files.clear()
+            if self.replace and self._is_dataset:
+                self._publish_dataset()
+            return list(self._paths)
+
+    @property
+    def _is_dataset(self) -> bool:
+        return self.partition_by is not None or self.fmt == 'parquet'
+
+    def _publish_dataset(self):
+        """Swap the staged dataset directory in place of the previous export."""
+        final = os.path.join(self.directory, self.name)
+        os.makedirs(self._dataset_root, exist_ok=True)  # an empty export still replaces the old one
+        old = os.path.join(self.directory, f'.{self.name}.{self._token}.old')
+        if os.path.exists(final):
+            os.replace(final, old)
+        os.replace(self._dataset_root, final)
+        shutil.rmtree(old, ignore_errors=True)
+        self._paths = [path.replace(self._dataset_root, final, 1) for path in self._paths]
+
+    @property
+    def location(self) -> str:
+        """The file (unpartitioned CSV/JSON lines) or dataset directory being written."""
+        if not self._is_dataset:
+            return os.path.join(self.directory, f'{self.name}.{self.fmt}')
+        return os.path.join(self.directory, self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep what was flushed in the .partial files; don't publish a truncated export
+            self.flush()
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+            self.closed = True
+        return False
@@ -0,0 +1,117 @@
+import json
+from typing import Dict, Iterator, List, Optional
+from utils.company_store import CompanySchemaError, validate_company
+
+READ_BLOCK_BYTES = 1 << 20
+# Largest array element buffered while waiting for it to decode; past this the input is
+# treated as corrupt instead of reading on to EOF
+MAX_RECORD_BYTES = 16 << 20
+_NUMBER_CHARS = '0123456789.eE+-'
+
+def _number_may_continue(item, buffer: str, end: int) -> bool:
+    """True if a decoded number is only followed by characters that could extend it."""
+    return isinstance(item, (int, float)) and not isinstance(item, bool) \
+        and not buffer[end:].strip(_NUMBER_CHARS)
+
+def _iter_json_array(f, block_bytes: int, max_record_bytes: int = MAX_RECORD_BYTES) -> Iterator:
+    """Decode a top-level JSON array one element at a time from a text stream."""
+    decoder = json.JSONDecoder()
+    index = 0
+    buffer, pos, eof = '', 0, False
+    started = False
+
+    def more() -> bool:
+        nonlocal buffer, pos, eof
+        block = f.read(block_bytes)
+        if not block:
+            eof = True
+            return False
+        buffer = buffer[pos:] + block  # drop what has been consumed already
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,' + ('' if started else '['):
+            if buffer[pos] == '[':
+                started = True
+            pos += 1
+        if pos >= len(buffer):
+            if not more():
+                return
+            continue
+        if buffer[pos] == ']':
+            return
+        if not started:
+            raise ValueError('Expected a JSON array')
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if len(buffer) - pos > max_record_bytes:
+                raise ValueError(f'Array element {index} is not valid JSON within '
+                                 f'{max_record_bytes} bytes: {e.msg}') from e
+            if eof or not more():
+                raise
+            continue
+        if not eof and (end == len(buffer) or _number_may_continue(item, buffer, end)) \
+                and len(buffer) - pos <= max_record_bytes:
+            # A scalar cut at the block boundary can decode early ('12' of '1234', '-0' of
+            # '-0.5'); make sure it is complete
+            if more():
+                continue
+        pos = end
+        index += 1
+        yield item
+
+def iter_records(path: str, block_bytes: int = READ_BLOCK_BYTES,
+                 max_record_bytes: int = MAX_RECORD_BYTES) -> Iterator:
+    """Raw records from a JSON array or JSON-lines file without loading it whole.
+
+    A record that is still undecodable after max_record_bytes raises ValueError.
+    """
+    with open(path, 'r') as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if not head:
+            return
+        if head == '[':
+            f.seek(0)
+            yield from _iter_json_array(f, block_bytes, max_record_bytes)
+            return
+        f.seek(0)
+        for number, line in enumerate(iter(lambda: f.readline(max_record_bytes + 1), ''), 1):
+            if len(line) > max_record_bytes and not line.endswith('\n'):
+                raise ValueError(f'Line {number} is longer than {max_record_bytes} bytes')
+            if line.strip():
+                yield json.loads(line)
+
+def iter_company_chunks(path: str, chunk_size: int = 1000,
+                        limit: Optional[int] = None) -> Iterator[List[Dict]]:
+    """Validated companies from a JSON array / JSON-lines file in lists of chunk_size.
+
+    Memory is bounded by one read block plus one chunk, whatever the file
+    size. Rows that can't be coerced are skipped and rows with implausible
+    values are kept with data_flags (both counted in a warning at the end).
+    """
+    chunk, seen, invalid, flagged, first_error = [], 0, 0, 0, None
+    for index, record in enumerate(iter_records(path)):
+        if limit is not None and seen >= limit:
+            break
+        try:
+            row = validate_company(record)
+        except CompanySchemaError as e:
+            invalid += 1
+            first_error = first_error or f'row {index}: {e}'
+            continue
+        flagged += row['data_flags'] is not None
+        chunk.append({k: v for k, v in row.items() if v is not None})
+        seen += 1
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+    if invalid:
+        print(f"⚠️  {path}: skipped {invalid} invalid row(s); first: {first_error}")
+    if flagged:
+        print(f"⚠️  {path}: kept {flagged} row(s) with implausible values (see data_flags)")
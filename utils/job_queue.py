@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from utils.run_store import RunStore
+from config.settings import (CACHE_DIR, JOB_HEARTBEAT_SECONDS, JOB_LEASE_SECONDS, JOB_POLL_SECONDS,
+                             RESULT_REUSE_MAX_AGE)
+
+# Higher runs first; interactive (dashboard) requests jump ahead of nightly batches
+PRIORITY_BATCH = 0
+PRIORITY_INTERACTIVE = 10
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINAL_STATUSES = ('completed', 'partial', 'failed', 'cancelled')
+
+_JOB_COLUMNS = ('job_id', 'label', 'priority', 'status', 'total', 'processed', 'reused', 'errors',
+                'attempts', 'worker', 'error', 'created_at', 'started_at', 'heartbeat_at',
+                'finished_at')
+
+def _digest(companies: List[Dict]) -> str:
+    payload = json.dumps(sorted(companies, key=lambda c: c.get('company_name', '')),
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class JobQueue:
+    """SQLite-backed priority queue of analysis jobs shared by every process.
+
+    Clients (the CLI, dashboard sessions) submit a company list with a
+    priority; long-lived JobWorker processes claim the highest-priority,
+    oldest queued job and heartbeat while they run it. A job whose worker
+    stops heartbeating for `lease_seconds` is requeued, and its run resumes
+    from the results already checkpointed. Submitting a company list that is
+    already queued or running returns that job (raising its priority) rather
+    than analyzing the same companies twice. Results live in the RunStore
+    under the job id.
+    """
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.path = path or os.path.join(CACHE_DIR, 'jobs.sqlite')
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; transactions are managed explicitly (BEGIN IMMEDIATE)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    label TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    companies TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    reused INTEGER NOT NULL DEFAULT 0,
+                    errors INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL
+                )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_pending '
+                         'ON jobs(status, priority DESC, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_digest ON jobs(digest, status)')
+            self._local.conn = conn
+        return conn
+
+    def submit(self, companies: List[Dict], priority: int = PRIORITY_BATCH, label: str = '',
+               dedupe: bool = True) -> str:
+        """Queue an analysis of `companies`; returns the job id."""
+        digest = _digest(companies)
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe:
+                row = conn.execute(
+                    f"SELECT job_id FROM jobs WHERE digest = ? AND status IN {ACTIVE_STATUSES} "
+                    'ORDER BY created_at LIMIT 1', (digest,)).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE jobs SET priority = MAX(priority, ?) WHERE job_id = ?',
+                                 (priority, row[0]))
+                    conn.execute('COMMIT')
+                    return row[0]
+            job_id = RunStore.new_run_id()
+            conn.execute(
+                'INSERT INTO jobs (job_id, label, priority, status, digest, companies, total, created_at) '
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, label, priority, digest, json.dumps(companies), len(companies), time.time()))
+            conn.execute('COMMIT')
+            return job_id
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Lease the next job to `worker` (requeueing expired leases first), or None."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("UPDATE jobs SET status = 'queued', worker = NULL "
+                         "WHERE status = 'running' AND heartbeat_at < ?", (now - self.lease_seconds,))
+            row = conn.execute("SELECT job_id FROM jobs WHERE status = 'queued' "
+                               'ORDER BY priority DESC, created_at LIMIT 1').fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                         'started_at = COALESCE(started_at, ?), heartbeat_at = ? WHERE job_id = ?',
+                         (worker, now, now, row[0]))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self.status(row[0], with_companies=True)
+
+    def heartbeat(self, job_id: str, worker: str, processed: int, reused: int, errors: int) -> str:
+        """Record progress and extend `worker`'s lease; returns the job's status.
+
+        'cancelled' (or another final status) means stop; 'lost' means the
+        lease expired and the job was requeued or claimed by another worker,
+        so this worker must stop without touching the job again.
+        """
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE jobs SET processed = ?, reused = ?, errors = ?, heartbeat_at = ? "
+            "WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (processed, reused, errors, time.time(), job_id, worker))
+        if cursor.rowcount:
+            return 'running'
+        row = conn.execute('SELECT status FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return 'cancelled'
+        return row[0] if row[0] in FINAL_STATUSES else 'lost'
+
+    def finish(self, job_id: str, worker: str, status: str, error: Optional[str] = None) -> bool:
+        """Close a job `worker` still holds; False if its lease was lost or the job cancelled."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+            "WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (status, error, time.time(), job_id, worker))
+        return cursor.rowcount > 0
+
+    def release(self, job_id: str, worker: str) -> bool:
+        """Put a job `worker` is running back in the queue (e.g. the worker is shutting down)."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL "
+            "WHERE job_id = ? AND worker = ? AND status = 'running'", (job_id, worker))
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; a running one stops at its next heartbeat."""
+        cursor = self._connect().execute(
+            f"UPDATE jobs SET status = 'cancelled', finished_at = ? "
+            f"WHERE job_id = ? AND status IN {ACTIVE_STATUSES}", (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def status(self, job_id: str, with_companies: bool = False) -> Optional[Dict]:
+        columns = _JOB_COLUMNS + (('companies',) if with_companies else ())
+        row = self._connect().execute(
+            f"SELECT {', '.join(columns)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+        if with_companies:
+            job['companies'] = json.loads(job['companies'])
+        return job
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        sql = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs"
+        params = []
+        if status:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        rows = self._connect().execute(sql + ' ORDER BY created_at DESC LIMIT ?',
+                                       params + [limit]).fetchall()
+        return [dict(zip(_JOB_COLUMNS, row)) for row in rows]
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def results(self, job_id: str) -> Dict[str, Dict]:
+        """Latest result per company written so far for a job, keyed by company_name."""
+        store = RunStore()
+        try:
+            return store.load_results(job_id)
+        finally:
+            store.close()
+
+class _Lease(threading.Thread):
+    """Heartbeats a claimed job on a timer, however long a single company takes.
+
+    The worker loop publishes its progress in `progress` and checks
+    `status` after each result; anything but 'running' means stop.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, worker: str, interval: float):
+        super().__init__(name=f'lease-{job_id}', daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self.progress = (0, 0, 0)  # processed, reused, errors
+        self.status = 'running'
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval) and self.beat() == 'running':
+                pass
+        finally:
+            self.queue.close()
+
+    def beat(self) -> str:
+        self.status = self.queue.heartbeat(self.job_id, self.worker, *self.progress)
+        return self.status
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class JobWorker:
+    """Long-lived worker that claims jobs from a JobQueue and runs them through AnalysisEngine.
+
+    Companies whose inputs match a result stored by any earlier run are
+    reused instead of analyzed, so a full-universe nightly job and the
+    interactive jobs after it don't pay for the same LLM calls twice.
+    """
+
+    def __init__(self, engine=None, queue: Optional[JobQueue] = None, concurrency: int = 1,
+                 poll_seconds: float = JOB_POLL_SECONDS, max_age: float = RESULT_REUSE_MAX_AGE,
+                 heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS):
+        if engine is None:
+            from utils.analysis_engine import AnalysisEngine
+            engine = AnalysisEngine(index_results=False)
+        self.engine = engine
+        self.queue = queue or JobQueue()
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.max_age = max_age
+        self.heartbeat_seconds = heartbeat_seconds
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.jobs_run = 0
+
+    def run(self, drain: bool = False):
+        """Process jobs until interrupted (or, with drain=True, until the queue is empty)."""
+        print(f"👷 Job worker {self.worker_id} waiting for jobs (Ctrl+C to stop)")
+        while True:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if drain:
+                    return
+                time.sleep(self.poll_seconds)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Dict) -> str:
+        """Run one claimed job to completion; returns its final status."""
+        job_id, companies = job['job_id'], job['companies']
+        print(f"▶️  Job {job_id} ({job['label'] or 'unlabelled'}, priority {job['priority']}): "
+              f"{len(companies)} companies")
+        store = RunStore()
+        try:
+            store.start_run(companies, job_id)
+            # A requeued job keeps what it already finished; reuse matching results for the rest
+            done = store.completed(job_id)
+            reused = store.reusable_results(
+                [c for c in companies if c['company_name'] not in done], self.max_age)
+            for result in reused.values():
+                store.append(job_id, result)
+        finally:
+            store.close()
+
+        processed = errors = 0
+        lease = _Lease(self.queue, job_id, self.worker_id, self.heartbeat_seconds)
+        lease.progress = (0, len(reused), 0)
+        lease.start()
+        stream = self.engine.iter_checkpointed(companies, job_id, self.concurrency,
+                                               label=f"job:{job['label'] or 'unlabelled'}")
+        try:
+            for result in stream:
+                processed += 1
+                errors += 'error' in result
+                lease.progress = (processed, len(reused), errors)
+                if lease.status != 'running':
+                    break
+            lease.stop()
+            # Final progress; also catches a cancel or lost lease since the last beat
+            status = lease.beat()
+            if status not in ('running', 'cancelled'):
+                status = 'lost'
+            elif status == 'running':
+                status = 'partial' if errors else 'completed'
+                if not self.queue.finish(job_id, self.worker_id, status):
+                    status = 'lost'
+        except KeyboardInterrupt:
+            lease.stop()
+            self.queue.release(job_id, self.worker_id)
+            print(f"\n⏸️  Job {job_id} returned to the queue after {processed} companies")
+            raise
+        except Exception as e:
+            lease.stop()
+            status = 'failed'
+            if self.queue.finish(job_id, self.worker_id, status, str(e)):
+                print(f"❌ Job {job_id} failed: {e}")
+            else:
+                status = 'lost'
+        finally:
+            stream.close()
+        if status == 'cancelled':
+            print(f"⏹️  Job {job_id} cancelled after {processed} companies")
+            return status
+        if status == 'lost':
+            print(f"⚠️  Job {job_id} lease expired after {processed} companies; "
+                  f"left to the worker that reclaimed it")
+            return status
+        self.jobs_run += 1
+        print(f"✅ Job {job_id} {status}: {processed} companies "
+              f"({len(reused)} reused, {errors} errors)")
+        return status
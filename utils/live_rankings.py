@@ -0,0 +1,64 @@
+import heapq
+import itertools
+from typing import Dict, List
+from utils.results import as_record
+
+class LiveRankings:
+    """Live top-K, per-sector leaders and running sector stats for streamed results.
+
+    Each add() is O(log K): the top-K lives in a bounded min-heap and sector
+    stats are running sums, so dashboards and the CLI can re-render after
+    every company without re-sorting the whole result list.
+    """
+
+    def __init__(self, k: int = 20):
+        self.k = k
+        self._heap = []  # (score, -arrival, result); the root is the current K-th place
+        self._arrival = itertools.count()
+        self.sector_stats = {}
+        self.processed = 0
+        self.errors = 0
+
+    def add(self, result: Dict) -> bool:
+        """Fold one result in; returns True if it entered the top K."""
+        self.processed += 1
+        if 'error' in result:
+            self.errors += 1
+            return False
+
+        score = result.get('final_score', 0)
+        sector = result.get('sector', 'Unknown')
+        stats = self.sector_stats.get(sector)
+        if stats is None:
+            stats = self.sector_stats[sector] = {
+                'count': 0, 'total_score': 0.0, 'avg_score': 0.0,
+                'top_score': 0, 'leader': None
+            }
+        stats['count'] += 1
+        stats['total_score'] += score
+        stats['avg_score'] = stats['total_score'] / stats['count']
+        if stats['leader'] is None or score > stats['top_score']:
+            stats['top_score'] = score
+            stats['leader'] = result.get('company_name')
+
+        # Ties keep the earlier arrival, matching the stable sort in get_top_rankings
+        entry = (score, -next(self._arrival))
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, (*entry, as_record(result)))
+            return True
+        if entry > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, (*entry, as_record(result)))
+            return True
+        return False
+
+    def cutoff(self) -> float:
+        """Score needed to enter the top K (0 until K results are in)."""
+        return self._heap[0][0] if len(self._heap) >= self.k else 0
+
+    def top(self, limit: int = None) -> List[Dict]:
+        """Current top-K results, best first."""
+        ranked = sorted(self._heap, key=lambda entry: (entry[0], entry[1]), reverse=True)
+        return [entry[2] for entry in ranked[:limit]]
+
+    def sector_leaders(self) -> Dict[str, str]:
+        return {sector: stats['leader'] for sector, stats in self.sector_stats.items()}
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from config.settings import (
+    CACHE_DIR, MOAT_CACHE_ENABLED, MOAT_CACHE_TTL, MOAT_CACHE_MAX_ENTRIES
+)
+
+class MoatCache:
+    """Persistent moat-score cache keyed on the rendered prompt and model settings.
+
+    Backed by SQLite in WAL mode so several processes (CLI runs, Streamlit
+    sessions) can share one cache file safely. Eviction runs every
+    EVICT_EVERY inserts (so the table may briefly exceed max_entries by up
+    to that many rows), and hits only rewrite accessed_at once it is more
+    than ACCESS_RESOLUTION seconds old, so most reads stay read-only.
+    """
+
+    EVICT_EVERY = 256
+    ACCESS_RESOLUTION = 60.0
+
+    def __init__(self, path: Optional[str] = None, ttl: int = MOAT_CACHE_TTL,
+                 max_entries: int = MOAT_CACHE_MAX_ENTRIES,
+                 enabled: bool = MOAT_CACHE_ENABLED):
+        self.path = path or os.path.join(CACHE_DIR, 'moat_cache.sqlite')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt_text: str, model: str, temperature: float) -> str:
+        """Content-address a moat request."""
+        payload = json.dumps([prompt_text, model, temperature])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS moat_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_moat_cache_accessed '
+                         'ON moat_cache(accessed_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_moat_cache_created '
+                         'ON moat_cache(created_at)')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached moat result for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute('SELECT value, created_at, accessed_at FROM moat_cache WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None or (self.ttl > 0 and now - row[1] > self.ttl):
+            self._count(False)
+            return None
+        if now - row[2] > self.ACCESS_RESOLUTION:
+            # LRU order only needs minute resolution; skip the write for recent hits
+            with conn:
+                conn.execute('UPDATE moat_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        self._count(True)
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict):
+        """Store a moat result and apply TTL/size eviction."""
+        if not self.enabled:
+            return
+        conn = self._connect()
+        now = time.time()
+        with self._lock:
+            self._inserts += 1
+            due = self._inserts % self.EVICT_EVERY == 0
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO moat_cache VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value), now, now))
+            if due:
+                self.evict(conn, now)
+
+    def evict(self, conn: Optional[sqlite3.Connection] = None, now: Optional[float] = None) -> int:
+        """Drop expired entries, then least recently used ones beyond max_entries."""
+        conn = conn or self._connect()
+        now = now or time.time()
+        removed = 0
+        with conn:
+            if self.ttl > 0:
+                removed += conn.execute('DELETE FROM moat_cache WHERE created_at < ?',
+                                        (now - self.ttl,)).rowcount
+            if self.max_entries > 0:
+                excess = conn.execute('SELECT COUNT(*) FROM moat_cache').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    # Walks the accessed_at index from the oldest end
+                    removed += conn.execute("""
+                        DELETE FROM moat_cache WHERE key IN (
+                            SELECT key FROM moat_cache ORDER BY accessed_at LIMIT ?
+                        )""", (excess,)).rowcount
+        return removed
+
+    def purge(self) -> int:
+        """Delete every cached entry; returns the number removed."""
+        conn = self._connect()
+        with conn:
+            return conn.execute('DELETE FROM moat_cache').rowcount
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the current entry count."""
+        entries = 0
+        if os.path.exists(self.path):
+            entries = self._connect().execute('SELECT COUNT(*) FROM moat_cache').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'enabled': self.enabled
+        }
+
+_moat_cache = None
+_moat_cache_lock = threading.Lock()
+
+def get_moat_cache() -> MoatCache:
+    """Process-wide moat cache instance."""
+    global _moat_cache
+    with _moat_cache_lock:
+        if _moat_cache is None:
+            _moat_cache = MoatCache()
+        return _moat_cache
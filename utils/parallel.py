@@ -0,0 +1,100 @@
+import multiprocessing as mp
+import queue
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterator, List, Tuple
+from utils.results import ResultRecord
+
+_SHARD_DONE = -1
+
+def _error_result(company: Dict, message: str) -> ResultRecord:
+    return ResultRecord({
+        'company_name': company.get('company_name', 'Unknown'),
+        'error': message,
+        'final_score': 0,
+        'timestamp': time.time()
+    })
+
+def _worker_settings(workers: int) -> Dict:
+    """Parent-process settings each worker must apply: cache switch, quota share, trace session."""
+    from utils.moat_cache import get_moat_cache
+    from utils.rate_limiter import get_rate_limiter
+    from utils.tracing import get_tracer
+    limiter = get_rate_limiter()
+    return {'cache_enabled': get_moat_cache().enabled,
+            'rpm': limiter.max_rpm / workers,
+            'tpm': limiter.max_tpm / workers,
+            'trace_session': get_tracer().session}
+
+def _shard_worker(shard: List[Tuple[int, Dict]], results, concurrency: int, moat_batch_size: int,
+                  settings: Dict):
+    """Worker process: compile the workflow once, stream (index, result) pairs back."""
+    sent = set()
+    try:
+        from utils.analysis_engine import AnalysisEngine
+        from utils.moat_cache import get_moat_cache
+        from utils.rate_limiter import configure_rate_limiter
+        from utils.tracing import configure_tracer
+        get_moat_cache().enabled = settings['cache_enabled']
+        configure_tracer(settings['trace_session'])
+        # Together the workers stay within the configured RPM / TPM
+        configure_rate_limiter(settings['rpm'], settings['tpm'])
+        engine = AnalysisEngine(moat_batch_size=moat_batch_size, index_results=False)
+        companies = [company for _, company in shard]
+        # Concurrent results arrive in completion order; map them back by name
+        positions = defaultdict(deque)
+        for index, company in shard:
+            positions[company.get('company_name')].append(index)
+        if concurrency > 1:
+            stream = engine.iter_batch_concurrent(companies, concurrency)
+        else:
+            stream = engine.iter_batch(companies)
+        for result in stream:
+            index = positions[result.get('company_name')].popleft()
+            sent.add(index)
+            results.put((index, result))
+    except Exception as e:
+        for index, company in shard:
+            if index not in sent:
+                results.put((index, _error_result(company, f'Worker failed: {e}')))
+    finally:
+        results.put((_SHARD_DONE, None))
+
+def iter_sharded(companies: List[Dict], workers: int, concurrency: int = 1,
+                 moat_batch_size: int = 1, start_method: str = 'spawn') -> Iterator[Tuple[int, Dict]]:
+    """Analyze companies across worker processes, yielding (input_index, result) as they finish."""
+    indexed = list(enumerate(companies))
+    # Round-robin shards keep the expensive head of a sorted universe spread out
+    shards = [indexed[i::workers] for i in range(workers) if indexed[i::workers]]
+    ctx = mp.get_context(start_method)
+    results = ctx.Queue()
+    settings = _worker_settings(max(1, len(shards)))
+    processes = [ctx.Process(target=_shard_worker, daemon=True,
+                             args=(shard, results, concurrency, moat_batch_size, settings))
+                 for shard in shards]
+    for process in processes:
+        process.start()
+
+    received = set()
+    running = len(processes)
+    try:
+        while running:
+            try:
+                index, result = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    break  # a worker died without reporting back
+                continue
+            if index == _SHARD_DONE:
+                running -= 1
+                continue
+            received.add(index)
+            yield index, result
+        for index, company in indexed:
+            if index not in received:
+                yield index, _error_result(company, 'Worker process exited unexpectedly')
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
@@ -0,0 +1,127 @@
+import itertools
+from typing import Dict, Iterable, List, Optional
+from sortedcontainers import SortedList
+from utils.results import as_record
+
+class RankingIndex:
+    """Order-statistic index of TAFGS scores, globally and per sector.
+
+    Inserts, updates, deletes, rank and top-K queries are O(log n) (top-K adds
+    O(K)); sector averages are kept as running totals. Companies are keyed by
+    company_name, and ties rank in first-insertion order, like a stable sort.
+    Failed results (with an 'error' key) are not indexed; the others are held
+    (and returned) as compact ResultRecords. Because of the company_name key
+    a re-analyzed company replaces its earlier result, and sector_stats()
+    covers indexed (successful) results only; AnalysisEngine's
+    get_top_rankings / generate_sector_analysis rank and summarize a result
+    list row by row instead.
+    """
+
+    def __init__(self):
+        self._global = SortedList()
+        self._sectors: Dict[str, SortedList] = {}
+        self._sector_members: Dict[str, Dict[str, None]] = {}
+        self._sector_totals: Dict[str, float] = {}
+        self._entries: Dict[str, tuple] = {}  # name -> (sort_key, sector, result)
+        self._arrival = itertools.count()
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict]) -> 'RankingIndex':
+        index = cls()
+        for result in results:
+            index.upsert(result)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._global)
+
+    def __contains__(self, company_name: str) -> bool:
+        return company_name in self._entries
+
+    def upsert(self, result: Dict) -> bool:
+        """Insert or update a company's result; returns False if it was not indexable."""
+        if 'error' in result:
+            return False
+        result = as_record(result)
+        name = result['company_name']
+        previous = self._entries.get(name)
+        arrival = previous[0][1] if previous else next(self._arrival)
+        if previous:
+            self.remove(name)
+        sector = result.get('sector', 'Unknown')
+        score = result.get('final_score', 0)
+        key = (-score, arrival, name)
+        self._global.add(key)
+        if sector not in self._sectors:
+            self._sectors[sector] = SortedList()
+            self._sector_members[sector] = {}
+            self._sector_totals[sector] = 0.0
+        self._sectors[sector].add(key)
+        self._sector_members[sector][name] = None
+        self._sector_totals[sector] += score
+        self._entries[name] = (key, sector, result)
+        return True
+
+    def remove(self, company_name: str) -> Optional[Dict]:
+        """Delete a company; returns its result if it was indexed."""
+        entry = self._entries.pop(company_name, None)
+        if entry is None:
+            return None
+        key, sector, result = entry
+        self._global.remove(key)
+        self._sectors[sector].remove(key)
+        del self._sector_members[sector][company_name]
+        self._sector_totals[sector] += key[0]
+        if not self._sectors[sector]:
+            del self._sectors[sector], self._sector_members[sector], self._sector_totals[sector]
+        return result
+
+    def _ranked(self, sector: Optional[str]) -> SortedList:
+        if sector is None:
+            return self._global
+        return self._sectors.get(sector, SortedList())
+
+    def top(self, limit: int = 20, sector: Optional[str] = None) -> List[Dict]:
+        """Best `limit` results, globally or within one sector."""
+        return [self._entries[key[2]][2] for key in self._ranked(sector).islice(0, limit)]
+
+    def rank(self, company_name: str, sector: Optional[str] = None) -> Optional[int]:
+        """1-based rank of a company, globally or within its sector."""
+        entry = self._entries.get(company_name)
+        if entry is None or (sector is not None and entry[1] != sector):
+            return None
+        return self._ranked(sector).index(entry[0]) + 1
+
+    def percentile(self, company_name: str, sector: Optional[str] = None) -> Optional[float]:
+        """Share of companies (in %) ranked at or below this one; the leader is 100."""
+        rank = self.rank(company_name, sector)
+        if rank is None:
+            return None
+        ranked = self._ranked(sector)
+        return 100.0 * (len(ranked) - rank + 1) / len(ranked)
+
+    def score_at_percentile(self, pct: float, sector: Optional[str] = None) -> Optional[float]:
+        """Lowest score among the companies whose percentile() is at least pct."""
+        ranked = self._ranked(sector)
+        if not ranked:
+            return None
+        position = min(len(ranked) - 1, max(0, int(len(ranked) * (100.0 - pct) / 100.0)))
+        return -ranked[position][0]
+
+    def sectors(self) -> List[str]:
+        return list(self._sectors)
+
+    def sector_stats(self) -> Dict[str, Dict]:
+        """Per-sector summary in the shape returned by generate_sector_analysis."""
+        stats = {}
+        for sector, ranked in self._sectors.items():
+            count = len(ranked)
+            best = ranked[0]
+            stats[sector] = {
+                'companies': list(self._sector_members[sector]),
+                'avg_score': self._sector_totals[sector] / count,
+                'count': count,
+                'top_score': max(0, -best[0]),
+                'best_company': best[2]
+            }
+        return stats
@@ -0,0 +1,216 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, TypeVar
+from utils.tracing import record
+from config.settings import (
+    LLM_RPM, LLM_TPM, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+)
+
+T = TypeVar('T')
+
+def _is_rate_limit_type(error: Exception) -> bool:
+    try:
+        from langchain_core.exceptions import ModelRateLimitError
+    except ImportError:  # older langchain-core
+        return False
+    return isinstance(error, ModelRateLimitError)
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for quota / HTTP 429 errors from the LLM client, or errors wrapping one.
+
+    Decided by the provider's rate-limit error type or the HTTP / gRPC
+    status on the error (or its response), never by the message text, so a
+    message that merely contains "429" doesn't trigger a backoff.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if _is_rate_limit_type(error):
+            return True
+        for source in (error, getattr(error, 'response', None)):
+            for attr in ('status_code', 'code', 'status'):
+                if getattr(source, attr, None) in (429, 'RESOURCE_EXHAUSTED'):
+                    return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+class RateLimiter:
+    """Shared requests-per-minute and tokens-per-minute governor for LLM calls.
+
+    Two token buckets refill continuously at the current rates. Rate-limit
+    errors halve both rates (AIMD multiplicative decrease) and pause every
+    caller for a jittered exponential backoff; each success adds the
+    configured step back until the configured ceiling is reached. Safe to
+    share between threads and event loops.
+    """
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = LLM_BACKOFF_BASE,
+                 backoff_max: float = LLM_BACKOFF_MAX, decrease_factor: float = 0.5,
+                 increase_step: float = None, min_rpm: float = 1.0):
+        self.max_rpm = rpm
+        self.max_tpm = tpm
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.decrease_factor = decrease_factor
+        # Default additive step: 5% of the ceiling per successful request
+        self.increase_step = increase_step if increase_step is not None else max(1.0, rpm / 20)
+        self.min_rpm = min_rpm
+        self.rpm = rpm
+        self._request_tokens = rpm
+        self._llm_tokens = tpm
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def tpm(self) -> float:
+        # Token rate follows the request rate's AIMD adjustments proportionally
+        if self.max_rpm <= 0:
+            return self.max_tpm
+        return self.max_tpm * self.rpm / self.max_rpm
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.max_rpm > 0:
+            self._request_tokens = min(self.rpm, self._request_tokens + elapsed * self.rpm / 60)
+        if self.max_tpm > 0:
+            self._llm_tokens = min(self.tpm, self._llm_tokens + elapsed * self.tpm / 60)
+
+    def _reserve(self, tokens: int) -> float:
+        """Take capacity for one request if available; else return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            # A single request larger than a full bucket still has to go through
+            tokens = min(tokens, self.tpm) if self.max_tpm > 0 else 0
+            wait = 0.0
+            if self.max_rpm > 0 and self._request_tokens < 1:
+                wait = (1 - self._request_tokens) * 60 / self.rpm
+            if self.max_tpm > 0 and self._llm_tokens < tokens:
+                wait = max(wait, (tokens - self._llm_tokens) * 60 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.max_rpm > 0:
+                self._request_tokens -= 1
+            if self.max_tpm > 0:
+                self._llm_tokens -= tokens
+            self.requests += 1
+            return 0.0
+
+    def acquire(self, tokens: int = 1):
+        """Block the calling thread until a request of `tokens` tokens may be sent."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            self.wait_seconds += wait
+            record(rate_limit_wait_seconds=wait)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 1):
+        """Async variant of acquire; yields to the event loop while waiting."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            self.wait_seconds += wait
+            record(rate_limit_wait_seconds=wait)
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated: int, actual: int):
+        """Charge the token bucket for the difference between estimate and real usage."""
+        if self.max_tpm <= 0 or not actual:
+            return
+        with self._lock:
+            self._llm_tokens -= actual - estimated
+
+    def on_success(self):
+        """Additive increase back towards the configured request rate."""
+        with self._lock:
+            if self.max_rpm > 0:
+                self.rpm = min(self.max_rpm, self.rpm + self.increase_step)
+
+    def on_rate_limited(self, attempt: int):
+        """Multiplicative decrease plus a shared, jittered exponential pause."""
+        with self._lock:
+            self.rate_limited += 1
+            if self.max_rpm > 0:
+                self.rpm = max(self.min_rpm, self.rpm * self.decrease_factor)
+                self._request_tokens = min(self._request_tokens, self.rpm)
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+    def call(self, fn: Callable[[], T], tokens: int = 1) -> T:
+        """Run fn under the limiter, retrying rate-limit errors with backoff."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                record(retries=1)
+                self.on_rate_limited(attempt)
+                continue
+            self.on_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: int = 1) -> T:
+        """Async variant of call; fn returns a fresh awaitable per attempt."""
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                record(retries=1)
+                self.on_rate_limited(attempt)
+                continue
+            self.on_success()
+            return result
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'retries': self.retries,
+            'current_rpm': self.rpm,
+            'current_tpm': self.tpm,
+            'wait_seconds': round(self.wait_seconds, 3)
+        }
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter every LLM call goes through."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+def configure_rate_limiter(rpm: float, tpm: float) -> RateLimiter:
+    """Replace the process-wide limiter with one capped at rpm / tpm (e.g. a worker's share)."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        return _rate_limiter
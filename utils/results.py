@@ -0,0 +1,292 @@
+import math
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import Dict, Iterable, Iterator, List
+from agents.report_agent import format_report
+
+# Key order of a workflow result, then the keys added by AnalysisEngine / failures
+RESULT_FIELDS = ('company_name', 'sector', 'operating_margin', 'moat_score', 'growth_forecast',
+                 'final_score', 'report', 'margin_score', 'report_summary', 'error', 'timestamp')
+# Narratives at least this long (UTF-8 bytes) are held compressed until read
+NARRATIVE_COMPRESS_MIN = 256
+# Raw deflate with a 4 KB window: no per-narrative header, and narratives are short
+_DEFLATE_WBITS = -12
+
+class _Sentinel:
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f'<{self.name.strip("_").lower()}>'
+
+    def __reduce__(self):
+        # Pickled by reference, so identity checks survive worker processes
+        return self.name
+
+_MISSING = _Sentinel('_MISSING')  # the result has no such key
+_DERIVED = _Sentinel('_DERIVED')  # the report is the format_report template; rebuilt on read
+
+# Result key -> slot holding it
+_SLOTS = {field: field for field in RESULT_FIELDS}
+_SLOTS.update(report='_report', report_summary='_summary')
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+def _pack_text(value):
+    if type(value) is str and len(value) >= NARRATIVE_COMPRESS_MIN:
+        data = value.encode()
+        packed = zlib.compress(data, 6, _DEFLATE_WBITS)
+        if len(packed) < len(data):
+            return packed
+    return value
+
+def _unpack_text(value):
+    return zlib.decompress(value, _DEFLATE_WBITS).decode() if type(value) is bytes else value
+
+class ResultRecord(MutableMapping):
+    """One analysis result in a fraction of the memory of its dict.
+
+    Fields live in __slots__ instead of a per-result hash table, company
+    and sector strings are interned (every result of a sector shares one
+    string), long narratives are held compressed and decoded on access,
+    and a report that follows the format_report template isn't stored at
+    all. It behaves like the result dict — indexing, get, `in`, iteration
+    in the workflow's key order, ==, dict(record), item assignment and
+    deletion, pop/update/setdefault — and copy() returns a plain dict.
+    Keys outside RESULT_FIELDS are kept as extras.
+    """
+
+    __slots__ = ('company_name', 'sector', 'operating_margin', 'moat_score', 'growth_forecast',
+                 'final_score', 'margin_score', 'error', 'timestamp', '_summary', '_report',
+                 '_extra')
+
+    def __init__(self, result: Mapping):
+        get = result.get
+        self.company_name = _intern(get('company_name', _MISSING))
+        self.sector = _intern(get('sector', _MISSING))
+        self.operating_margin = get('operating_margin', _MISSING)
+        self.moat_score = get('moat_score', _MISSING)
+        self.growth_forecast = get('growth_forecast', _MISSING)
+        self.final_score = get('final_score', _MISSING)
+        self.margin_score = get('margin_score', _MISSING)
+        self.error = get('error', _MISSING)
+        self.timestamp = get('timestamp', _MISSING)
+        summary = get('report_summary', _MISSING)
+        report = get('report', _MISSING)
+        self._summary = _pack_text(summary)
+        self._report = _DERIVED if self._derivable(report, summary) else _pack_text(report)
+        self._extra = ({key: value for key, value in result.items() if key not in _SLOTS}
+                       if result.keys() - _SLOTS.keys() else None)
+
+    def _derivable(self, report, summary) -> bool:
+        return (report is not _MISSING and summary is not _MISSING
+                and self.company_name is not _MISSING and self.final_score is not _MISSING
+                and report == format_report(self.company_name, self.final_score, summary))
+
+    def __getitem__(self, key):
+        slot = _SLOTS.get(key)
+        if slot is None:
+            if self._extra is not None and key in self._extra:
+                return self._extra[key]
+            raise KeyError(key)
+        value = getattr(self, slot)
+        if value is _MISSING:
+            raise KeyError(key)
+        if value is _DERIVED:
+            return format_report(self.company_name, self.final_score, _unpack_text(self._summary))
+        return _unpack_text(value) if slot in ('_summary', '_report') else value
+
+    def _freeze_report(self, key):
+        # Changing a field the template reads keeps the report it was built with
+        if self._report is _DERIVED and key in ('company_name', 'final_score', 'report_summary'):
+            self._report = _pack_text(self['report'])
+
+    def __setitem__(self, key, value):
+        slot = _SLOTS.get(key)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        self._freeze_report(key)
+        if slot in ('_summary', '_report'):
+            value = _pack_text(value)
+        elif key in ('company_name', 'sector'):
+            value = _intern(value)
+        setattr(self, slot, value)
+
+    def __delitem__(self, key):
+        slot = _SLOTS.get(key)
+        if slot is None:
+            if self._extra is None or key not in self._extra:
+                raise KeyError(key)
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+            return
+        if getattr(self, slot) is _MISSING:
+            raise KeyError(key)
+        self._freeze_report(key)
+        setattr(self, slot, _MISSING)
+
+    def __contains__(self, key) -> bool:
+        slot = _SLOTS.get(key)
+        if slot is None:
+            return self._extra is not None and key in self._extra
+        return getattr(self, slot) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        for key in RESULT_FIELDS:
+            if getattr(self, _SLOTS[key]) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return (sum(getattr(self, slot) is not _MISSING for slot in _SLOTS.values())
+                + len(self._extra or ()))
+
+    def to_dict(self) -> Dict:
+        """The result as a plain dict (e.g. for JSON)."""
+        return {key: self[key] for key in self}
+
+    def copy(self) -> Dict:
+        """A plain-dict copy, like dict.copy() of the result it stands for."""
+        return self.to_dict()
+
+    def __repr__(self) -> str:
+        return f'ResultRecord({self.to_dict()!r})'
+
+    def __reduce__(self):
+        return _restore, tuple(getattr(self, slot) for slot in ResultRecord.__slots__)
+
+def _restore(*values) -> ResultRecord:
+    record = ResultRecord.__new__(ResultRecord)
+    for slot, value in zip(ResultRecord.__slots__, values):
+        setattr(record, slot, value)
+    return record
+
+def as_record(result: Mapping) -> ResultRecord:
+    """`result` as a ResultRecord (records are returned as they are)."""
+    return result if isinstance(result, ResultRecord) else ResultRecord(result)
+
+def json_default(value):
+    """json.dumps default hook: records and other mappings serialize as objects, NumPy
+    scalars and arrays as their Python values; anything else raises TypeError."""
+    if isinstance(value, ResultRecord):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    if type(value).__module__ == 'numpy' and hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+# ResultTable columns: float64 / int32 typed arrays, plus the interned names and sector codes
+_FLOAT_COLUMNS = ('operating_margin', 'growth_forecast', 'final_score', 'timestamp')
+_INT_COLUMNS = ('moat_score', 'margin_score')
+_INT_MIN, _INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+class ResultTable(Sequence):
+    """Struct-of-arrays store for a whole universe of results.
+
+    Scores and timestamps live in typed arrays (8 bytes per float, 4 per
+    int), sectors as 2-byte codes into one list of interned names, and
+    narratives in a separate column, compressed like ResultRecord's.
+    Anything that doesn't fit a column — a missing key, an error message,
+    an int where a float is expected, a report that isn't the template,
+    extra keys — is kept in a sparse per-row overflow, so every result
+    reads back exactly as it was appended. Indexing and iteration yield
+    ResultRecords built on demand; column() returns one field as a NumPy
+    array.
+    """
+
+    def __init__(self, results: Iterable[Mapping] = ()):
+        self._names: List = []
+        self._sector_codes = array('I')
+        self._sectors: List = []  # code -> interned sector name
+        self._sector_index: Dict = {}
+        self._floats = {name: array('d') for name in _FLOAT_COLUMNS}
+        self._ints = {name: array('i') for name in _INT_COLUMNS}
+        self._summaries: List = []
+        self._overflow: Dict[int, Dict] = {}  # row -> {slot: value}
+        self.extend(results)
+
+    def append(self, result: Mapping):
+        record = as_record(result)
+        row = len(self._names)
+        overflow = {}
+        self._names.append(record.company_name)
+        code = self._sector_index.get(record.sector)
+        if code is None:
+            code = self._sector_index[record.sector] = len(self._sectors)
+            self._sectors.append(record.sector)
+        self._sector_codes.append(code)
+        for name, column in self._floats.items():
+            value = getattr(record, name)
+            if type(value) is float and not math.isnan(value):
+                column.append(value)
+            else:
+                column.append(math.nan)
+                overflow[name] = value
+        for name, column in self._ints.items():
+            value = getattr(record, name)
+            if type(value) is int and _INT_MIN <= value <= _INT_MAX:
+                column.append(value)
+            else:
+                column.append(0)
+                overflow[name] = value
+        self._summaries.append(record._summary)
+        for slot, default in (('error', _MISSING), ('_report', _DERIVED), ('_extra', None)):
+            value = getattr(record, slot)
+            if value is not default:
+                overflow[slot] = value if slot != '_extra' else dict(value)
+        if overflow:
+            self._overflow[row] = overflow
+
+    def extend(self, results: Iterable[Mapping]):
+        for result in results:
+            self.append(result)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ResultTable index out of range')
+        record = ResultRecord.__new__(ResultRecord)
+        record.company_name = self._names[index]
+        record.sector = self._sectors[self._sector_codes[index]]
+        for name, column in self._floats.items():
+            setattr(record, name, column[index])
+        for name, column in self._ints.items():
+            setattr(record, name, column[index])
+        record._summary = self._summaries[index]
+        record.error = _MISSING
+        record._report = _DERIVED
+        record._extra = None
+        for slot, value in self._overflow.get(index, {}).items():
+            setattr(record, slot, dict(value) if slot == '_extra' else value)
+        return record
+
+    def column(self, name: str):
+        """One field for every row as a NumPy array (missing scores are NaN, missing ints 0)."""
+        import numpy as np
+        if name in self._floats:
+            return np.array(self._floats[name], dtype=np.float64)
+        if name in self._ints:
+            return np.array(self._ints[name], dtype=np.int32)
+        if name == 'sector':
+            names = np.array([None if s is _MISSING else s for s in self._sectors], dtype=object)
+            return names[np.array(self._sector_codes, dtype=np.intp)]
+        if name == 'company_name':
+            return np.array(self._names, dtype=object)
+        raise KeyError(name)
@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from utils.results import ResultRecord, json_default
+from config.settings import CACHE_DIR, CHECKPOINT_BATCH_SIZE, CHECKPOINT_FLUSH_SECONDS
+
+# A stored result is only reused for a company whose inputs are unchanged
+INPUT_FIELDS = ('sector', 'operating_margin', 'growth_forecast')
+
+class RunStore:
+    """Append-only SQLite checkpoint store for batch runs.
+
+    Every finished company is appended as one row; rows are buffered and
+    written in batches (every CHECKPOINT_BATCH_SIZE results or
+    CHECKPOINT_FLUSH_SECONDS) so checkpointing never rewrites earlier work.
+    The latest row per company wins when a run is read back.
+    """
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = CHECKPOINT_BATCH_SIZE,
+                 flush_seconds: float = CHECKPOINT_FLUSH_SECONDS):
+        self.path = path or os.path.join(CACHE_DIR, 'runs.sqlite')
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    companies TEXT NOT NULL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    company_name TEXT NOT NULL,
+                    ok INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_run '
+                               'ON results(run_id, company_name)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_run_id ON results(run_id, id)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_company '
+                               'ON results(company_name, ok, created_at)')
+
+    @staticmethod
+    def new_run_id() -> str:
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    def start_run(self, companies: List[Dict], run_id: Optional[str] = None) -> str:
+        """Register a run (or reopen an existing one) and return its id."""
+        run_id = run_id or self.new_run_id()
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO runs VALUES (?, ?, ?, 'running', ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET status = 'running', updated_at = excluded.updated_at
+                """, (run_id, now, now, len(companies), json.dumps(companies)))
+        return run_id
+
+    def append(self, run_id: str, result: Dict):
+        """Buffer one finished company; flushes when the batch is full or stale."""
+        with self._lock:
+            self._buffer.append((run_id, result.get('company_name', 'Unknown'),
+                                 0 if 'error' in result else 1,
+                                 json.dumps(result, default=json_default), time.time()))
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered results in one transaction."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if rows:
+                with self._conn:
+                    self._conn.executemany(
+                        'INSERT INTO results (run_id, company_name, ok, result, created_at) '
+                        'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def finish_run(self, run_id: str, status: str = 'completed'):
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?',
+                               (status, time.time(), run_id))
+
+    def run_info(self, run_id: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            'SELECT run_id, created_at, updated_at, status, total, companies '
+            'FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if row is None:
+            return None
+        return {'run_id': row[0], 'created_at': row[1], 'updated_at': row[2],
+                'status': row[3], 'total': row[4], 'companies': json.loads(row[5])}
+
+    def list_runs(self, limit: int = 20) -> List[Dict]:
+        rows = self._conn.execute(
+            'SELECT run_id, created_at, status, total FROM runs '
+            'ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+        return [{'run_id': r[0], 'created_at': r[1], 'status': r[2], 'total': r[3]} for r in rows]
+
+    def load_results(self, run_id: str) -> Dict[str, Dict]:
+        """Latest result per company for a run, keyed by company_name."""
+        self.flush()
+        rows = self._conn.execute(
+            'SELECT company_name, result FROM results WHERE run_id = ? ORDER BY id',
+            (run_id,)).fetchall()
+        return {name: ResultRecord(json.loads(result)) for name, result in rows}
+
+    def results_since(self, run_id: str, after_id: int = 0) -> Tuple[int, Dict[str, Dict]]:
+        """Results of a run stored after row `after_id`, and the last row id read.
+
+        Polling with the returned id fetches only what landed since, so a
+        follower never re-reads the whole run.
+        """
+        self.flush()
+        rows = self._conn.execute(
+            'SELECT id, company_name, result FROM results WHERE run_id = ? AND id > ? ORDER BY id',
+            (run_id, after_id)).fetchall()
+        if not rows:
+            return after_id, {}
+        return rows[-1][0], {name: ResultRecord(json.loads(result)) for _, name, result in rows}
+
+    def completed(self, run_id: str) -> Dict[str, Dict]:
+        """Successfully analyzed companies of a run; failed ones are left for a retry."""
+        return {name: result for name, result in self.load_results(run_id).items()
+                if 'error' not in result}
+
+    def latest_results(self, company_names: Optional[List[str]] = None,
+                       max_age: Optional[float] = None) -> Dict[str, Dict]:
+        """Newest successful result per company across all runs, keyed by company_name.
+
+        This is how readers (e.g. the dashboard) reuse results written by any
+        earlier run or process without re-analyzing; `max_age` (seconds)
+        ignores anything older.
+        """
+        self.flush()
+        since = time.time() - max_age if max_age else 0.0
+        query = 'SELECT company_name, result FROM results WHERE ok = 1 AND created_at >= ?'
+        if company_names is None:
+            batches = [(query, [since])]
+        else:
+            names = list(dict.fromkeys(company_names))
+            # Stay under SQLite's bound-parameter limit
+            batches = [(f"{query} AND company_name IN ({', '.join('?' * len(chunk))})", [since, *chunk])
+                       for chunk in (names[i:i + 500] for i in range(0, len(names), 500))]
+        latest = {}
+        for sql, params in batches:
+            with self._lock:
+                rows = self._conn.execute(f'{sql} ORDER BY created_at, id', params).fetchall()
+            latest.update((name, ResultRecord(json.loads(result))) for name, result in rows)
+        return latest
+
+    def reusable_results(self, companies: List[Dict],
+                         max_age: Optional[float] = None) -> Dict[str, Dict]:
+        """Latest stored result for each company whose inputs still match, keyed by name."""
+        latest = self.latest_results([c['company_name'] for c in companies], max_age)
+        return {c['company_name']: latest[c['company_name']] for c in companies
+                if c['company_name'] in latest
+                and all(latest[c['company_name']].get(f) == c.get(f) for f in INPUT_FIELDS)}
+
+    def close(self):
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,380 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence
+from config.settings import HISTORY_DIR, HISTORY_ENABLED, HISTORY_BATCH_SIZE
+
+# Columns of the per-run Parquet partitions; narratives stay in the RunStore
+HISTORY_COLUMNS = {
+    'company_name': 'string',
+    'sector': 'string',
+    'operating_margin': 'float64',
+    'growth_forecast': 'float64',
+    'moat_score': 'int64',
+    'margin_score': 'int64',
+    'final_score': 'float64',
+    'timestamp': 'float64',
+}
+
+# Runs that queries include unless asked otherwise ('interrupted' runs are kept but skipped)
+REPORTED_STATUSES = ('completed', 'partial')
+
+def _parquet_schema():
+    import pyarrow as pa
+    types = {'string': pa.string(), 'float64': pa.float64(), 'int64': pa.int64()}
+    return pa.schema([(name, types[kind]) for name, kind in HISTORY_COLUMNS.items()])
+
+def _column_value(value, kind: str):
+    if value is None:
+        return None
+    try:
+        if kind == 'int64':
+            return int(value)
+        if kind == 'float64':
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+class HistoryWriter:
+    """Appends one run's results to the score history.
+
+    Results are buffered and written as Parquet parts of `batch_size` rows
+    under runs/run_id=<id>/attempt=<token>/. Only the scores needed for the
+    ranks are kept in memory; close() ranks the run and publishes it to the
+    catalog in one transaction, so readers never see half a run. Closing a
+    run id that is already recorded (a resumed run) replaces the earlier
+    attempt, whose results the resume yields again.
+    """
+
+    def __init__(self, history: 'ScoreHistory', run_id: str, label: str = '',
+                 batch_size: int = HISTORY_BATCH_SIZE):
+        self.history = history
+        self.run_id = run_id
+        self.label = label
+        self.batch_size = batch_size
+        self.started_at = time.time()
+        self.attempt = uuid.uuid4().hex[:8]
+        self.directory = os.path.join(history.directory, 'runs', f'run_id={run_id}',
+                                      f'attempt={self.attempt}')
+        self.errors = 0
+        self._buffer = []
+        self._parts = 0
+        self._scores = {}  # company_name -> (sector, final, moat, margin); last result wins
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def append(self, result: Dict):
+        """Record one result (failed companies are only counted)."""
+        with self._lock:
+            if 'error' in result:
+                self.errors += 1
+                return
+            self._buffer.append(result)
+            self._scores[result['company_name']] = (
+                result.get('sector') or 'Unknown', float(result.get('final_score') or 0.0),
+                result.get('moat_score'), result.get('margin_score'))
+            due = len(self._buffer) >= self.batch_size
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered results as one Parquet part (temp file + rename)."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columns = {name: [_column_value(row.get(name), kind) for row in rows]
+                       for name, kind in HISTORY_COLUMNS.items()}
+            table = pa.Table.from_pydict(columns, schema=_parquet_schema())
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'part-{self._parts:05d}.parquet')
+            self._parts += 1
+            pq.write_table(table, f'{path}.tmp', compression='zstd')
+            os.replace(f'{path}.tmp', path)
+
+    def close(self, status: str = 'completed'):
+        """Flush, rank the run and add it to the catalog."""
+        if self.closed:
+            return
+        self.flush()
+        with self._lock:
+            self.closed = True
+            if self._scores:
+                self.history._publish(self, status)
+
+class ScoreHistory:
+    """Append-only history of every run's scores, for trends and run-to-run diffs.
+
+    Each run is a Parquet partition (runs/run_id=<id>/) holding its full
+    scoring columns, readable with read_run() or any Parquet engine.
+    history.sqlite (WAL, shared by all processes) is the catalog and index:
+    the run list, each company's score/moat/rank per run clustered by
+    company, and per-run sector aggregates. Company histories, rank movers
+    and sector trends are index lookups whose cost follows the answer, not
+    the number of runs stored.
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR, enabled: bool = HISTORY_ENABLED):
+        self.directory = directory
+        self.path = os.path.join(directory, 'history.sqlite')
+        self.enabled = enabled
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; transactions are managed explicitly (BEGIN IMMEDIATE)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL UNIQUE,
+                    label TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempt TEXT NOT NULL,
+                    companies INTEGER NOT NULL,
+                    errors INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS companies (
+                    company_id INTEGER PRIMARY KEY,
+                    company_name TEXT NOT NULL UNIQUE
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scores (
+                    company_id INTEGER NOT NULL,
+                    run_seq INTEGER NOT NULL,
+                    rank INTEGER NOT NULL,
+                    final_score REAL NOT NULL,
+                    moat_score INTEGER,
+                    margin_score INTEGER,
+                    PRIMARY KEY (company_id, run_seq)
+                ) WITHOUT ROWID""")
+            # Covers "every company's rank in run X" (the primary key rides along)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_scores_run ON scores(run_seq, rank)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sector_stats (
+                    run_seq INTEGER NOT NULL,
+                    sector TEXT NOT NULL,
+                    companies INTEGER NOT NULL,
+                    avg_score REAL NOT NULL,
+                    top_score REAL NOT NULL,
+                    avg_moat REAL,
+                    PRIMARY KEY (sector, run_seq)
+                ) WITHOUT ROWID""")
+            self._local.conn = conn
+        return conn
+
+    def writer(self, run_id: str, label: str = '') -> HistoryWriter:
+        return HistoryWriter(self, run_id, label)
+
+    def _publish(self, writer: HistoryWriter, status: str):
+        import numpy as np
+        names = list(writer._scores)
+        sectors, final, moat, margin = zip(*writer._scores.values())
+        final = np.array(final, dtype=np.float64)
+        # Best first, ties in arrival order (as RankingIndex ranks them)
+        order = np.argsort(-final, kind='stable')
+        ranks = np.empty(len(names), dtype=np.int64)
+        ranks[order] = np.arange(1, len(names) + 1)
+
+        by_sector = {}
+        for i, sector in enumerate(sectors):
+            by_sector.setdefault(sector, []).append(i)
+        sector_rows = []
+        for sector, members in by_sector.items():
+            scores = final[members]
+            moats = [moat[i] for i in members if moat[i] is not None]
+            sector_rows.append((sector, len(members), float(scores.mean()), float(scores.max()),
+                                sum(moats) / len(moats) if moats else None))
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            previous = conn.execute('SELECT run_seq, attempt FROM runs WHERE run_id = ?',
+                                    (writer.run_id,)).fetchone()
+            if previous is not None:
+                for table in ('scores', 'sector_stats'):
+                    conn.execute(f'DELETE FROM {table} WHERE run_seq = ?', (previous[0],))
+                conn.execute('DELETE FROM runs WHERE run_seq = ?', (previous[0],))
+            run_seq = conn.execute(
+                'INSERT INTO runs (run_id, label, status, attempt, companies, errors, '
+                'started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (writer.run_id, writer.label, status, writer.attempt, len(names), writer.errors,
+                 writer.started_at, time.time())).lastrowid
+            conn.executemany('INSERT OR IGNORE INTO companies (company_name) VALUES (?)',
+                             ((name,) for name in names))
+            ids = self._company_ids(conn, names)
+            conn.executemany(
+                'INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?)',
+                ((ids[name], run_seq, int(ranks[i]), float(final[i]),
+                  None if moat[i] is None else int(moat[i]),
+                  None if margin[i] is None else int(margin[i]))
+                 for i, name in enumerate(names)))
+            conn.executemany('INSERT INTO sector_stats VALUES (?, ?, ?, ?, ?, ?)',
+                             ((run_seq, *row) for row in sector_rows))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if previous is not None and previous[1] != writer.attempt:
+            shutil.rmtree(os.path.join(self.directory, 'runs', f'run_id={writer.run_id}',
+                                       f'attempt={previous[1]}'), ignore_errors=True)
+
+    @staticmethod
+    def _company_ids(conn: sqlite3.Connection, names: Sequence[str]) -> Dict[str, int]:
+        ids = {}
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            ids.update(conn.execute(
+                f"SELECT company_name, company_id FROM companies "
+                f"WHERE company_name IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+        return ids
+
+    def _run_seq(self, run_id: str) -> Optional[int]:
+        row = self._connect().execute('SELECT run_seq FROM runs WHERE run_id = ?',
+                                      (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def runs(self, limit: int = 20, label: Optional[str] = None,
+             statuses: Sequence[str] = REPORTED_STATUSES) -> List[Dict]:
+        """Recorded runs, newest first; `label` matches as a prefix (e.g. 'cli')."""
+        columns = ('run_id', 'label', 'status', 'companies', 'errors', 'started_at', 'finished_at')
+        sql = (f"SELECT {', '.join(columns)} FROM runs "
+               f"WHERE status IN ({', '.join('?' * len(statuses))})")
+        params = list(statuses)
+        if label:
+            sql += ' AND label LIKE ?'
+            params.append(f'{label}%')
+        rows = self._connect().execute(sql + ' ORDER BY run_seq DESC LIMIT ?',
+                                       params + [limit]).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def company_history(self, company_name: str, limit: Optional[int] = None,
+                        statuses: Sequence[str] = REPORTED_STATUSES) -> List[Dict]:
+        """A company's score, moat, margin and rank in each run, oldest first."""
+        columns = ('run_id', 'finished_at', 'companies', 'rank', 'final_score', 'moat_score',
+                   'margin_score')
+        rows = self._connect().execute(
+            f"SELECT r.run_id, r.finished_at, r.companies, s.rank, s.final_score, s.moat_score, "
+            f"s.margin_score FROM companies c JOIN scores s ON s.company_id = c.company_id "
+            f"JOIN runs r ON r.run_seq = s.run_seq WHERE c.company_name = ? "
+            f"AND r.status IN ({', '.join('?' * len(statuses))}) "
+            f"ORDER BY s.run_seq DESC LIMIT ?",
+            (company_name, *statuses, -1 if limit is None else limit)).fetchall()
+        return [dict(zip(columns, row)) for row in reversed(rows)]
+
+    def _run_ranks(self, run_seq: int):
+        """(company ids, ranks) of a run, read from the covering run index alone."""
+        import numpy as np
+        rows = self._connect().execute('SELECT company_id, rank FROM scores WHERE run_seq = ?',
+                                       (run_seq,)).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        ids, ranks = zip(*rows)
+        return np.array(ids, dtype=np.int64), np.array(ranks, dtype=np.int64)
+
+    def movers(self, run_from: Optional[str] = None, run_to: Optional[str] = None,
+               limit: int = 20) -> Optional[Dict]:
+        """Biggest rank changes between two runs (default: the two latest reported runs).
+
+        Returns the `limit` biggest risers and fallers among companies in both
+        runs (positive change = moved up), plus how many entered or left.
+        None if there are not two runs to compare.
+        """
+        import numpy as np
+        if run_from is None or run_to is None:
+            latest = self.runs(limit=2)
+            if len(latest) < 2:
+                return None
+            run_to, run_from = run_to or latest[0]['run_id'], run_from or latest[1]['run_id']
+        seq_from, seq_to = self._run_seq(run_from), self._run_seq(run_to)
+        if seq_from is None or seq_to is None:
+            return None
+        ids_a, ranks_a = self._run_ranks(seq_from)
+        ids_b, ranks_b = self._run_ranks(seq_to)
+        common, ia, ib = np.intersect1d(ids_a, ids_b, assume_unique=True, return_indices=True)
+        change = ranks_a[ia] - ranks_b[ib]
+        order = np.argsort(-change, kind='stable')
+        risers = [i for i in order[:limit] if change[i] > 0]
+        fallers = [i for i in order[::-1][:limit] if change[i] < 0]
+        picked = [int(common[i]) for i in risers + fallers]
+        conn = self._connect()
+        marks = ', '.join('?' * len(picked))
+        names = dict(conn.execute(f'SELECT company_id, company_name FROM companies '
+                                  f'WHERE company_id IN ({marks})', picked).fetchall())
+        scores = {(company_id, run_seq): score for company_id, run_seq, score in conn.execute(
+            f'SELECT company_id, run_seq, final_score FROM scores '
+            f'WHERE company_id IN ({marks}) AND run_seq IN (?, ?)',
+            picked + [seq_from, seq_to]).fetchall()}
+
+        def mover(i):
+            company_id = int(common[i])
+            return {'company_name': names[company_id], 'rank_from': int(ranks_a[ia[i]]),
+                    'rank_to': int(ranks_b[ib[i]]), 'change': int(change[i]),
+                    'score_from': scores[company_id, seq_from],
+                    'score_to': scores[company_id, seq_to]}
+
+        return {
+            'from': run_from,
+            'to': run_to,
+            'compared': len(common),
+            'entered': len(ids_b) - len(common),
+            'dropped': len(ids_a) - len(common),
+            'risers': [mover(i) for i in risers],
+            'fallers': [mover(i) for i in fallers],
+        }
+
+    def sector_trends(self, sectors: Optional[Sequence[str]] = None, label: Optional[str] = None,
+                      since: Optional[float] = None,
+                      statuses: Sequence[str] = REPORTED_STATUSES) -> List[Dict]:
+        """Per-run sector averages, oldest first (optionally for some sectors / labels / dates)."""
+        columns = ('run_id', 'finished_at', 'sector', 'companies', 'avg_score', 'top_score',
+                   'avg_moat')
+        sql = (f"SELECT r.run_id, r.finished_at, t.sector, t.companies, t.avg_score, t.top_score, "
+               f"t.avg_moat FROM sector_stats t JOIN runs r ON r.run_seq = t.run_seq "
+               f"WHERE r.status IN ({', '.join('?' * len(statuses))})")
+        params = list(statuses)
+        if sectors:
+            sql += f" AND t.sector IN ({', '.join('?' * len(sectors))})"
+            params.extend(sectors)
+        if label:
+            sql += ' AND r.label LIKE ?'
+            params.append(f'{label}%')
+        if since:
+            sql += ' AND r.finished_at >= ?'
+            params.append(since)
+        rows = self._connect().execute(sql + ' ORDER BY t.run_seq, t.sector', params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def read_run(self, run_id: str, columns: Optional[List[str]] = None):
+        """A recorded run's full columnar results as a pandas DataFrame (None if unknown)."""
+        row = self._connect().execute('SELECT attempt FROM runs WHERE run_id = ?',
+                                      (run_id,)).fetchone()
+        if row is None:
+            return None
+        import pyarrow.parquet as pq
+        path = os.path.join(self.directory, 'runs', f'run_id={run_id}', f'attempt={row[0]}')
+        return pq.read_table(path, columns=columns).to_pandas()
+
+_score_history = None
+_score_history_lock = threading.Lock()
+
+def get_score_history() -> ScoreHistory:
+    """Process-wide score history shared by every engine."""
+    global _score_history
+    with _score_history_lock:
+        if _score_history is None:
+            _score_history = ScoreHistory()
+        return _score_history
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Union
+from config.settings import MOAT_SCORE_MAX
+
+# Must mirror the if/elif ladder in agents/margin_agent.py (strict '>' bounds)
+MARGIN_THRESHOLDS = (0.40, 0.30, 0.20, 0.10)
+MARGIN_BUCKET_SCORES = (5, 4, 3, 2)
+MARGIN_FLOOR_SCORE = 1
+
+# growth_forecast cut-offs mapping companies onto sector_weights.json growth_multipliers
+GROWTH_TIERS = (
+    ('high_growth', 1.5),
+    ('medium_growth', 1.2),
+    ('stable_growth', float('-inf'))
+)
+
+def margin_scores(operating_margin) -> np.ndarray:
+    """Vectorized margin_analysis_agent."""
+    margin = np.asarray(operating_margin, dtype=np.float64)
+    conditions = [margin > threshold for threshold in MARGIN_THRESHOLDS]
+    return np.select(conditions, MARGIN_BUCKET_SCORES, MARGIN_FLOOR_SCORE).astype(np.int64)
+
+def tafgs(moat_score, margin_score, growth_forecast) -> np.ndarray:
+    """Vectorized ranking_agent: (moat × margin) × growth, evaluated in the same order."""
+    moat = np.asarray(moat_score)
+    margin = np.asarray(margin_score)
+    return (moat * margin) * np.asarray(growth_forecast, dtype=np.float64)
+
+def tafgs_upper_bound(operating_margin, growth_forecast, moat_score=None) -> np.ndarray:
+    """Highest TAFGS each company can still reach before its moat is scored.
+
+    The moat factor is taken at MOAT_SCORE_MAX (or 0 when growth is negative);
+    companies whose moat_score is already known (not NaN) get their exact score.
+    """
+    margin = margin_scores(operating_margin)
+    best = np.maximum(tafgs(MOAT_SCORE_MAX, margin, growth_forecast), 0.0)
+    if moat_score is None:
+        return best
+    known = np.asarray(moat_score, dtype=np.float64)
+    return np.where(np.isnan(known), best, tafgs(known, margin, growth_forecast))
+
+def descending_order(scores: np.ndarray) -> np.ndarray:
+    """Per row, column indexes from highest to lowest score; ties keep column order.
+
+    Same result as a stable argsort of -scores, but done as a plain sort of
+    int64 keys: the order-preserving bit pattern of -score with its lowest
+    bits replaced by the column index (a relative error of at most
+    2**-(52 - log2(columns)), far below any real score difference).
+    """
+    bits = max(int(scores.shape[1] - 1).bit_length(), 1)
+    keys = np.negative(scores, dtype=np.float64)
+    keys += 0.0  # -0.0 -> 0.0
+    keys = keys.view(np.int64)
+    keys ^= (keys >> 63) & np.int64(0x7FFFFFFFFFFFFFFF)
+    keys &= ~np.int64((1 << bits) - 1)
+    keys |= np.arange(scores.shape[1], dtype=np.int64)
+    keys.sort(axis=1)
+    keys &= (1 << bits) - 1
+    return keys.astype(np.int32)
+
+def descending_ranks(scores: np.ndarray) -> np.ndarray:
+    """Per row, the 0-based rank of each column (0 = highest score, ties by column order)."""
+    order = descending_order(scores)
+    ranks = np.empty(order.shape, dtype=np.int32)
+    np.put_along_axis(ranks, order, np.arange(order.shape[1], dtype=np.int32)[None, :], axis=1)
+    return ranks
+
+def growth_tier_codes(growth_forecast) -> np.ndarray:
+    """Index into GROWTH_TIERS for each company."""
+    growth = np.asarray(growth_forecast, dtype=np.float64)
+    conditions = [growth >= cutoff for _, cutoff in GROWTH_TIERS[:-1]]
+    return np.select(conditions, range(len(GROWTH_TIERS) - 1), len(GROWTH_TIERS) - 1)
+
+class ScoringEngine:
+    """Columnar TAFGS scoring for the deterministic stages of the workflow.
+
+    `final_score` is identical to what the graph's margin and ranking nodes
+    produce; `weighted_score` additionally applies the sector weight and
+    growth-tier multiplier from data/sector_weights.json, as in the README
+    formula. Unknown sectors/tiers get a neutral 1.0.
+    """
+
+    def __init__(self, weights: Optional[Dict] = None):
+        self.set_weights(weights or {"sector_weights": {}, "growth_multipliers": {}})
+
+    def set_weights(self, weights: Dict):
+        """Swap in new sector weights / growth multipliers (no re-analysis needed)."""
+        self.sector_weights = dict(weights.get("sector_weights", {}))
+        self.growth_multipliers = dict(weights.get("growth_multipliers", {}))
+        self._tier_multipliers = np.array(
+            [self.growth_multipliers.get(name, 1.0) for name, _ in GROWTH_TIERS],
+            dtype=np.float64
+        )
+
+    def sector_weight_array(self, sectors) -> np.ndarray:
+        """Per-row sector weight, looked up once per distinct sector."""
+        codes, uniques = pd.factorize(pd.Series(sectors), use_na_sentinel=False)
+        table = np.array([self.sector_weights.get(s, 1.0) for s in uniques], dtype=np.float64)
+        return table[codes]
+
+    def growth_multiplier_array(self, growth_forecast) -> np.ndarray:
+        return self._tier_multipliers[growth_tier_codes(growth_forecast)]
+
+    def score(self, companies: Union[pd.DataFrame, Dict]) -> pd.DataFrame:
+        """Score a whole universe in one pass.
+
+        Expects `sector`, `operating_margin`, `growth_forecast` and `moat_score`
+        columns; returns a frame with margin/final/weighted scores added.
+        """
+        frame = companies if isinstance(companies, pd.DataFrame) else pd.DataFrame(companies)
+        margin = margin_scores(frame["operating_margin"].to_numpy())
+        final = tafgs(frame["moat_score"].to_numpy(), margin, frame["growth_forecast"].to_numpy())
+        sector_weight = self.sector_weight_array(frame["sector"].to_numpy())
+        growth_multiplier = self.growth_multiplier_array(frame["growth_forecast"].to_numpy())
+        return frame.assign(
+            margin_score=margin,
+            final_score=final,
+            sector_weight=sector_weight,
+            growth_multiplier=growth_multiplier,
+            weighted_score=final * sector_weight * growth_multiplier
+        )
@@ -0,0 +1,293 @@
+import math
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from utils.scoring import (
+    MARGIN_THRESHOLDS, MARGIN_BUCKET_SCORES, MARGIN_FLOOR_SCORE, descending_order, margin_scores,
+    tafgs
+)
+from config.settings import (
+    SIM_DRAWS, SIM_MARGIN_SD, SIM_GROWTH_SIGMA, SIM_CHUNK_ELEMENTS, SIM_SCORE_SAMPLE
+)
+
+DISTRIBUTIONS = ('normal', 'lognormal', 'uniform')
+SIMULATED_FIELDS = ('operating_margin', 'growth_forecast')
+
+# normal: absolute standard deviation; lognormal: sigma of a median-preserving
+# multiplicative error; uniform: absolute half-width
+DEFAULT_UNCERTAINTY = {
+    'operating_margin': {'dist': 'normal', 'scale': SIM_MARGIN_SD},
+    'growth_forecast': {'dist': 'lognormal', 'scale': SIM_GROWTH_SIGMA},
+}
+
+# Valid range of growth_forecast after perturbation; simulated margins only matter
+# through their bucket, which clipping to [-1, 1] would not change
+_GROWTH_LIMITS = (0.0, None)
+
+BAND_QUANTILES = (0.05, 0.5, 0.95)
+
+# margin_analysis_agent's ladder as ascending thresholds; the bucket is the number of
+# thresholds the margin is strictly above
+_THRESHOLDS = np.array(sorted(MARGIN_THRESHOLDS))
+_BUCKETS = np.array((MARGIN_FLOOR_SCORE,) + tuple(sorted(MARGIN_BUCKET_SCORES)), dtype=np.int8)
+
+def _scales(spec: Dict, names: Sequence[str]) -> np.ndarray:
+    """Per-company scale: a number for everyone, or {company_name: scale, 'default': scale}."""
+    scale = spec.get('scale', 0.0)
+    if isinstance(scale, dict):
+        default = scale.get('default', 0.0)
+        return np.array([scale.get(name, default) for name in names], dtype=np.float64)
+    return np.full(len(names), float(scale))
+
+try:
+    from scipy.special import ndtr as _normal_cdf
+except ImportError:  # scipy is optional: apply math.erfc elementwise without a Python loop
+    _erfc = np.frompyfunc(math.erfc, 1, 1)
+
+    def _normal_cdf(z: np.ndarray) -> np.ndarray:
+        return 0.5 * _erfc(np.asarray(z, dtype=np.float64) / -math.sqrt(2)).astype(np.float64)
+
+def _margin_cdf(base: np.ndarray, dist: str, scale: np.ndarray) -> np.ndarray:
+    """P(perturbed margin <= threshold), shape (thresholds, companies)."""
+    t, m, s = _THRESHOLDS[:, None], base[None, :], scale[None, :]
+    exact = (m <= t).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if dist == 'normal':
+            cdf = _normal_cdf(np.nan_to_num((t - m) / s))
+        elif dist == 'uniform':
+            cdf = np.clip((t - m + s) / (2 * s), 0.0, 1.0)
+        else:
+            # m * exp(s z): below t when z < log(t / m) / s (m > 0), above it when m < 0
+            z = np.log(np.where(t * m > 0, t / m, 1.0)) / s
+            cdf = np.where(m > 0, np.where(t > 0, _normal_cdf(np.nan_to_num(z)), 0.0),
+                           np.where(t < 0, 1 - _normal_cdf(np.nan_to_num(z)), 1.0))
+    # A zero margin only stays exact under multiplicative (lognormal) noise
+    return np.where((s > 0) & ((m != 0) | (dist != 'lognormal')), cdf, exact)
+
+def _margin_buckets(rng, cdf: np.ndarray, draws: int) -> np.ndarray:
+    """Sample each company's margin bucket by inverse CDF: one uniform per draw."""
+    u = rng.random((draws, cdf.shape[1]), dtype=np.float32)
+    level = np.zeros(u.shape, dtype=np.int8)
+    for row in cdf.astype(np.float32):
+        level += u >= row
+    return _BUCKETS[level]
+
+def _draw(rng, base: np.ndarray, dist: str, scale: np.ndarray, draws: int,
+          limits) -> np.ndarray:
+    # float32 noise is plenty for forecast errors and much cheaper to generate
+    shape = (draws, base.size)
+    if dist == 'normal':
+        values = base + rng.standard_normal(shape, dtype=np.float32) * scale.astype(np.float32)
+    elif dist == 'lognormal':
+        values = base * np.exp(rng.standard_normal(shape, dtype=np.float32) * scale.astype(np.float32))
+    else:
+        values = base + rng.uniform(-1.0, 1.0, shape).astype(np.float32) * scale.astype(np.float32)
+    if dist == 'lognormal':
+        return values  # keeps the sign of base, so already within limits
+    low, high = limits
+    np.maximum(values, low, out=values)
+    if high is not None:
+        np.minimum(values, high, out=values)
+    return values
+
+def _hist_quantiles(hist: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+    """Quantiles (bin indexes) of each row of a count histogram; shape (rows, len(quantiles))."""
+    cdf = np.cumsum(hist, axis=1) / np.maximum(hist.sum(axis=1, keepdims=True), 1)
+    return np.stack([np.argmax(cdf >= q, axis=1) for q in quantiles], axis=1)
+
+def _simulate_chunk(inputs: Dict, draws: int, seed, sample: int) -> Dict:
+    """Draw `draws` scenarios and return mergeable rank/score accumulators."""
+    rng = np.random.default_rng(seed)
+    n, k, sectors = inputs['n'], inputs['k'], inputs['sectors']
+    growth = inputs['uncertainty']['growth_forecast']
+    scores = tafgs(inputs['moat_score'], _margin_buckets(rng, inputs['margin_cdf'], draws),
+                   _draw(rng, inputs['growth_forecast'], growth['dist'], growth['scales'], draws,
+                         _GROWTH_LIMITS))
+
+    order = descending_order(scores)
+    ranks = np.empty(order.shape, dtype=np.int32)
+    np.put_along_axis(ranks, order, np.arange(n, dtype=np.int32)[None, :], axis=1)
+
+    # Running per-company rank statistics; bands come from the sampled draws, so memory
+    # stays O(companies) however large the universe is
+    rank_sum = ranks.sum(axis=0, dtype=np.int64)
+    top_k_hits = np.count_nonzero(ranks < k, axis=0)
+
+    # Top-K seats and best rank per sector in each draw
+    top_codes = inputs['sector_codes'][order[:, :k]]
+    del order
+    seats = np.bincount((np.arange(draws)[:, None] * sectors + top_codes).ravel(),
+                        minlength=draws * sectors).reshape(draws, sectors)
+    seat_hist = np.bincount((np.arange(sectors) * (k + 1) + seats).ravel(),
+                            minlength=sectors * (k + 1)).reshape(sectors, k + 1)
+    best = np.minimum.reduceat(ranks[:, inputs['sector_order']], inputs['sector_starts'], axis=1)
+    best_hist = np.bincount((np.arange(sectors) * n + best).ravel(),
+                            minlength=sectors * n).reshape(sectors, n)
+    return {
+        'draws': draws,
+        'rank_sum': rank_sum,
+        'top_k_hits': top_k_hits,
+        'seat_hist': seat_hist,
+        'best_hist': best_hist,
+        'score_sum': scores.sum(axis=0),
+        'score_sample': scores[:sample].astype(np.float32),
+        'rank_sample': ranks[:sample],
+    }
+
+class RankSimulator:
+    """Monte Carlo rank stability of analyzed results under forecast uncertainty.
+
+    operating_margin and growth_forecast are perturbed per draw (see
+    DEFAULT_UNCERTAINTY), margin buckets and TAFGS are recomputed for all
+    draws at once with NumPy, and the moat score each result already has is
+    reused, so no LLM calls are made. Draws run in chunks of about
+    chunk_elements (draws × companies) array entries, optionally across
+    worker processes; each chunk has its own seed derived from `seed`, so
+    results do not depend on the number of workers. Margins are sampled
+    straight into their bucket by inverse CDF, since TAFGS only sees the
+    bucket. Mean ranks, top-K probabilities and sector statistics use every
+    draw; rank and score bands use a sample of up to sample_draws (and at
+    most about one chunk of array entries), so memory grows with the
+    number of companies, not its square.
+    """
+
+    def __init__(self, uncertainty: Optional[Dict] = None, k: int = 20, draws: int = SIM_DRAWS,
+                 workers: int = 1, seed: int = 0, chunk_elements: int = SIM_CHUNK_ELEMENTS,
+                 sample_draws: int = SIM_SCORE_SAMPLE):
+        self.uncertainty = {**DEFAULT_UNCERTAINTY, **(uncertainty or {})}
+        for field, spec in self.uncertainty.items():
+            if field not in SIMULATED_FIELDS:
+                raise ValueError(f"Cannot simulate '{field}'. Available: {', '.join(SIMULATED_FIELDS)}")
+            if spec.get('dist') not in DISTRIBUTIONS:
+                raise ValueError(f"Unknown distribution '{spec.get('dist')}'. "
+                                 f"Available: {', '.join(DISTRIBUTIONS)}")
+        self.k = k
+        self.draws = draws
+        self.workers = workers
+        self.seed = seed
+        self.chunk_elements = chunk_elements
+        self.sample_draws = sample_draws
+
+    def _inputs(self, results: List[Dict]) -> Dict:
+        names = [r['company_name'] for r in results]
+        sector_names = sorted({r.get('sector', 'Unknown') for r in results})
+        sector_codes = {name: code for code, name in enumerate(sector_names)}
+        codes = np.array([sector_codes[r.get('sector', 'Unknown')] for r in results])
+        uncertainty = {field: {'dist': spec['dist'], 'scales': _scales(spec, names)}
+                       for field, spec in self.uncertainty.items()}
+        margin = np.array([r['operating_margin'] for r in results], dtype=np.float64)
+        margin_spec = uncertainty['operating_margin']
+        growth = np.array([r['growth_forecast'] for r in results], dtype=np.float64)
+        moat = np.array([r.get('moat_score') or 0 for r in results], dtype=np.float64)
+        sector_order = np.argsort(codes, kind='stable')
+        return {
+            'n': len(results),
+            'k': min(self.k, len(results)),
+            'sectors': len(sector_names),
+            'sector_names': sector_names,
+            'sector_codes': codes,
+            'sector_order': sector_order,
+            'sector_starts': np.searchsorted(codes[sector_order], np.arange(len(sector_names))),
+            'operating_margin': margin,
+            'growth_forecast': growth,
+            'moat_score': moat,
+            'uncertainty': uncertainty,
+            'margin_cdf': _margin_cdf(margin, margin_spec['dist'], margin_spec['scales']),
+        }
+
+    def _chunks(self, n: int):
+        """(draws, seed, score sample) per chunk; fixed by draws/seed/chunk size only."""
+        size = max(1, min(self.draws, self.chunk_elements // max(n, 1)))
+        counts = [min(size, self.draws - start) for start in range(0, self.draws, size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(counts))
+        # Score bands use at most about one chunk's worth of draws in total
+        sample = min(self.sample_draws, self.draws, max(1, self.chunk_elements // max(n, 1)))
+        samples = [math.ceil(sample * count / self.draws) for count in counts]
+        return list(zip(counts, seeds, samples))
+
+    def run(self, results: List[Dict]) -> Dict:
+        """Simulate the ranking of `results` (failed ones are ignored)."""
+        results = [r for r in results if 'error' not in r and r.get('moat_score') is not None]
+        if not results:
+            return {'draws': 0, 'k': self.k, 'seconds': 0.0, 'companies': [], 'sectors': []}
+        start = time.perf_counter()
+        inputs = self._inputs(results)
+        chunks = self._chunks(inputs['n'])
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(self.workers, mp_context=mp.get_context('spawn')) as pool:
+                parts = pool.map(_simulate_chunk, *zip(*[(inputs, d, s, m) for d, s, m in chunks]))
+                totals = self._merge(parts)
+        else:
+            totals = self._merge(_simulate_chunk(inputs, d, s, m) for d, s, m in chunks)
+        report = self._report(results, inputs, totals)
+        report['seconds'] = round(time.perf_counter() - start, 4)
+        return report
+
+    @staticmethod
+    def _merge(parts) -> Dict:
+        totals, samples = None, {'score_sample': [], 'rank_sample': []}
+        for part in parts:
+            for key, sample in samples.items():
+                sample.append(part.pop(key))
+            if totals is None:
+                totals = part
+            else:
+                for key, value in part.items():
+                    totals[key] = totals[key] + value
+        for key, sample in samples.items():
+            totals[key] = np.concatenate(sample)
+        return totals
+
+    def _report(self, results: List[Dict], inputs: Dict, totals: Dict) -> Dict:
+        n, k, draws = inputs['n'], inputs['k'], totals['draws']
+        # Lowest sampled rank reaching each quantile, as a rank histogram would give
+        rank_bands = np.quantile(totals['rank_sample'], BAND_QUANTILES, axis=0,
+                                 method='inverted_cdf').T.astype(np.int64) + 1
+        p_top = totals['top_k_hits'] / draws
+        mean_rank = totals['rank_sum'] / draws + 1
+        score_bands = np.quantile(totals['score_sample'], BAND_QUANTILES, axis=0)
+        base = tafgs(inputs['moat_score'], margin_scores(inputs['operating_margin']),
+                     inputs['growth_forecast'])
+        base_rank = np.empty(n, dtype=np.int64)
+        base_rank[np.argsort(-base, kind='stable')] = np.arange(1, n + 1)
+
+        companies = [{
+            'company_name': result['company_name'],
+            'sector': result.get('sector', 'Unknown'),
+            'moat_score': result.get('moat_score'),
+            'base_score': float(base[i]),
+            'base_rank': int(base_rank[i]),
+            'mean_score': float(totals['score_sum'][i] / draws),
+            'score_p5': float(score_bands[0, i]),
+            'score_p50': float(score_bands[1, i]),
+            'score_p95': float(score_bands[2, i]),
+            'mean_rank': float(mean_rank[i]),
+            'rank_p5': int(rank_bands[i, 0]),
+            'rank_p50': int(rank_bands[i, 1]),
+            'rank_p95': int(rank_bands[i, 2]),
+            'p_top_k': float(p_top[i]),
+        } for i, result in enumerate(results)]
+        companies.sort(key=lambda c: (-c['p_top_k'], c['base_rank']))
+
+        seat_hist, best_hist = totals['seat_hist'], totals['best_hist']
+        seat_bands = _hist_quantiles(seat_hist, BAND_QUANTILES)
+        best_bands = _hist_quantiles(best_hist, BAND_QUANTILES) + 1
+        members = np.bincount(inputs['sector_codes'], minlength=inputs['sectors'])
+        sectors = [{
+            'sector': name,
+            'companies': int(members[s]),
+            'p_in_top_k': float(1 - seat_hist[s, 0] / draws),
+            'expected_top_k': float(seat_hist[s] @ np.arange(k + 1) / draws),
+            'top_k_p5': int(seat_bands[s, 0]),
+            'top_k_p95': int(seat_bands[s, 2]),
+            'best_rank_p5': int(best_bands[s, 0]),
+            'best_rank_p50': int(best_bands[s, 1]),
+            'best_rank_p95': int(best_bands[s, 2]),
+        } for s, name in enumerate(inputs['sector_names'])]
+        sectors.sort(key=lambda s: -s['expected_top_k'])
+        return {'draws': draws, 'k': k, 'uncertainty': {
+                    field: {'dist': spec['dist'], 'scale': spec.get('scale')}
+                    for field, spec in self.uncertainty.items()},
+                'companies': companies, 'sectors': sectors}
@@ -0,0 +1,172 @@
+import math
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from utils.scoring import GROWTH_TIERS, descending_ranks, growth_tier_codes, margin_scores, tafgs
+from config.settings import SWEEP_CHUNK_ELEMENTS, SWEEP_MAX_CONFIGS
+
+WEIGHT_TABLES = ('sector_weights', 'growth_multipliers')
+TIER_NAMES = tuple(name for name, _ in GROWTH_TIERS)
+
+def _grid_size(grid: Dict) -> int:
+    return math.prod(len(values) for table in WEIGHT_TABLES
+                     for values in (grid.get(table) or {}).values())
+
+class WeightSweep:
+    """Rankings under many sector-weight / growth-multiplier configurations at once.
+
+    The moat and margin scores of the results are fixed, so each company's
+    weighted TAFGS in configuration c is final_score × sector_weight[c, sector]
+    × growth_multiplier[c, tier]. All configurations are evaluated as one
+    broadcasted (configurations × companies) matrix, in chunks of about
+    chunk_elements entries, and every row is ranked; memory stays bounded
+    by the chunk size (plus the rank matrix, if kept). Weights missing from a
+    configuration fall back to `base`, then to a neutral 1.0, as in
+    ScoringEngine.
+
+    Configurations are either an explicit list of weight dicts (the
+    sector_weights.json shape) or a grid: {table: {name: [candidate values]}}
+    whose cartesian product is swept on top of `base`.
+    """
+
+    def __init__(self, k: int = 20, chunk_elements: int = SWEEP_CHUNK_ELEMENTS,
+                 max_configs: int = SWEEP_MAX_CONFIGS):
+        self.k = k
+        self.chunk_elements = chunk_elements
+        self.max_configs = max_configs
+
+    def _inputs(self, results: List[Dict]) -> Dict:
+        sector_names = sorted({r.get('sector', 'Unknown') for r in results})
+        sector_codes = {name: code for code, name in enumerate(sector_names)}
+        codes = np.array([sector_codes[r.get('sector', 'Unknown')] for r in results], dtype=np.int64)
+        growth = np.array([r['growth_forecast'] for r in results], dtype=np.float64)
+        margin = np.array([r['margin_score'] if r.get('margin_score') is not None
+                           else margin_scores(r['operating_margin']) for r in results], dtype=np.int64)
+        moat = np.array([r['moat_score'] for r in results], dtype=np.float64)
+        return {
+            'n': len(results),
+            'sector_names': sector_names,
+            'final': tafgs(moat, margin, growth),
+            # Index into the flattened (sector, growth tier) factor table of a configuration
+            'group': codes * len(TIER_NAMES) + growth_tier_codes(growth),
+        }
+
+    @staticmethod
+    def _base_row(base: Dict, table: str, names: Sequence[str]) -> np.ndarray:
+        weights = (base or {}).get(table, {})
+        return np.array([weights.get(name, 1.0) for name in names], dtype=np.float64)
+
+    def _tables_from_configs(self, configs: List[Dict], base: Dict, sector_names: List[str]):
+        columns = {'sector_weights': sector_names, 'growth_multipliers': TIER_NAMES}
+        tables, axes, values = {}, [], []
+        for table, names in columns.items():
+            default = self._base_row(base, table, names)
+            rows = np.array([[(config.get(table) or {}).get(name, default[i])
+                              for i, name in enumerate(names)] for config in configs],
+                            dtype=np.float64).reshape(len(configs), len(names))
+            tables[table] = rows
+            # Describe each configuration by the weights that actually vary
+            for i, name in enumerate(names):
+                if len(configs) > 1 and np.ptp(rows[:, i]) > 0:
+                    axes.append(f'{table}.{name}')
+                    values.append(rows[:, i])
+        return tables, axes, values
+
+    def _tables_from_grid(self, grid: Dict, base: Dict, sector_names: List[str]):
+        columns = {'sector_weights': sector_names, 'growth_multipliers': TIER_NAMES}
+        varied = [(table, name, np.asarray(candidates, dtype=np.float64))
+                  for table in WEIGHT_TABLES for name, candidates in (grid.get(table) or {}).items()]
+        for table, name, _ in varied:
+            if table == 'growth_multipliers' and name not in TIER_NAMES:
+                raise ValueError(f"Unknown growth tier '{name}'. Available: {', '.join(TIER_NAMES)}")
+        mesh = ([axis.ravel() for axis in np.meshgrid(*[c for _, _, c in varied], indexing='ij')]
+                if varied else [])
+        size = mesh[0].size if mesh else 1
+        tables = {table: np.tile(self._base_row(base, table, names), (size, 1))
+                  for table, names in columns.items()}
+        for (table, name, _), column in zip(varied, mesh):
+            # A sector with no results doesn't move any ranking
+            if name in columns[table]:
+                tables[table][:, list(columns[table]).index(name)] = column
+        return tables, [f'{table}.{name}' for table, name, _ in varied], mesh
+
+    def run(self, results: List[Dict], configs: Optional[List[Dict]] = None,
+            grid: Optional[Dict] = None, base: Optional[Dict] = None,
+            keep_ranks: bool = True, ranks_path: Optional[str] = None) -> Dict:
+        """Rank `results` (failed ones are ignored) under every configuration.
+
+        Pass exactly one of `configs` or `grid`. The report's `ranks` is the
+        1-based (configurations × companies) rank matrix, columns in the
+        order of `columns`; with ranks_path it is written there as a .npy
+        memmap instead of being held in memory, and keep_ranks=False skips it.
+        """
+        if (configs is None) == (grid is None):
+            raise ValueError('Pass either configs or grid')
+        size = len(configs) if configs is not None else _grid_size(grid)
+        if size > self.max_configs:
+            raise ValueError(f"{size:,} weight configurations requested; the limit is "
+                             f"{self.max_configs:,} (SWEEP_MAX_CONFIGS)")
+        results = [r for r in results if 'error' not in r and r.get('moat_score') is not None]
+        if not results or not size:
+            return {'configs': 0, 'k': self.k, 'seconds': 0.0, 'axes': [], 'values': [],
+                    'columns': [], 'ranks': None, 'summary': []}
+        start = time.perf_counter()
+        inputs = self._inputs(results)
+        tables, axes, values = (self._tables_from_configs(configs, base, inputs['sector_names'])
+                                if configs is not None else
+                                self._tables_from_grid(grid, base, inputs['sector_names']))
+        # factor[c, sector * tiers + tier]: weight × multiplier per configuration
+        factors = (tables['sector_weights'][:, :, None]
+                   * tables['growth_multipliers'][:, None, :]).reshape(size, -1)
+        base_factor = (self._base_row(base, 'sector_weights', inputs['sector_names'])[:, None]
+                       * self._base_row(base, 'growth_multipliers', TIER_NAMES)[None, :]).ravel()
+
+        n, group, final = inputs['n'], inputs['group'], inputs['final']
+        if ranks_path:
+            ranks = np.lib.format.open_memmap(ranks_path, mode='w+', dtype=np.int32, shape=(size, n))
+        else:
+            ranks = np.empty((size, n), dtype=np.int32) if keep_ranks else None
+        best = np.full(n, n, dtype=np.int32)
+        worst = np.zeros(n, dtype=np.int32)
+        rank_sum = np.zeros(n, dtype=np.float64)
+        rank_sq = np.zeros(n, dtype=np.float64)
+        top_k = np.zeros(n, dtype=np.int64)
+        leads = np.zeros(n, dtype=np.int64)
+        rows = max(1, self.chunk_elements // n)
+        for first in range(0, size, rows):
+            chunk = descending_ranks(final * factors[first:first + rows][:, group])
+            np.minimum(best, chunk.min(axis=0), out=best)
+            np.maximum(worst, chunk.max(axis=0), out=worst)
+            as_float = chunk.astype(np.float64)
+            rank_sum += as_float.sum(axis=0)
+            rank_sq += np.einsum('ij,ij->j', as_float, as_float)
+            top_k += (chunk < self.k).sum(axis=0)
+            leads += np.bincount(chunk.argmin(axis=1), minlength=n)
+            if ranks is not None:
+                np.add(chunk, 1, out=ranks[first:first + rows])
+        if isinstance(ranks, np.memmap):
+            ranks.flush()
+
+        weighted = final * base_factor[group]
+        base_rank = descending_ranks(weighted[None, :])[0] + 1
+        mean = rank_sum / size
+        sd = np.sqrt(np.maximum(rank_sq / size - mean ** 2, 0.0))
+        summary = [{
+            'company_name': result['company_name'],
+            'sector': result.get('sector', 'Unknown'),
+            'final_score': float(final[i]),
+            'weighted_score': float(weighted[i]),
+            'base_rank': int(base_rank[i]),
+            'best_rank': int(best[i]) + 1,
+            'worst_rank': int(worst[i]) + 1,
+            'rank_range': int(worst[i] - best[i]),
+            'mean_rank': float(mean[i] + 1),
+            'rank_sd': float(sd[i]),
+            'p_top_k': float(top_k[i] / size),
+            'leads': int(leads[i]),
+        } for i, result in enumerate(results)]
+        summary.sort(key=lambda s: s['base_rank'])
+        return {'configs': size, 'k': self.k, 'seconds': round(time.perf_counter() - start, 4),
+                'axes': axes, 'values': np.stack(values, axis=1) if values else np.empty((size, 0)),
+                'columns': [r['company_name'] for r in results], 'ranks': ranks,
+                'summary': summary}
@@ -0,0 +1,378 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from array import array
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config.settings import (
+    CACHE_DIR, TRACE_ENABLED, TRACE_KEEP_SESSIONS, TRACE_PRUNE_GRACE_SECONDS
+)
+
+# The trace being filled in by the current company (or batch step), and the stage inside it
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+# Per-stage counters that record() accumulates
+COUNTERS = ('llm_requests', 'llm_seconds', 'prompt_tokens', 'completion_tokens', 'retries',
+            'rate_limit_wait_seconds', 'cache_hits', 'cache_misses', 'parse_seconds')
+
+def record(**metrics):
+    """Add metrics to the active stage of the active trace; a no-op outside a trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    with trace['lock']:
+        stage = trace['stages'].setdefault(_current_stage.get() or 'other', {'seconds': 0.0})
+        for name, value in metrics.items():
+            stage[name] = stage.get(name, 0) + value
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name` of the active trace."""
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        trace = _current_trace.get()
+        if trace is not None:
+            with trace['lock']:
+                entry = trace['stages'].setdefault(name, {'seconds': 0.0})
+                entry['seconds'] += time.perf_counter() - start
+
+class Tracer:
+    """Per-company traces of the workflow, written as JSON lines.
+
+    Each trace holds the wall time of every workflow node plus the LLM
+    latency, token counts, retries, rate-limit waits, cache hits and JSON
+    parse time recorded inside it, and the time the company waited in the
+    batch queue. Traces carry a session id that is handed to worker
+    processes (configure_tracer); each process of a session writes its own
+    file under `<directory>/<session>/`. Only the newest `keep_sessions`
+    session directories are kept, and an older one is removed only once it
+    has been idle for `prune_grace` seconds and none of its processes is
+    alive. The process also keeps a running summary of the traces it wrote,
+    so summary() only reads the files of other processes.
+    """
+
+    def __init__(self, directory: Optional[str] = None, enabled: bool = TRACE_ENABLED,
+                 session: Optional[str] = None, keep_sessions: int = TRACE_KEEP_SESSIONS,
+                 prune_grace: float = TRACE_PRUNE_GRACE_SECONDS):
+        self.enabled = enabled
+        self.session = session or uuid.uuid4().hex[:12]
+        self.root = directory or os.path.join(CACHE_DIR, 'traces')
+        self.directory = os.path.join(self.root, self.session)
+        self.keep_sessions = keep_sessions
+        self.prune_grace = prune_grace
+        self._file = None
+        self._pid = None
+        self._summary = TraceSummary()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        """This process's trace file."""
+        return os.path.join(self.directory, f'{os.getpid()}.jsonl')
+
+    def _write(self, payload: Dict):
+        line = json.dumps(payload, default=str) + '\n'
+        with self._lock:
+            if self._pid != os.getpid():
+                # First write (or a forked child): open this process's own file
+                self._pid = os.getpid()
+                self._summary = TraceSummary()
+                os.makedirs(self.directory, exist_ok=True)
+                self._prune_sessions()
+                self._file = open(self.path, 'a', buffering=1)
+            self._file.write(line)
+            self._summary.add(payload)
+
+    def _prune_sessions(self):
+        try:
+            sessions = [(_session_activity(entry.path), entry.path) for entry in os.scandir(self.root)
+                        if entry.is_dir() and entry.name != self.session]
+        except FileNotFoundError:
+            return
+        sessions.sort(reverse=True)
+        cutoff = time.time() - self.prune_grace
+        for (last_write, pids), path in sessions[max(0, self.keep_sessions - 1):]:
+            # Another run may still be writing to (or about to read) an old session
+            if last_write < cutoff and not any(map(_pid_alive, pids)):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def trace(self, name: str, kind: str = 'company', queued_at: Optional[float] = None):
+        """Collect everything recorded while the block runs into one trace line."""
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        trace = {'stages': {}, 'lock': threading.Lock()}
+        token = _current_trace.set(trace)
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            _current_trace.reset(token)
+            self._write({
+                'session': self.session,
+                'kind': kind,
+                'name': name,
+                'started_at': start,
+                'wall_seconds': round(time.time() - start, 6),
+                'queue_wait_seconds': round(max(0.0, start - queued_at), 6) if queued_at else 0.0,
+                'stages': trace['stages'],
+                'error': error,
+            })
+
+    @contextmanager
+    def span(self, name: str):
+        """A standalone trace with a single stage, for work outside the workflow (e.g. export)."""
+        with self.trace(name, kind=name), stage(name):
+            yield
+
+    def node(self, name: str, func: Callable) -> Callable:
+        """Wrap a workflow node so its wall time is recorded as stage `name`."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(state):
+                with self._node_trace(name, state), stage(name):
+                    return await func(state)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(state):
+            with self._node_trace(name, state), stage(name):
+                return func(state)
+        return wrapper
+
+    @contextmanager
+    def _node_trace(self, name: str, state: Dict):
+        # Nodes invoked outside AnalysisEngine (direct workflow calls) get a trace of their own
+        if _current_trace.get() is not None:
+            yield
+        else:
+            with self.trace(state.get('company_name', 'Unknown'), kind='node'):
+                yield
+
+    def _files(self, session: str) -> List[str]:
+        directory = os.path.join(self.root, session)
+        try:
+            return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                          if name.endswith('.jsonl'))
+        except FileNotFoundError:
+            return []
+
+    def load(self, session: Optional[str] = None) -> List[Dict]:
+        """Trace records for a session (this process's session by default)."""
+        if self._file is not None:
+            self._file.flush()
+        records = []
+        for path in self._files(session or self.session):
+            records.extend(_read_records(path))
+        return records
+
+    def summary(self) -> Dict:
+        """summarize() over this session: own traces from memory, other processes' from disk."""
+        combined = TraceSummary()
+        with self._lock:
+            combined.merge(self._summary)
+        own = self.path
+        for path in self._files(self.session):
+            if path != own:
+                for record_ in _read_records(path):
+                    combined.add(record_)
+        return combined.result()
+
+def _session_activity(directory: str) -> Tuple[float, List[int]]:
+    """Latest write to a session directory and the pids that wrote its files."""
+    last_write, pids = 0.0, []
+    try:
+        last_write = os.stat(directory).st_mtime
+        for entry in os.scandir(directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext == '.jsonl' and name.isdigit():
+                pids.append(int(name))
+                last_write = max(last_write, entry.stat().st_mtime)
+    except FileNotFoundError:
+        pass
+    return last_write, pids
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != 'posix':
+        return False  # no cheap liveness probe; the grace period alone protects the session
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # alive, owned by another user
+    return True
+
+def _read_records(path: str) -> Iterator[Dict]:
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a killed process
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, round(q * (len(sorted_values) - 1)))]
+
+class TraceSummary:
+    """Running per-stage totals and latencies, fed one trace record at a time."""
+
+    def __init__(self):
+        self.totals = {'traces': 0, 'errors': 0, 'wall_seconds': 0.0, 'queue_wait_seconds': 0.0,
+                       'graph_overhead_seconds': 0.0}
+        self.stages: Dict[str, Dict] = {}
+        self._durations: Dict[str, array] = {}
+
+    def add(self, trace: Dict):
+        totals = self.totals
+        totals['traces'] += 1
+        totals['errors'] += trace.get('error') is not None
+        totals['wall_seconds'] += trace.get('wall_seconds', 0.0)
+        totals['queue_wait_seconds'] += trace.get('queue_wait_seconds', 0.0)
+        if trace.get('kind') == 'company':
+            # Time inside workflow.invoke that no node accounts for (LangGraph itself)
+            node_seconds = sum(m.get('seconds', 0.0) for m in trace.get('stages', {}).values())
+            totals['graph_overhead_seconds'] += max(0.0, trace.get('wall_seconds', 0.0) - node_seconds)
+        for name, metrics in trace.get('stages', {}).items():
+            entry = self._stage(name)
+            entry['calls'] += 1
+            for metric, value in metrics.items():
+                entry[metric] = entry.get(metric, 0) + value
+            self._durations[name].append(metrics.get('seconds', 0.0))
+
+    def merge(self, other: 'TraceSummary'):
+        for name, value in other.totals.items():
+            self.totals[name] += value
+        for name, metrics in other.stages.items():
+            entry = self._stage(name)
+            for metric, value in metrics.items():
+                entry[metric] = entry.get(metric, 0) + value
+            self._durations[name].extend(other._durations[name])
+
+    def _stage(self, name: str) -> Dict:
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'calls': 0, **{c: 0 for c in ('seconds',) + COUNTERS}}
+            self._durations[name] = array('d')
+        return entry
+
+    def result(self) -> Dict:
+        stages = {}
+        for name, metrics in self.stages.items():
+            values = sorted(self._durations[name])
+            stages[name] = {**metrics, **{f'p{int(q * 100)}_seconds': _percentile(values, q)
+                                         for q in (0.5, 0.95, 0.99)}}
+        return {**self.totals, 'stages': stages}
+
+def summarize(records: Iterable[Dict]) -> Dict:
+    """Per-stage totals and latency percentiles over trace records."""
+    summary = TraceSummary()
+    for trace in records:
+        summary.add(trace)
+    return summary.result()
+
+def prometheus_text(summary: Dict, prefix: str = 'tafgs') -> str:
+    """Render a summary in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples):
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} {kind}')
+        for labels, value in samples:
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f'{prefix}_{name}{{{label_text}}} {value}' if label_text
+                         else f'{prefix}_{name} {value}')
+
+    stages = summary['stages']
+    metric('traces_total', 'counter', 'Traces recorded (companies, batch steps, exports).',
+           [({}, summary['traces'])])
+    metric('trace_errors_total', 'counter', 'Traces that ended with an exception.',
+           [({}, summary['errors'])])
+    metric('queue_wait_seconds_total', 'counter', 'Time companies waited before analysis started.',
+           [({}, round(summary['queue_wait_seconds'], 6))])
+    metric('graph_overhead_seconds_total', 'counter', 'Workflow time outside any node.',
+           [({}, round(summary['graph_overhead_seconds'], 6))])
+    metric('stage_calls_total', 'counter', 'Stage executions.',
+           [({'stage': s}, m['calls']) for s, m in stages.items()])
+    metric('stage_seconds_total', 'counter', 'Wall time spent in each stage.',
+           [({'stage': s}, round(m['seconds'], 6)) for s, m in stages.items()])
+    metric('stage_seconds', 'summary', 'Per-call stage latency.',
+           [({'stage': s, 'quantile': q}, round(m[f'p{int(float(q) * 100)}_seconds'], 6))
+            for s, m in stages.items() for q in ('0.5', '0.95', '0.99')])
+    for counter, help_text in (
+            ('llm_requests', 'LLM requests sent.'),
+            ('llm_seconds', 'Time spent waiting on LLM responses.'),
+            ('prompt_tokens', 'Prompt tokens reported by the LLM.'),
+            ('completion_tokens', 'Completion tokens reported by the LLM.'),
+            ('retries', 'LLM requests retried after a rate-limit error.'),
+            ('rate_limit_wait_seconds', 'Time spent throttled by the rate limiter.'),
+            ('cache_hits', 'Moat cache hits.'),
+            ('cache_misses', 'Moat cache misses.'),
+            ('parse_seconds', 'Time spent decoding/repairing LLM JSON.')):
+        metric(f'{counter}_total', 'counter', help_text,
+               [({'stage': s}, round(m.get(counter, 0), 6)) for s, m in stages.items()
+                if m.get(counter)])
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(summary: Dict, path: Optional[str] = None) -> str:
+    """Write prometheus_text(summary) atomically (for a node-exporter textfile collector)."""
+    path = path or os.path.join(CACHE_DIR, 'metrics.prom')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(prometheus_text(summary))
+    os.replace(tmp, path)
+    return path
+
+def format_breakdown(summary: Dict) -> List[str]:
+    """Human-readable per-stage lines for the CLI."""
+    stages = summary['stages']
+    total = sum(m['seconds'] for m in stages.values()) or 1.0
+    lines = [f"{'Stage':18s} {'Calls':>6s} {'Total s':>9s} {'Share':>6s} {'p50 ms':>8s} {'p95 ms':>8s}"]
+    for name, m in sorted(stages.items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"{name:18s} {m['calls']:6d} {m['seconds']:9.2f} {m['seconds'] / total:6.1%} "
+                     f"{m['p50_seconds'] * 1000:8.1f} {m['p95_seconds'] * 1000:8.1f}")
+    llm = {c: sum(m.get(c, 0) for m in stages.values()) for c in COUNTERS}
+    lines.append(f"LLM: {llm['llm_requests']} requests, {llm['llm_seconds']:.2f}s waiting, "
+                 f"{llm['prompt_tokens']} prompt / {llm['completion_tokens']} completion tokens, "
+                 f"{llm['retries']} retries, {llm['rate_limit_wait_seconds']:.2f}s throttled")
+    lines.append(f"Cache: {llm['cache_hits']} hits, {llm['cache_misses']} misses | "
+                 f"JSON parsing {llm['parse_seconds'] * 1000:.1f} ms | "
+                 f"graph overhead {summary['graph_overhead_seconds']:.2f}s | queue wait {summary['queue_wait_seconds']:.2f}s over {summary['traces']} traces")
+    return lines
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer; TRACE_SESSION joins an existing session instead of starting one."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(session=os.environ.get('TRACE_SESSION'))
+        return _tracer
+
+def configure_tracer(session: str) -> Tracer:
+    """Replace the process-wide tracer with one writing to `session` (e.g. a worker's parent's)."""
+    global _tracer
+    with _tracer_lock:
+        _tracer = Tracer(session=session)
+        return _tracer
@@ -1,19 +1,28 @@
-from langgraph.graph import StateGraph, END
-from state import AgentState
-from agents.margin_agent import margin_analysis_agent
-from agents.moat_agent import moat_analysis_agent
-from agents.growth_agent import ranking_agent
-from agents.report_agent import report_agent
-
 def create_workflow():
     """Creates and compiles the LangGraph workflow."""
+    # Imported here so modules that only need scoring/ranking don't load LangGraph/LangChain
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph, END
+    from state import AgentState
+    from agents.margin_agent import margin_analysis_agent
+    from agents.moat_agent import moat_analysis_agent, amoat_analysis_agent
+    from agents.growth_agent import ranking_agent
+    from agents.report_agent import report_agent
+    from utils.tracing import get_tracer
+
+    tracer = get_tracer()
+
     workflow = StateGraph(AgentState)
 
-    # Add nodes
-    workflow.add_node("analyze_margin", margin_analysis_agent)
-    workflow.add_node("analyze_moat", moat_analysis_agent)
-    workflow.add_node("calculate_rank", ranking_agent)
-    workflow.add_node("generate_report", report_agent)
+    # Add nodes (each wrapped so its wall time lands in the per-company trace)
+    workflow.add_node("analyze_margin", tracer.node("analyze_margin", margin_analysis_agent))
+    # The moat node has an async twin so ainvoke() awaits the LLM instead of
+    # parking a thread per company.
+    workflow.add_node("analyze_moat", RunnableLambda(
+        tracer.node("analyze_moat", moat_analysis_agent),
+        afunc=tracer.node("analyze_moat", amoat_analysis_agent)))
+    workflow.add_node("calculate_rank", tracer.node("calculate_rank", ranking_agent))
+    workflow.add_node("generate_report", tracer.node("generate_report", report_agent))
 
     # Define the flow (Edges)
     workflow.set_entry_point("analyze_margin")
@@ -22,4 +31,4 @@ def create_workflow():
     workflow.add_edge("calculate_rank", "generate_report")
     workflow.add_edge("generate_report", END)
 
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()